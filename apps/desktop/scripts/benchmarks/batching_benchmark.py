@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Batching Benchmark
+Débit de mlx_llm_server.py à concurrence 1 / 4 / 8, séquentiel vs continuous batching
+
+Pour chaque mode (--max-batch-size 1 puis --max-batch-size N), le serveur est
+lancé, le modèle chargé, puis C requêtes generate sont envoyées d'un coup ; on
+mesure le temps total, le débit agrégé (tokens générés / s) et la latence
+moyenne par requête.
+
+Usage:
+    python scripts/benchmarks/batching_benchmark.py --model mlx-community/Qwen2.5-0.5B-Instruct-4bit
+        [--concurrency 1 4 8] [--max-tokens 128] [--batch-size 8] [--json]
+"""
+
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List
+
+DESKTOP_DIR = Path(__file__).resolve().parent.parent.parent
+SERVER = DESKTOP_DIR / "src" / "main" / "services" / "backends" / "mlx" / "mlx_llm_server.py"
+
+PROMPTS = [
+    "Résume les avantages du cache KV en trois phrases.",
+    "Écris une fonction Python qui inverse une liste chaînée.",
+    "Quelles sont les différences entre TCP et UDP ?",
+    "Propose un plan pour un article sur l'inférence locale.",
+    "Explique la quantification 4 bits à un débutant.",
+    "Donne cinq idées de noms pour une application de notes.",
+    "Traduis en anglais : le modèle tourne entièrement sur la machine.",
+    "Décris le fonctionnement d'un tokenizer BPE.",
+]
+
+
+class ServerClient:
+    """Client JSON-lines minimal, requêtes concurrentes routées par id"""
+
+    def __init__(self, server_args: List[str]):
+        self.proc = subprocess.Popen(
+            [sys.executable, str(SERVER), *server_args],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        self.next_id = 1
+
+    def send(self, payload: Dict[str, Any]) -> int:
+        request_id = self.next_id
+        self.next_id += 1
+        self.proc.stdin.write(json.dumps({**payload, "id": request_id}) + "\n")
+        self.proc.stdin.flush()
+        return request_id
+
+    def collect(self, request_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Attend les réponses finales des requêtes données (horodatées à réception)"""
+        pending = set(request_ids)
+        responses = {}
+
+        for line in self.proc.stdout:
+            response = json.loads(line)
+            request_id = response.get("id")
+            if request_id in pending and response.get("type") != "chunk":
+                response["received_at"] = time.perf_counter()
+                responses[request_id] = response
+                pending.discard(request_id)
+                if not pending:
+                    return responses
+
+        raise RuntimeError("Server exited")
+
+    def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        request_id = self.send(payload)
+        return self.collect([request_id])[request_id]
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+
+def run_level(client: ServerClient, concurrency: int, max_tokens: int) -> Dict[str, Any]:
+    """Envoie `concurrency` requêtes simultanées et mesure le débit"""
+    start = time.perf_counter()
+    ids = [
+        client.send({
+            "command": "generate",
+            "prompt": PROMPTS[i % len(PROMPTS)],
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+            "stream": False,
+        })
+        for i in range(concurrency)
+    ]
+    responses = client.collect(ids)
+    wall = time.perf_counter() - start
+
+    failed = [r.get("error") for r in responses.values() if not r.get("success")]
+    if failed:
+        raise RuntimeError(failed[0])
+
+    tokens = sum(r["usage"]["completion_tokens"] for r in responses.values())
+    latencies = [(r["received_at"] - start) * 1000 for r in responses.values()]
+
+    return {
+        "concurrency": concurrency,
+        "wall_ms": round(wall * 1000, 1),
+        "tokens": tokens,
+        "throughput_tok_s": round(tokens / wall, 2),
+        "avg_latency_ms": round(sum(latencies) / len(latencies), 1),
+        "avg_ttft_ms": round(sum(r["ttft_ms"] or 0 for r in responses.values()) / len(responses), 1),
+    }
+
+
+def run_mode(model: str, batch_size: int, levels: List[int], max_tokens: int) -> List[Dict[str, Any]]:
+    client = ServerClient(["--max-batch-size", str(batch_size)])
+    try:
+        loaded = client.request({"command": "load", "model_path": model, "warmup": True})
+        if not loaded.get("success"):
+            raise RuntimeError(loaded.get("error"))
+        return [run_level(client, level, max_tokens) for level in levels]
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs continuous batching throughput")
+    parser.add_argument("--model", required=True, help="MLX model path or HF repo")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="Concurrency levels")
+    parser.add_argument("--max-tokens", type=int, default=128, help="Tokens generated per request")
+    parser.add_argument("--batch-size", type=int, default=8, help="--max-batch-size for the batched mode")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    args = parser.parse_args()
+
+    results = {
+        "sequential": run_mode(args.model, 1, args.concurrency, args.max_tokens),
+        "batched": run_mode(args.model, args.batch_size, args.concurrency, args.max_tokens),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'conc.':>5} | {'sequential tok/s':>16} | {'batched tok/s':>13} | {'speedup':>7} | {'avg latency seq / batch':>24}")
+    for seq, bat in zip(results["sequential"], results["batched"]):
+        speedup = bat["throughput_tok_s"] / seq["throughput_tok_s"] if seq["throughput_tok_s"] else 0.0
+        print(
+            f"{seq['concurrency']:>5} | {seq['throughput_tok_s']:>16.1f} | {bat['throughput_tok_s']:>13.1f} | "
+            f"{speedup:>6.2f}x | {seq['avg_latency_ms']:>10.0f} / {bat['avg_latency_ms']:.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+KV Cache Benchmark
+Latence par tour d'un chat de 20 tours, avec et sans réutilisation du cache KV
+
+Lance mlx_llm_server.py, charge le modèle, puis rejoue la même conversation deux
+fois : sans conversation_id (tout l'historique est re-prefill à chaque tour) et
+avec conversation_id (seul le nouveau suffixe est prefill).
+
+Usage:
+    python scripts/benchmarks/kv_cache_benchmark.py --model mlx-community/Qwen2.5-0.5B-Instruct-4bit
+        [--turns 20] [--max-tokens 64] [--json]
+"""
+
+import sys
+import json
+import time
+import argparse
+import itertools
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List
+
+DESKTOP_DIR = Path(__file__).resolve().parent.parent.parent
+SERVER = DESKTOP_DIR / "src" / "main" / "services" / "backends" / "mlx" / "mlx_llm_server.py"
+
+SYSTEM_PROMPT = (
+    "Tu es un assistant technique. Réponds de manière précise et structurée, "
+    "en citant les hypothèses que tu fais."
+)
+
+QUESTIONS = [
+    "Explique le principe d'un cache KV dans un transformeur.",
+    "Pourquoi le prefill coûte-t-il plus cher que le décodage ?",
+    "Comment mesurer le temps jusqu'au premier token ?",
+    "Quels sont les compromis de la quantification des poids ?",
+    "Donne un exemple de batching dynamique.",
+]
+
+
+class ServerClient:
+    """Client JSON-lines minimal pour mlx_llm_server.py"""
+
+    def __init__(self, server_args: List[str]):
+        self.proc = subprocess.Popen(
+            [sys.executable, str(SERVER), *server_args],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        self.ids = itertools.count(1)
+
+    def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        request_id = next(self.ids)
+        self.proc.stdin.write(json.dumps({**payload, "id": request_id}) + "\n")
+        self.proc.stdin.flush()
+
+        for line in self.proc.stdout:
+            response = json.loads(line)
+            if response.get("id") == request_id and response.get("type") != "chunk":
+                return response
+
+        raise RuntimeError("Server exited")
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+
+def run_chat(client: ServerClient, turns: int, max_tokens: int, conversation_id: str = None) -> List[Dict[str, Any]]:
+    """Joue une conversation et retourne les mesures de chaque tour"""
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    results = []
+
+    for turn in range(turns):
+        messages.append({"role": "user", "content": QUESTIONS[turn % len(QUESTIONS)]})
+
+        payload = {
+            "command": "chat",
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": 0.0001,
+            "stream": False,
+        }
+        if conversation_id:
+            payload["conversation_id"] = conversation_id
+
+        start = time.perf_counter()
+        response = client.request(payload)
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        if not response.get("success"):
+            raise RuntimeError(response.get("error"))
+
+        messages.append({"role": "assistant", "content": response["content"]})
+        usage = response.get("usage", {})
+        cache = response.get("cache") or {}
+
+        results.append({
+            "turn": turn + 1,
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "prefill_tokens": cache.get("prefill_tokens", usage.get("prompt_tokens")),
+            "ttft_ms": response.get("ttft_ms"),
+            "wall_ms": round(wall_ms, 2),
+        })
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-turn latency with and without KV cache reuse")
+    parser.add_argument("--model", required=True, help="MLX model path or HF repo")
+    parser.add_argument("--turns", type=int, default=20, help="Number of chat turns")
+    parser.add_argument("--max-tokens", type=int, default=64, help="Tokens generated per turn")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    args = parser.parse_args()
+
+    client = ServerClient([])
+    try:
+        loaded = client.request({"command": "load", "model_path": args.model, "warmup": True})
+        if not loaded.get("success"):
+            raise RuntimeError(loaded.get("error"))
+
+        results = {
+            "no_cache": run_chat(client, args.turns, args.max_tokens),
+            "conversation_cache": run_chat(client, args.turns, args.max_tokens, "benchmark"),
+        }
+        results["status"] = client.request({"command": "status"}).get("conversation_cache")
+    finally:
+        client.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'turn':>4} | {'prompt':>6} | {'ttft no cache':>13} | {'prefill':>7} | {'ttft cache':>10} | {'speedup':>7}")
+    for base, cached in zip(results["no_cache"], results["conversation_cache"]):
+        speedup = base["ttft_ms"] / cached["ttft_ms"] if cached["ttft_ms"] else 0.0
+        print(
+            f"{base['turn']:>4} | {base['prompt_tokens']:>6} | {base['ttft_ms']:>10.1f} ms | "
+            f"{cached['prefill_tokens']:>7} | {cached['ttft_ms']:>7.1f} ms | {speedup:>6.2f}x"
+        )
+
+    for name in ("no_cache", "conversation_cache"):
+        total = sum(r["wall_ms"] for r in results[name])
+        print(f"{name}: total {total:.0f} ms over {args.turns} turns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Matryoshka Eval
+Qualité de recherche vs taille des embeddings tronqués (Matryoshka) et float16
+
+Les vecteurs complets servent de référence : pour chaque requête, on compare
+les k plus proches voisins (cosinus) trouvés avec chaque taille réduite à ceux
+des vecteurs complets (recall@k), avec la mémoire de l'index et le temps d'une
+recherche exhaustive. Sans --queries, un échantillon de textes du corpus sert
+de requêtes (le texte lui-même est exclu des résultats).
+
+Les embeddings viennent d'Ollama (--corpus, via OllamaEmbedder) ou d'un
+fichier produit par le mode streaming (--vectors, une ligne {"embedding": ...}).
+
+Usage:
+    python scripts/benchmarks/matryoshka_eval.py --corpus corpus.jsonl [--queries queries.jsonl]
+        [--model nomic-embed-text] [--url http://localhost:11434] [--store-path cache.sqlite]
+        [--dims 128 256 512] [--k 10] [--num-queries 200] [--json]
+    python scripts/benchmarks/matryoshka_eval.py --vectors vectors.jsonl [--dims 256 512]
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DESKTOP_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(DESKTOP_DIR / "src" / "python"))
+
+from text_rag.ollama_embeddings import OllamaEmbedder  # noqa: E402
+
+
+def read_jsonl(path: str, key: str) -> List[Any]:
+    """Valeurs `key` d'un fichier JSONL (une chaîne seule vaut pour "text")"""
+    values = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"text": record}
+            if record.get(key) is not None:
+                values.append(record[key])
+    return values
+
+
+def embed(texts: List[str], args: argparse.Namespace) -> np.ndarray:
+    with OllamaEmbedder(
+        base_url=args.url, model=args.model, cache_size=0, store_path=args.store_path, concurrency=args.concurrency
+    ) as embedder:
+        return np.asarray(embedder.generate_embeddings_batch(texts), dtype=np.float32)
+
+
+def reduce(matrix: np.ndarray, dims: int, half: bool) -> np.ndarray:
+    """Premières composantes, renormalisées, éventuellement en float16"""
+    head = matrix[:, :dims]
+    head = head / np.clip(np.linalg.norm(head, axis=1, keepdims=True), 1e-12, None)
+    return head.astype(np.float16 if half else np.float32)
+
+
+def top_k(index: np.ndarray, queries: np.ndarray, k: int, exclude: Optional[np.ndarray]) -> np.ndarray:
+    """Index des k plus proches voisins (cosinus) de chaque requête"""
+    scores = queries.astype(np.float32) @ index.astype(np.float32).T
+    if exclude is not None:
+        scores[np.arange(len(queries)), exclude] = -np.inf
+    return np.argpartition(-scores, k, axis=1)[:, :k]
+
+
+def evaluate(
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    exclude: Optional[np.ndarray],
+    dims_list: List[int],
+    k: int
+) -> List[Dict[str, Any]]:
+    full_dims = corpus.shape[1]
+    reference = top_k(reduce(corpus, full_dims, False), reduce(queries, full_dims, False), k, exclude)
+
+    results = []
+    for dims in sorted(set(d for d in dims_list if d <= full_dims) | {full_dims}):
+        for half in (False, True):
+            index = reduce(corpus, dims, half)
+            reduced_queries = reduce(queries, dims, half)
+
+            start = time.perf_counter()
+            found = top_k(index, reduced_queries, k, exclude)
+            search = time.perf_counter() - start
+
+            recall = np.mean([
+                len(set(a) & set(b)) / k for a, b in zip(found.tolist(), reference.tolist())
+            ])
+            results.append({
+                "dims": dims,
+                "dtype": "float16" if half else "float32",
+                "bytes_per_vector": index.itemsize * dims,
+                "index_mb": round(index.nbytes / 1024 / 1024, 2),
+                "size_ratio": round(index.nbytes / (corpus.shape[0] * full_dims * 4), 3),
+                f"recall_at_{k}": round(float(recall), 4),
+                "search_ms_per_query": round(search * 1000 / len(queries), 3),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs size of Matryoshka-truncated / float16 embeddings")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--corpus", help="JSONL texts to embed with Ollama (string or {\"id\", \"text\"} per line)")
+    source.add_argument("--vectors", help="JSONL embeddings from ollama_embeddings.py --jsonl")
+    parser.add_argument("--queries", help="JSONL query texts (default: sample of the corpus)")
+    parser.add_argument("--num-queries", type=int, default=200, help="Corpus texts sampled as queries")
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, 256, 512], help="Truncated sizes to evaluate")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours compared per query")
+    parser.add_argument("--model", default="nomic-embed-text", help="Ollama embedding model")
+    parser.add_argument("--url", default="http://localhost:11434", help="Ollama base URL")
+    parser.add_argument("--store-path", help="Persistent embedding store, to re-run without re-embedding")
+    parser.add_argument("--concurrency", type=int, default=2, help="Embedding requests in flight")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the query sample")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    args = parser.parse_args()
+
+    if args.vectors:
+        corpus = np.asarray(read_jsonl(args.vectors, "embedding"), dtype=np.float32)
+    else:
+        corpus = embed(read_jsonl(args.corpus, "text"), args)
+
+    if args.queries and args.corpus:
+        queries = embed(read_jsonl(args.queries, "text"), args)
+        exclude = None
+    else:
+        # Échantillon du corpus ; chaque requête est exclue de ses propres résultats
+        sample = random.Random(args.seed).sample(range(len(corpus)), min(args.num_queries, len(corpus)))
+        exclude = np.asarray(sample)
+        queries = corpus[exclude]
+
+    if len(corpus) <= args.k:
+        parser.error(f"Need more than k={args.k} vectors, got {len(corpus)}")
+
+    results = evaluate(corpus, queries, exclude, args.dims, args.k)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    recall_key = f"recall_at_{args.k}"
+    print(f"{len(corpus)} vectors, {len(queries)} queries, reference: {corpus.shape[1]} dims float32")
+    print(f"{'dims':>5} | {'dtype':>7} | {'bytes/vec':>9} | {'index':>9} | {'size':>6} | {'recall@' + str(args.k):>9} | {'ms/query':>8}")
+    for r in results:
+        print(
+            f"{r['dims']:>5} | {r['dtype']:>7} | {r['bytes_per_vector']:>9} | {r['index_mb']:>6.2f} MB | "
+            f"{r['size_ratio']:>6.1%} | {r[recall_key]:>9.4f} | {r['search_ms_per_query']:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Ollama Async Benchmark
+AsyncOllamaEmbedder (asyncio, sémaphore) vs OllamaEmbedder (threads) au même niveau de concurrence
+
+Le serveur local (StandInOllama) traite au plus --num-parallel requêtes à la
+fois et envoie ses réponses en chunked comme Ollama. Pour chaque concurrence,
+on embed les mêmes textes avec les deux clients, on vérifie les embeddings et
+leur ordre, et on compare le débit et les connexions TCP ouvertes. Le mode
+--legacy teste le repli sur /api/embeddings.
+
+Usage:
+    python scripts/benchmarks/ollama_async_benchmark.py [--texts 2000] [--batch-size 16]
+        [--concurrency 1 4 8] [--num-parallel 4] [--legacy] [--json]
+"""
+
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, Dict, List
+
+from ollama_embed_benchmark import OllamaEmbedder, StandInOllama, fake_embedding
+
+from text_rag.async_ollama_embeddings import AsyncOllamaEmbedder  # noqa: E402
+
+
+def new_server(args: argparse.Namespace) -> StandInOllama:
+    return StandInOllama(
+        args.latency_ms, args.per_text_ms, legacy_only=args.legacy,
+        num_parallel=args.num_parallel, max_queue=args.num_parallel * 4, chunked=True
+    )
+
+
+def run_sync(texts: List[str], concurrency: int, args: argparse.Namespace) -> Dict[str, Any]:
+    server = new_server(args)
+    try:
+        with OllamaEmbedder(
+            base_url=server.url, cache_size=0, max_batch_size=args.batch_size, concurrency=concurrency
+        ) as embedder:
+            start = time.perf_counter()
+            embeddings = embedder.generate_embeddings_batch(texts)
+            wall = time.perf_counter() - start
+    finally:
+        server.close()
+    return summarize("threads", concurrency, texts, embeddings, wall, server)
+
+
+def run_async(texts: List[str], concurrency: int, args: argparse.Namespace) -> Dict[str, Any]:
+    server = new_server(args)
+
+    async def embed():
+        async with AsyncOllamaEmbedder(
+            base_url=server.url, cache_size=0, max_batch_size=args.batch_size, concurrency=concurrency
+        ) as embedder:
+            if not (await embedder.check_availability())["available"]:
+                raise RuntimeError("Stand-in server not reachable")
+            start = time.perf_counter()
+            embeddings = await embedder.generate_embeddings_batch(texts)
+            return embeddings, time.perf_counter() - start
+
+    try:
+        embeddings, wall = asyncio.run(embed())
+    finally:
+        server.close()
+    return summarize("asyncio", concurrency, texts, embeddings, wall, server)
+
+
+def summarize(client: str, concurrency: int, texts: List[str], embeddings, wall: float, server: StandInOllama) -> Dict[str, Any]:
+    if any(e != fake_embedding(t, normalized=True) for e, t in zip(embeddings, texts)):
+        raise RuntimeError(f"{client}: embeddings returned out of order")
+    return {
+        "client": client,
+        "concurrency": concurrency,
+        "texts": len(texts),
+        "http_requests": server.requests,
+        "connections": server.connections,
+        "busy_responses": server.busy_responses,
+        "wall_ms": round(wall * 1000, 1),
+        "texts_per_second": round(len(texts) / wall, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AsyncOllamaEmbedder vs threaded OllamaEmbedder")
+    parser.add_argument("--texts", type=int, default=2000, help="Number of chunks to embed")
+    parser.add_argument("--batch-size", type=int, default=16, help="max_batch_size of the embedders")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="Concurrency levels")
+    parser.add_argument("--num-parallel", type=int, default=4, help="Requests the stand-in server runs at once")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Simulated fixed cost per HTTP request")
+    parser.add_argument("--per-text-ms", type=float, default=0.5, help="Simulated model cost per text")
+    parser.add_argument("--legacy", action="store_true", help="Stand-in without /api/embed (one text per request)")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    args = parser.parse_args()
+
+    texts = [f"Chunk {i}: contenu du document découpé pour le RAG." for i in range(args.texts)]
+    results = []
+    for level in args.concurrency:
+        results.append(run_sync(texts, level, args))
+        results.append(run_async(texts, level, args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'client':>8} | {'conc.':>5} | {'texts/s':>8} | {'requests':>8} | {'TCP conns':>9} | {'503s':>5}")
+    for r in results:
+        print(
+            f"{r['client']:>8} | {r['concurrency']:>5} | {r['texts_per_second']:>8.1f} | "
+            f"{r['http_requests']:>8} | {r['connections']:>9} | {r['busy_responses']:>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Ollama Concurrency Benchmark
+Débit de OllamaEmbedder.generate_embeddings_batch à différents niveaux de concurrence
+
+Le serveur local (StandInOllama) traite au plus --num-parallel requêtes à la
+fois (comme OLLAMA_NUM_PARALLEL) et répond 503 au-delà de --max-queue requêtes
+en attente ; on mesure le débit, les 503 reçus et la limite finale choisie par
+le backoff adaptatif pour chaque valeur de concurrency.
+
+Usage:
+    python scripts/benchmarks/ollama_concurrency_benchmark.py [--texts 2000] [--batch-size 16]
+        [--concurrency 1 2 4 8] [--num-parallel 4] [--max-queue 2] [--json]
+"""
+
+import json
+import time
+import argparse
+from typing import Any, Dict, List
+
+from ollama_embed_benchmark import OllamaEmbedder, StandInOllama, fake_embedding
+
+
+def run_level(texts: List[str], concurrency: int, args: argparse.Namespace) -> Dict[str, Any]:
+    server = StandInOllama(
+        args.latency_ms, args.per_text_ms, legacy_only=False,
+        num_parallel=args.num_parallel, max_queue=args.max_queue
+    )
+    try:
+        with OllamaEmbedder(
+            base_url=server.url, cache_size=0, max_batch_size=args.batch_size, concurrency=concurrency
+        ) as embedder:
+            start = time.perf_counter()
+            embeddings = embedder.generate_embeddings_batch(texts)
+            wall = time.perf_counter() - start
+            limiter = embedder.last_concurrency
+    finally:
+        server.close()
+
+    if any(e != fake_embedding(t, normalized=True) for e, t in zip(embeddings, texts)):
+        raise RuntimeError("Embeddings returned out of order")
+
+    return {
+        "concurrency": concurrency,
+        "wall_ms": round(wall * 1000, 1),
+        "texts_per_second": round(len(texts) / wall, 1),
+        "http_requests": server.requests,
+        "busy_responses": server.busy_responses,
+        "final_limit": limiter["finalLimit"],
+        "limit_decreases": limiter["decreases"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OllamaEmbedder throughput by concurrency level")
+    parser.add_argument("--texts", type=int, default=2000, help="Number of chunks to embed")
+    parser.add_argument("--batch-size", type=int, default=16, help="max_batch_size of the embedder")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrency levels")
+    parser.add_argument("--num-parallel", type=int, default=4, help="Requests the stand-in server runs at once")
+    parser.add_argument("--max-queue", type=int, default=2, help="Waiting requests before the server answers 503")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Simulated fixed cost per HTTP request")
+    parser.add_argument("--per-text-ms", type=float, default=0.5, help="Simulated model cost per text")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    args = parser.parse_args()
+
+    texts = [f"Chunk {i}: contenu du document découpé pour le RAG." for i in range(args.texts)]
+    results = [run_level(texts, level, args) for level in args.concurrency]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    base = results[0]["texts_per_second"]
+    print(f"{'conc.':>5} | {'texts/s':>8} | {'speedup':>7} | {'requests':>8} | {'503s':>5} | {'final limit':>11}")
+    for r in results:
+        print(
+            f"{r['concurrency']:>5} | {r['texts_per_second']:>8.1f} | {r['texts_per_second'] / base:>6.2f}x | "
+            f"{r['http_requests']:>8} | {r['busy_responses']:>5} | {r['final_limit']:>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
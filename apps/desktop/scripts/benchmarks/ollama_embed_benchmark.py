@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Ollama Embed Benchmark
+Allers-retours HTTP de OllamaEmbedder : /api/embed par lots vs /api/embeddings
+
+Un serveur HTTP local (StandInOllama) imite Ollama (latence fixe par requête,
+coût par texte, embeddings déterministes, keep-alive HTTP/1.1) ; on embed N
+chunks une fois avec un serveur ancien (sans /api/embed, donc repli sur un
+texte par requête) puis avec le batch endpoint, et on compare le nombre de
+requêtes et le temps total.
+
+Usage:
+    python scripts/benchmarks/ollama_embed_benchmark.py [--texts 5000] [--batch-size 64]
+        [--latency-ms 2] [--per-text-ms 0.05] [--json]
+"""
+
+import sys
+import json
+import math
+import time
+import socket
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+DESKTOP_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(DESKTOP_DIR / "src" / "python"))
+
+from text_rag.ollama_embeddings import OllamaEmbedder  # noqa: E402
+
+DIMENSIONS = 768
+
+
+def fake_embedding(text: str, normalized: bool = False) -> List[float]:
+    """Vecteur déterministe dérivé du hash du texte (normalisé L2 comme /api/embed si normalized)"""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    vector = [digest[i % len(digest)] / 255.0 for i in range(DIMENSIONS)]
+    if not normalized:
+        return vector
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector]
+
+
+class StandInOllama:
+    """
+    Serveur local imitant les endpoints d'embedding d'Ollama
+
+    Avec num_parallel, au plus num_parallel requêtes d'embedding sont traitées
+    en même temps (OLLAMA_NUM_PARALLEL) ; au-delà de max_queue requêtes en
+    attente, le serveur répond 503 comme Ollama saturé. Avec chunked, les
+    réponses sont envoyées en Transfer-Encoding: chunked, comme le fait Ollama
+    (Go net/http) pour les corps volumineux.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float,
+        per_text_ms: float,
+        legacy_only: bool,
+        num_parallel: Optional[int] = None,
+        max_queue: int = 0,
+        chunked: bool = False
+    ):
+        self.requests = 0
+        self.connections = 0
+        self.busy_responses = 0
+        self.lock = threading.Lock()
+        self.waiting = 0
+        slots = threading.Semaphore(num_parallel) if num_parallel else None
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1: connexions keep-alive comme Ollama
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                # Comme Ollama (Go): pas d'algorithme de Nagle sur les petites écritures
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with stand_in.lock:
+                    stand_in.connections += 1
+
+            def _reply(self, status: int, body: Any):
+                data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json" if not isinstance(body, str) else "text/plain")
+                if chunked:
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for start in range(0, len(data), 4096):
+                        part = data[start:start + 4096]
+                        self.wfile.write(f"{len(part):x}\r\n".encode() + part + b"\r\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                with stand_in.lock:
+                    stand_in.requests += 1
+                time.sleep(latency_ms / 1000)
+                if self.path == "/api/tags":
+                    self._reply(200, {"models": [{"name": "nomic-embed-text:latest"}, {"name": "nomic-embed-text"}]})
+                else:
+                    self._reply(404, "404 page not found")
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stand_in.lock:
+                    stand_in.requests += 1
+
+                if slots is None or self.path == "/api/show":
+                    self._handle(payload)
+                    return
+
+                with stand_in.lock:
+                    if stand_in.waiting >= num_parallel + max_queue:
+                        stand_in.busy_responses += 1
+                        busy = True
+                    else:
+                        stand_in.waiting += 1
+                        busy = False
+                if busy:
+                    self._reply(503, {"error": "server busy, please try again. maximum pending requests exceeded"})
+                    return
+
+                try:
+                    with slots:
+                        self._handle(payload)
+                finally:
+                    with stand_in.lock:
+                        stand_in.waiting -= 1
+
+            def _handle(self, payload: Dict[str, Any]):
+                if self.path == "/api/show":
+                    time.sleep(latency_ms / 1000)
+                    self._reply(200, {"details": {"family": "nomic-bert"}, "model_info": {}})
+                    return
+
+                if self.path == "/api/embed" and not legacy_only:
+                    texts = payload["input"] if isinstance(payload["input"], list) else [payload["input"]]
+                    time.sleep((latency_ms + per_text_ms * len(texts)) / 1000)
+                    self._reply(200, {"model": payload["model"], "embeddings": [fake_embedding(t, normalized=True) for t in texts]})
+                elif self.path == "/api/embeddings":
+                    time.sleep((latency_ms + per_text_ms) / 1000)
+                    self._reply(200, {"embedding": fake_embedding(payload["prompt"])})
+                else:
+                    # Réponse d'Ollama pour une route inconnue
+                    self._reply(404, "404 page not found")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run_mode(texts: List[str], batch_size: int, latency_ms: float, per_text_ms: float, legacy_only: bool) -> Dict[str, Any]:
+    server = StandInOllama(latency_ms, per_text_ms, legacy_only)
+    try:
+        embedder = OllamaEmbedder(base_url=server.url, cache_size=0, max_batch_size=batch_size)
+        start = time.perf_counter()
+        embeddings = embedder.generate_embeddings_batch(texts)
+        wall = time.perf_counter() - start
+        embedder.close()
+    finally:
+        server.close()
+
+    if any(e != fake_embedding(t, normalized=True) for e, t in zip(embeddings, texts)):
+        raise RuntimeError("Embeddings returned out of order")
+
+    return {
+        "mode": "legacy" if legacy_only else "batch",
+        "texts": len(texts),
+        "http_requests": server.requests,
+        "wall_ms": round(wall * 1000, 1),
+        "texts_per_second": round(len(texts) / wall, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OllamaEmbedder /api/embed batching vs legacy endpoint")
+    parser.add_argument("--texts", type=int, default=5000, help="Number of chunks to embed")
+    parser.add_argument("--batch-size", type=int, default=64, help="max_batch_size of the embedder")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Simulated fixed cost per HTTP request")
+    parser.add_argument("--per-text-ms", type=float, default=0.05, help="Simulated model cost per text")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    args = parser.parse_args()
+
+    texts = [f"Chunk {i}: contenu du document découpé pour le RAG." for i in range(args.texts)]
+    results = [
+        run_mode(texts, args.batch_size, args.latency_ms, args.per_text_ms, legacy_only=True),
+        run_mode(texts, args.batch_size, args.latency_ms, args.per_text_ms, legacy_only=False),
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'mode':>6} | {'texts':>6} | {'HTTP requests':>13} | {'wall':>10} | {'texts/s':>8}")
+    for r in results:
+        print(f"{r['mode']:>6} | {r['texts']:>6} | {r['http_requests']:>13} | {r['wall_ms']:>7.0f} ms | {r['texts_per_second']:>8.1f}")
+
+    legacy, batch = results
+    print(f"Round trips saved: {legacy['http_requests'] - batch['http_requests']} "
+          f"({legacy['wall_ms'] / batch['wall_ms']:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
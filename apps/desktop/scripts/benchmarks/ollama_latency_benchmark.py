@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Ollama Latency Benchmark
+Latence par appel de OllamaEmbedder, avec et sans réutilisation des connexions
+
+"Avant": un requests.post/requests.get par appel (nouvelle connexion TCP à
+chaque fois, comme avant la session partagée). "Après": les méthodes de
+OllamaEmbedder, qui passent par sa requests.Session (pool keep-alive). Les deux
+tournent contre le même serveur local (StandInOllama de ollama_embed_benchmark).
+
+Usage:
+    python scripts/benchmarks/ollama_latency_benchmark.py [--calls 500] [--latency-ms 0] [--json]
+"""
+
+import json
+import time
+import argparse
+import statistics
+from typing import Any, Callable, Dict, List
+
+import requests
+
+from ollama_embed_benchmark import OllamaEmbedder, StandInOllama
+
+
+def measure(name: str, call: Callable[[int], Any], calls: int) -> Dict[str, Any]:
+    """Latences d'une série d'appels (ms)"""
+    latencies: List[float] = []
+    for i in range(calls):
+        start = time.perf_counter()
+        call(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    return {
+        "call": name,
+        "calls": calls,
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 3),
+    }
+
+
+def run(calls: int, latency_ms: float) -> Dict[str, List[Dict[str, Any]]]:
+    server = StandInOllama(latency_ms, per_text_ms=0.0, legacy_only=False)
+    model = "nomic-embed-text"
+    results: Dict[str, List[Dict[str, Any]]] = {"before": [], "after": []}
+
+    try:
+        # Avant: fonctions de module, une connexion par appel
+        connections = server.connections
+        results["before"] = [
+            measure("generate_embedding", lambda i: requests.post(
+                f"{server.url}/api/embeddings", json={"model": model, "prompt": f"texte {i}"}, timeout=30
+            ).json(), calls),
+            measure("check_availability", lambda i: requests.get(f"{server.url}/api/tags", timeout=5).json(), calls),
+            measure("get_model_info", lambda i: requests.post(
+                f"{server.url}/api/show", json={"name": model}, timeout=5
+            ).json(), calls),
+        ]
+        before_connections = server.connections - connections
+
+        # Après: session partagée de l'embedder (probe_ttl=0: chaque sonde fait
+        # sa requête HTTP, on mesure la réutilisation des connexions et non le cache)
+        connections = server.connections
+        with OllamaEmbedder(base_url=server.url, model=model, cache_size=0, probe_ttl=0) as embedder:
+            results["after"] = [
+                measure("generate_embedding", lambda i: embedder.generate_embedding(f"texte {i}"), calls),
+                measure("check_availability", lambda i: embedder.check_availability(), calls),
+                measure("get_model_info", lambda i: embedder.get_model_info(), calls),
+            ]
+        after_connections = server.connections - connections
+    finally:
+        server.close()
+
+    results["connections"] = {"before": before_connections, "after": after_connections}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-call latency with and without HTTP connection reuse")
+    parser.add_argument("--calls", type=int, default=500, help="Calls per method")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated server cost per request")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    args = parser.parse_args()
+
+    results = run(args.calls, args.latency_ms)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'call':>18} | {'before mean / p95':>19} | {'after mean / p95':>18} | {'speedup':>7}")
+    for before, after in zip(results["before"], results["after"]):
+        speedup = before["mean_ms"] / after["mean_ms"] if after["mean_ms"] else 0.0
+        print(
+            f"{before['call']:>18} | {before['mean_ms']:>7.2f} / {before['p95_ms']:>6.2f} ms | "
+            f"{after['mean_ms']:>6.2f} / {after['p95_ms']:>6.2f} ms | {speedup:>6.2f}x"
+        )
+    print(f"TCP connections opened: before {results['connections']['before']}, "
+          f"after {results['connections']['after']}")
+
+
+if __name__ == "__main__":
+    main()
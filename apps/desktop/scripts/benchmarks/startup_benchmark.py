@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Mesure le temps de démarrage des embedders et le profil d'import (-X importtime)
+
+Chaque scénario lance le script dans un nouveau processus Python, mesure le temps
+mural et résume la sortie -X importtime (imports top-level les plus coûteux).
+
+Usage:
+    python scripts/benchmarks/startup_benchmark.py [--runs 5] [--top 10] [--json]
+"""
+
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Any
+
+DESKTOP_DIR = Path(__file__).resolve().parent.parent.parent
+VISION_DIR = DESKTOP_DIR / "src" / "python" / "vision_rag"
+
+SCENARIOS = [
+    ("colette --check", VISION_DIR / "colette_embedder.py", ["--check"]),
+    ("colette status", VISION_DIR / "colette_embedder.py", ["--mode", "status"]),
+    ("mlx_vision --check", VISION_DIR / "mlx_vision_embedder.py", ["--check"]),
+    ("mlx_vision status", VISION_DIR / "mlx_vision_embedder.py", ["--mode", "status"]),
+]
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Parse les lignes 'import time: self | cumulative | module'"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+
+        try:
+            _, values = line.split(":", 1)
+            self_us, cumulative_us, name = values.split("|", 2)
+            entries.append({
+                # One separator space, then two spaces per nesting level
+                "module": name.rstrip()[1:],
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            })
+        except ValueError:
+            continue
+
+    return entries
+
+
+def summarize_imports(entries: List[Dict[str, Any]], top: int) -> Dict[str, Any]:
+    """Total et top-N des imports top-level (indentation nulle)"""
+    top_level = [e for e in entries if not e["module"].startswith(" ")]
+    top_level.sort(key=lambda e: e["cumulative_us"], reverse=True)
+
+    return {
+        "modules_imported": len(entries),
+        "total_import_ms": round(sum(e["cumulative_us"] for e in top_level) / 1000, 2),
+        "top_imports": [
+            {"module": e["module"].strip(), "cumulative_ms": round(e["cumulative_us"] / 1000, 2)}
+            for e in top_level[:top]
+        ],
+    }
+
+
+def run_scenario(script: Path, args: List[str], runs: int, top: int) -> Dict[str, Any]:
+    """Lance le scénario `runs` fois et garde le profil d'import du dernier run"""
+    wall_times = []
+    stderr = ""
+    exit_code = 0
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", str(script), *args],
+            capture_output=True,
+            text=True,
+        )
+        wall_times.append((time.perf_counter() - start) * 1000)
+        stderr = proc.stderr
+        exit_code = proc.returncode
+
+    wall_times.sort()
+
+    return {
+        "exit_code": exit_code,
+        "wall_ms_min": round(wall_times[0], 2),
+        "wall_ms_median": round(wall_times[len(wall_times) // 2], 2),
+        **summarize_imports(parse_importtime(stderr), top),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedder startup / import-time benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per scenario")
+    parser.add_argument("--top", type=int, default=10, help="Number of top imports to report")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    args = parser.parse_args()
+
+    results = {}
+    for name, script, script_args in SCENARIOS:
+        results[name] = run_scenario(script, script_args, args.runs, args.top)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for name, result in results.items():
+        print(f"\n== {name} (exit {result['exit_code']}) ==")
+        print(f"  wall: min {result['wall_ms_min']} ms, median {result['wall_ms_median']} ms")
+        print(f"  imports: {result['modules_imported']} modules, {result['total_import_ms']} ms")
+        for entry in result["top_imports"]:
+            print(f"    {entry['cumulative_ms']:>9.2f} ms  {entry['module']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,10 @@ const pythonFiles = [
     src: 'src/main/services/backends/mlx/mlx_embeddings.py',
     dest: 'dist/main/services/backends/mlx/mlx_embeddings.py',
   },
+  {
+    src: 'src/python/utils/embedding_store.py',
+    dest: 'dist/main/services/backends/mlx/embedding_store.py',
+  },
   {
     src: 'src/main/services/backends/mlx/mlx_model_downloader.py',
     dest: 'dist/main/services/backends/mlx/mlx_model_downloader.py',
@@ -19,6 +23,22 @@ const pythonFiles = [
     src: 'src/main/services/backends/mlx/mlx_embedding_downloader.py',
     dest: 'dist/main/services/backends/mlx/mlx_embedding_downloader.py',
   },
+  {
+    src: 'src/main/services/backends/mlx/mlx_request_dispatcher.py',
+    dest: 'dist/main/services/backends/mlx/mlx_request_dispatcher.py',
+  },
+  {
+    src: 'src/main/services/backends/mlx/mlx_prompt_cache.py',
+    dest: 'dist/main/services/backends/mlx/mlx_prompt_cache.py',
+  },
+  {
+    src: 'src/main/services/backends/mlx/mlx_structured_output.py',
+    dest: 'dist/main/services/backends/mlx/mlx_structured_output.py',
+  },
+  {
+    src: 'src/main/services/backends/mlx/mlx_batch_scheduler.py',
+    dest: 'dist/main/services/backends/mlx/mlx_batch_scheduler.py',
+  },
   {
     src: 'src/main/services/backends/mlx/mlx_llm.py',
     dest: 'dist/main/services/backends/mlx/mlx_llm.py',
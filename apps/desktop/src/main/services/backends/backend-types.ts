@@ -71,17 +71,29 @@ export interface ChatRequest {
   temperature?: number;
   maxTokens?: number;
   stream?: boolean;
+  conversationId?: string;
+  jsonSchema?: Record<string, unknown>; // Sortie contrainte par un JSON schema
+  regex?: string; // ou par une regex
+  // Arrêt de la génération (le texte déjà produit est conservé)
+  signal?: AbortSignal;
+  deadlineMs?: number;
 }
 
 export interface ChatResponse {
   content: string;
   model: string;
-  finishReason?: 'stop' | 'length' | 'error';
+  finishReason?: 'stop' | 'length' | 'error' | 'cancelled' | 'deadline';
 }
 
 export interface EmbeddingRequest {
   text: string | string[];
   model: string;
+  // Troncature Matryoshka (renormalisée) et arrondi float16 des embeddings retournés
+  dimensions?: number;
+  float16?: boolean;
+  // Arrêt du calcul côté serveur (la requête échoue alors)
+  signal?: AbortSignal;
+  deadlineMs?: number;
 }
 
 export interface EmbeddingResponse {
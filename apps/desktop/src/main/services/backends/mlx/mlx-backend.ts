@@ -6,8 +6,10 @@
 
 import { spawn, ChildProcess } from 'child_process';
 import { join } from 'path';
+import { homedir } from 'os';
 import { logger } from '../../log-service';
 import { BaseAIBackend } from '../backend-interface';
+import { findPendingRequest, watchAbort } from './mlx-request-queue';
 import type {
   BackendType,
   BackendStatus,
@@ -18,12 +20,18 @@ import type {
 } from '../backend-types';
 
 interface MLXRequest {
-  command: 'embed' | 'ping' | 'status';
+  command: 'embed' | 'warmup' | 'ping' | 'status' | 'store_stats' | 'cancel';
+  id?: number;
+  request_id?: number;
+  deadline_ms?: number;
   text?: string | string[];
   model?: string;
+  dimensions?: number;
+  float16?: boolean;
 }
 
 interface MLXResponse {
+  id?: number;
   success: boolean;
   embeddings?: number[] | number[][];
   dimensions?: number;
@@ -32,6 +40,22 @@ interface MLXResponse {
   message?: string;
   model_loaded?: string;
   ready?: boolean;
+  load_time_ms?: number | null;
+  warmup_time_ms?: number | null;
+  models?: Array<{
+    name: string;
+    size_mb: number;
+    requests: number;
+    loads: number;
+    evictions: number;
+  }>;
+  memory_budget_mb?: number;
+  memory_used_mb?: number;
+  partial?: boolean;
+  stopped?: 'cancelled' | 'deadline';
+  completed?: number;
+  time_saved_ms?: number;
+  from_store?: number;
 }
 
 export class MLXBackend extends BaseAIBackend {
@@ -48,13 +72,17 @@ export class MLXBackend extends BaseAIBackend {
   private requestId = 0;
   private isReady = false;
   private defaultModel = 'sentence-transformers/all-mpnet-base-v2';
+  // Cache persistant des embeddings (partagé avec OllamaEmbedder) ; null = désactivé
+  private storePath: string | null;
 
-  constructor(pythonPath?: string) {
+  constructor(pythonPath?: string, storePath?: string | null) {
     super();
     if (pythonPath) {
       this.pythonPath = pythonPath;
     }
     this.scriptPath = join(__dirname, 'mlx_embeddings.py');
+    this.storePath =
+      storePath === undefined ? join(homedir(), '.blackia', 'embedding_store.sqlite') : storePath;
   }
 
   async isAvailable(): Promise<boolean> {
@@ -112,7 +140,8 @@ export class MLXBackend extends BaseAIBackend {
     }
 
     // Démarrer le processus Python
-    this.pythonProcess = spawn(this.pythonPath, [this.scriptPath], {
+    const args = this.storePath ? [this.scriptPath, '--store-path', this.storePath] : [this.scriptPath];
+    this.pythonProcess = spawn(this.pythonPath, args, {
       stdio: ['pipe', 'pipe', 'pipe'],
     });
 
@@ -214,16 +243,30 @@ export class MLXBackend extends BaseAIBackend {
     logger.debug('backend', 'MLX generating embeddings', `Model: ${model}, Count: ${texts.length}`);
 
     try {
-      const response = await this.sendRequest({
-        command: 'embed',
-        text: texts,
-        model,
-      });
+      const response = await this.sendRequest(
+        {
+          command: 'embed',
+          text: texts,
+          model,
+          dimensions: request.dimensions,
+          float16: request.float16,
+          deadline_ms: request.deadlineMs,
+        },
+        false,
+        request.signal
+      );
 
       if (!response.success) {
         throw new Error(response.error || 'MLX embedding generation failed');
       }
 
+      // Annulée / échéance dépassée en cours de calcul : textes restants à null
+      if (response.partial) {
+        throw new Error(
+          `MLX embedding stopped (${response.stopped}): ${response.completed}/${texts.length} texts embedded`
+        );
+      }
+
       if (!response.embeddings) {
         throw new Error('No embeddings in response');
       }
@@ -273,7 +316,11 @@ export class MLXBackend extends BaseAIBackend {
   /**
    * Communication IPC avec le processus Python
    */
-  private async sendRequest(request: MLXRequest, skipReadyCheck: boolean = false): Promise<MLXResponse> {
+  private async sendRequest(
+    request: MLXRequest,
+    skipReadyCheck: boolean = false,
+    signal?: AbortSignal
+  ): Promise<MLXResponse> {
     // Permettre le ping initial sans vérifier isReady (pour éviter le deadlock)
     if (!skipReadyCheck && (!this.pythonProcess || !this.isReady)) {
       throw new Error('MLX backend not ready');
@@ -283,38 +330,59 @@ export class MLXBackend extends BaseAIBackend {
       throw new Error('MLX backend process not started');
     }
 
+    if (signal?.aborted) {
+      throw new Error('MLX request cancelled');
+    }
+
     return new Promise((resolve, reject) => {
       const id = this.requestId++;
+      // Le serveur répond à la requête annulée (résultat partiel ou stopped)
+      const unwatch = watchAbort(signal, () => this.cancelRequest(id));
       const timeout = setTimeout(() => {
         this.requestQueue.delete(id);
+        unwatch();
+        this.cancelRequest(id); // Inutile de continuer le calcul côté serveur
         reject(new Error('MLX request timeout'));
       }, 30000); // 30 secondes timeout
 
       this.requestQueue.set(id, {
         resolve: (response) => {
           clearTimeout(timeout);
+          unwatch();
           resolve(response);
         },
         reject: (error) => {
           clearTimeout(timeout);
+          unwatch();
           reject(error);
         },
       });
 
-      // Envoyer la requête
-      const requestLine = JSON.stringify(request) + '\n';
+      // Envoyer la requête (l'id permet au serveur de répondre dans le désordre)
+      const requestLine = JSON.stringify({ ...request, id }) + '\n';
       this.pythonProcess!.stdin?.write(requestLine);
     });
   }
 
+  private cancelRequest(requestId: number): void {
+    if (!this.pythonProcess) {
+      return;
+    }
+    this.sendRequest({ command: 'cancel', request_id: requestId }, true).catch((error) => {
+      logger.debug('backend', 'MLX cancel failed', '', {
+        error: error instanceof Error ? error.message : String(error),
+      });
+    });
+  }
+
   private handleResponse(line: string): void {
     try {
       const response: MLXResponse = JSON.parse(line);
 
-      // Prendre le premier callback dans la queue (FIFO)
-      const entries = Array.from(this.requestQueue.entries());
-      if (entries.length > 0) {
-        const [id, callback] = entries[0];
+      // Router par id si présent, sinon prendre le premier callback (FIFO)
+      const pending = findPendingRequest(this.requestQueue, response.id);
+      if (pending) {
+        const [id, callback] = pending;
         this.requestQueue.delete(id);
 
         if (response.success) {
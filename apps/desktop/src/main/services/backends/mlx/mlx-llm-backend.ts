@@ -9,6 +9,7 @@ import { spawn, ChildProcess } from 'child_process';
 import { join } from 'path';
 import { logger } from '../../log-service';
 import { BaseAIBackend } from '../backend-interface';
+import { findPendingRequest, watchAbort } from './mlx-request-queue';
 import type {
   BackendType,
   BackendStatus,
@@ -19,9 +20,19 @@ import type {
 } from '../backend-types';
 
 interface MLXLLMRequest {
-  command: 'load' | 'unload' | 'generate' | 'chat' | 'status' | 'ping';
+  command: 'load' | 'unload' | 'warmup' | 'generate' | 'chat' | 'status' | 'ping' | 'cancel' | 'forget';
+  id?: number;
+  conversation_id?: string;
+  prefix?: string;
+  max_prompt_tokens?: number;
+  json_schema?: Record<string, unknown> | string;
+  regex?: string;
+  request_id?: number;
+  deadline_ms?: number;
   model_path?: string;
   adapter_path?: string;
+  draft_model_path?: string;
+  warmup?: boolean;
   prompt?: string;
   messages?: Array<{ role: string; content: string }>;
   max_tokens?: number;
@@ -31,6 +42,7 @@ interface MLXLLMRequest {
 }
 
 interface MLXLLMResponse {
+  id?: number;
   success: boolean;
   type?: 'chunk' | 'complete' | 'error';
   content?: string;
@@ -41,6 +53,64 @@ interface MLXLLMResponse {
   mlx_available?: boolean;
   error?: string;
   message?: string;
+  load_time_ms?: number;
+  warmup_time_ms?: number | null;
+  finish_reason?: 'stop' | 'length' | 'cancelled' | 'deadline';
+  tokens_generated?: number;
+  batched?: boolean;
+  draft_model?: string | null;
+  warnings?: string[];
+  prompt_budget?: {
+    budget: number;
+    tokens_used: number;
+    tokens_trimmed: number;
+    messages_dropped: number;
+    over_budget: boolean;
+  };
+  refused?: 'memory_budget';
+  constraint?: {
+    type: 'json_schema' | 'regex';
+    valid: boolean;
+    compiled_cache_hit: boolean;
+    automaton_states: number;
+    overhead_ms: number;
+    overhead_per_token_ms: number;
+  };
+  memory?: {
+    peak_mb: number | null;
+    kv_bits: number | null;
+    max_kv_size: number | null;
+    budget_mb?: number;
+    available_mb?: number;
+    kv_estimate_mb?: number;
+    max_tokens_requested?: number;
+  };
+  speculative?: {
+    draft_model: string;
+    num_draft_tokens: number;
+    draft_tokens_proposed: number;
+    draft_tokens_accepted: number;
+    acceptance_rate: number;
+    tokens_per_verify_step: number;
+  };
+  tokens?: number;
+  ttft_ms?: number | null;
+  tokens_per_second?: number;
+  total_time_ms?: number;
+  usage?: {
+    prompt_tokens: number;
+    completion_tokens: number;
+    total_tokens: number;
+  };
+  cache?: {
+    conversation_id: string | null;
+    prefix_hit: boolean;
+    reused_tokens: number;
+    prefill_tokens: number;
+  };
+  partial?: boolean;
+  time_saved_ms?: number;
+  stopped?: 'cancelled' | 'deadline';
 }
 
 export class MLXLLMBackend extends BaseAIBackend {
@@ -264,21 +334,50 @@ export class MLXLLMBackend extends BaseAIBackend {
         temperature: request.temperature,
         top_p: 0.9,
         stream: true,
+        conversation_id: request.conversationId,
+        json_schema: request.jsonSchema,
+        regex: request.regex,
+        deadline_ms: request.deadlineMs,
       };
 
-      // Utiliser un pattern pour yield chaque chunk
+      // Yield chaque delta dès sa réception (le serveur n'envoie que le nouveau texte)
       const chunks: string[] = [];
+      let notify: (() => void) | null = null;
+      let done = false;
 
-      await this.sendRequestWithStreaming(
+      // Annulé par l'appelant, ou itération abandonnée avant la fin
+      const controller = new AbortController();
+      const unwatch = watchAbort(request.signal, () => controller.abort());
+
+      const completion = this.sendRequestWithStreaming(
         mlxRequest,
         (chunk) => {
           chunks.push(chunk);
+          notify?.();
+        },
+        controller.signal
+      ).finally(() => {
+        done = true;
+        notify?.();
+      });
+
+      try {
+        while (!done || chunks.length > 0) {
+          if (chunks.length === 0) {
+            await new Promise<void>((resolve) => (notify = resolve));
+            notify = null;
+            continue;
+          }
+          yield chunks.shift()!;
         }
-      );
 
-      // Yield tous les chunks collectés
-      for (const chunk of chunks) {
-        yield chunk;
+        await completion;
+      } finally {
+        unwatch();
+        if (!done) {
+          controller.abort();
+          completion.catch(() => {});
+        }
       }
     } catch (error) {
       logger.error('backend', 'MLX LLM chat error', '', {
@@ -313,9 +412,13 @@ export class MLXLLMBackend extends BaseAIBackend {
         temperature: request.temperature,
         top_p: 0.9,
         stream: false,
+        conversation_id: request.conversationId,
+        json_schema: request.jsonSchema,
+        regex: request.regex,
+        deadline_ms: request.deadlineMs,
       };
 
-      const response = await this.sendRequest(mlxRequest);
+      const response = await this.sendRequest(mlxRequest, false, request.signal);
 
       if (!response.success) {
         throw new Error(response.error || 'MLX LLM chat failed');
@@ -324,7 +427,8 @@ export class MLXLLMBackend extends BaseAIBackend {
       return {
         content: response.content || '',
         model: this.currentModel || 'unknown',
-        finishReason: 'stop',
+        // 'cancelled' / 'deadline' : texte partiel
+        finishReason: response.finish_reason ?? 'stop',
       };
     } catch (error) {
       logger.error('backend', 'MLX LLM chat error', '', {
@@ -362,12 +466,20 @@ export class MLXLLMBackend extends BaseAIBackend {
     ];
   }
 
-  async loadModel(modelPath: string): Promise<void> {
+  async loadModel(
+    modelPath: string,
+    warmup: boolean = true,
+    draftModelPath?: string
+  ): Promise<void> {
     logger.info('backend', 'Loading MLX model', modelPath);
 
+    // Le warmup absorbe la latence de la première requête au chargement ;
+    // un modèle brouillon active le décodage spéculatif
     const response = await this.sendRequest({
       command: 'load',
       model_path: modelPath,
+      warmup,
+      draft_model_path: draftModelPath,
     });
 
     if (!response.success) {
@@ -375,7 +487,12 @@ export class MLXLLMBackend extends BaseAIBackend {
     }
 
     this.currentModel = modelPath;
-    logger.info('backend', 'MLX model loaded successfully', modelPath);
+    logger.info('backend', 'MLX model loaded successfully', modelPath, {
+      loadTimeMs: response.load_time_ms,
+      warmupTimeMs: response.warmup_time_ms,
+      draftModel: response.draft_model,
+      warnings: response.warnings,
+    });
   }
 
   async unloadModel(): Promise<void> {
@@ -402,7 +519,8 @@ export class MLXLLMBackend extends BaseAIBackend {
    */
   private async sendRequest(
     request: MLXLLMRequest,
-    skipReadyCheck: boolean = false
+    skipReadyCheck: boolean = false,
+    signal?: AbortSignal
   ): Promise<MLXLLMResponse> {
     // Permettre le ping initial sans vérifier isReady (pour éviter le deadlock)
     if (!skipReadyCheck && (!this.pythonProcess || !this.isReady)) {
@@ -413,75 +531,106 @@ export class MLXLLMBackend extends BaseAIBackend {
       throw new Error('MLX LLM backend process not started');
     }
 
+    if (signal?.aborted) {
+      throw new Error('MLX LLM request cancelled');
+    }
+
     return new Promise((resolve, reject) => {
       const id = this.requestId++;
+      // Le serveur termine la requête annulée (texte partiel ou stopped)
+      const unwatch = watchAbort(signal, () => this.cancelRequest(id));
       const timeout = setTimeout(() => {
         this.requestQueue.delete(id);
+        unwatch();
+        this.cancelRequest(id); // Inutile de continuer la génération côté serveur
         reject(new Error('MLX LLM request timeout'));
       }, 60000); // 60 secondes timeout (modèles peuvent être longs à charger)
 
       this.requestQueue.set(id, {
         resolve: (response) => {
           clearTimeout(timeout);
+          unwatch();
           resolve(response);
         },
         reject: (error) => {
           clearTimeout(timeout);
+          unwatch();
           reject(error);
         },
       });
 
-      // Envoyer la requête
-      const requestLine = JSON.stringify(request) + '\n';
+      // Envoyer la requête (l'id permet au serveur de répondre dans le désordre)
+      const requestLine = JSON.stringify({ ...request, id }) + '\n';
       this.pythonProcess!.stdin?.write(requestLine);
     });
   }
 
   private async sendRequestWithStreaming(
     request: MLXLLMRequest,
-    onChunk: (chunk: string) => void
+    onChunk: (chunk: string) => void,
+    signal?: AbortSignal
   ): Promise<void> {
     if (!this.pythonProcess || !this.isReady) {
       throw new Error('MLX LLM backend not ready');
     }
 
+    if (signal?.aborted) {
+      throw new Error('MLX LLM request cancelled');
+    }
+
     return new Promise((resolve, reject) => {
       const id = this.requestId++;
+      const unwatch = watchAbort(signal, () => this.cancelRequest(id));
       const timeout = setTimeout(() => {
         this.requestQueue.delete(id);
+        unwatch();
+        this.cancelRequest(id);
         reject(new Error('MLX LLM request timeout'));
       }, 300000); // 5 minutes timeout pour génération longue
 
       this.requestQueue.set(id, {
         resolve: (response) => {
           clearTimeout(timeout);
+          unwatch();
           resolve();
         },
         reject: (error) => {
           clearTimeout(timeout);
+          unwatch();
           reject(error);
         },
         onChunk,
       });
 
-      // Envoyer la requête
-      const requestLine = JSON.stringify(request) + '\n';
+      // Envoyer la requête (l'id permet au serveur de répondre dans le désordre)
+      const requestLine = JSON.stringify({ ...request, id }) + '\n';
       this.pythonProcess!.stdin?.write(requestLine);
     });
   }
 
+  private cancelRequest(requestId: number): void {
+    if (!this.pythonProcess) {
+      return;
+    }
+    this.sendRequest({ command: 'cancel', request_id: requestId }, true).catch((error) => {
+      logger.debug('backend', 'MLX LLM cancel failed', '', {
+        error: error instanceof Error ? error.message : String(error),
+      });
+    });
+  }
+
   private handleResponse(line: string): void {
     try {
       const response: MLXLLMResponse = JSON.parse(line);
 
-      // Prendre le premier callback dans la queue (FIFO)
-      const entries = Array.from(this.requestQueue.entries());
-      if (entries.length === 0) {
+      // Router par id si présent, sinon prendre le premier callback (FIFO)
+      const pending = findPendingRequest(this.requestQueue, response.id);
+      if (!pending) {
         logger.warning('backend', 'Received MLX response with no pending request', '');
         return;
       }
 
-      const [id, callback] = entries[0];
+      const [id, callback] = pending;
 
       // Si c'est un chunk de streaming
       if (response.type === 'chunk' && callback.onChunk) {
@@ -0,0 +1,35 @@
+/**
+ * MLX Request Queue
+ * Routage des réponses des serveurs Python MLX (stdin/stdout) vers les requêtes en attente
+ */
+
+/**
+ * Requête en attente correspondant à une réponse
+ *
+ * Par id si le serveur l'a renvoyé (réponses dans le désordre), sinon la
+ * première requête en attente (FIFO). Retourne undefined si la requête a déjà
+ * été résolue ou a expiré.
+ */
+export function findPendingRequest<T>(
+  queue: Map<number, T>,
+  responseId: number | undefined
+): [number, T] | undefined {
+  if (responseId !== undefined) {
+    const callback = queue.get(responseId);
+    return callback !== undefined ? [responseId, callback] : undefined;
+  }
+  return queue.entries().next().value;
+}
+
+/**
+ * Appelle cancel quand signal est annulé (l'écouteur ne sert qu'une fois)
+ *
+ * Retourne la fonction qui retire l'écouteur, à appeler quand la requête se termine.
+ */
+export function watchAbort(signal: AbortSignal | undefined, cancel: () => void): () => void {
+  if (!signal) {
+    return () => {};
+  }
+  signal.addEventListener('abort', cancel, { once: true });
+  return () => signal.removeEventListener('abort', cancel);
+}
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+MLX Batch Scheduler
+Décodage par lots continu (continuous batching) pour mlx_llm_server.py
+
+Plusieurs générations concurrentes avancent dans le même pas de décodage :
+- les nouvelles requêtes rejoignent le lot au pas suivant (après leur prefill)
+- les séquences terminées (EOS, max_tokens, annulation) le quittent sans
+  bloquer les autres
+- chaque séquence garde ses propres paramètres (temperature, top_p, max_tokens)
+
+Le lot est géré par le BatchGenerator de mlx-lm ; si la version installée ne
+l'expose pas, l'ordonnanceur est désactivé et le serveur reste séquentiel.
+"""
+
+import sys
+import inspect
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from mlx_lm.generate import BatchGenerator
+    BATCH_GENERATOR_AVAILABLE = True
+    # Les paramètres acceptés varient selon la version de mlx-lm
+    BATCH_INIT_PARAMS = set(inspect.signature(BatchGenerator.__init__).parameters)
+    BATCH_INSERT_PARAMS = set(inspect.signature(BatchGenerator.insert).parameters)
+except ImportError:
+    BATCH_GENERATOR_AVAILABLE = False
+
+
+DEFAULT_MAX_BATCH_SIZE = 8
+
+
+class BatchSequence:
+    """Une génération dans le lot"""
+
+    def __init__(
+        self,
+        prompt_tokens: List[int],
+        max_tokens: int,
+        sampler: Any,
+        on_token: Callable[[int], Optional[str]]
+    ):
+        """
+        Args:
+            prompt_tokens: Tokens du prompt
+            max_tokens: Nombre maximum de tokens à générer
+            sampler: Échantillonneur propre à la séquence
+            on_token: Appelé pour chaque token généré ; retourne une raison
+                d'arrêt ('cancelled', 'deadline') ou None
+        """
+        self.prompt_tokens = prompt_tokens
+        self.max_tokens = max_tokens
+        self.sampler = sampler
+        self.on_token = on_token
+
+        self.uid = None
+        self.finish_reason: Optional[str] = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+    def finish(self, reason: Optional[str] = None, error: Optional[str] = None):
+        self.finish_reason = reason
+        self.error = error
+        self.done.set()
+
+
+class BatchScheduler:
+    """Boucle de décodage par lots, dans son propre thread"""
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        model_lock: threading.RLock,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        default_sampler: Any = None
+    ):
+        """
+        Args:
+            model: Modèle mlx-lm chargé
+            tokenizer: Tokenizer associé (tokens EOS)
+            model_lock: Verrou partagé avec les autres accès au modèle
+            max_batch_size: Nombre maximum de séquences décodées ensemble
+            default_sampler: Échantillonneur si la version de mlx-lm n'accepte
+                pas d'échantillonneur par séquence
+        """
+        self.model_lock = model_lock
+        self.max_batch_size = max_batch_size
+        self.per_sequence_sampling = "samplers" in BATCH_INSERT_PARAMS
+
+        eos_ids = getattr(tokenizer, "eos_token_ids", None) or [tokenizer.eos_token_id]
+        kwargs = {
+            "stop_tokens": set(eos_ids),
+            "sampler": default_sampler,
+            "completion_batch_size": max_batch_size,
+            "prefill_batch_size": max_batch_size
+        }
+        kwargs = {
+            key: value for key, value in kwargs.items()
+            if value is not None and key in BATCH_INIT_PARAMS
+        }
+        self.generator = BatchGenerator(model, **kwargs)
+
+        if not self.per_sequence_sampling:
+            sys.stderr.write("[MLX LLM] BatchGenerator has no per-sequence samplers, using default sampling\n")
+            sys.stderr.flush()
+
+        self._pending: List[BatchSequence] = []
+        self._active: Dict[Any, BatchSequence] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Statistiques
+        self.steps = 0
+        self.tokens_generated = 0
+        self.sequences_completed = 0
+        self._batch_size_sum = 0
+        self.max_observed_batch = 0
+
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, sequence: BatchSequence) -> BatchSequence:
+        """Ajoute une séquence ; elle rejoint le lot au prochain pas"""
+        with self._cond:
+            if self._closed:
+                sequence.finish(error="Batch scheduler is closed")
+                return sequence
+            self._pending.append(sequence)
+            self._cond.notify()
+        return sequence
+
+    def close(self):
+        """Termine les séquences en cours puis arrête la boucle"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _insert(self, sequences: List[BatchSequence]):
+        kwargs = {"max_tokens": [s.max_tokens for s in sequences]}
+        if self.per_sequence_sampling:
+            kwargs["samplers"] = [s.sampler for s in sequences]
+
+        uids = self.generator.insert([s.prompt_tokens for s in sequences], **kwargs)
+        for sequence, uid in zip(sequences, uids):
+            sequence.uid = uid
+            self._active[uid] = sequence
+
+    def _step(self):
+        """Un pas de décodage pour tout le lot"""
+        with self._cond:
+            pending, self._pending = self._pending, []
+
+        with self.model_lock:
+            if pending:
+                self._insert(pending)
+            responses = self.generator.next()
+
+        self.steps += 1
+        self._batch_size_sum += len(responses)
+        self.max_observed_batch = max(self.max_observed_batch, len(responses))
+
+        stopped = []
+        for response in responses:
+            sequence = self._active.get(response.uid)
+            if sequence is None:
+                continue
+
+            reason = response.finish_reason
+            # Le token EOS ne fait pas partie de la réponse
+            if reason != "stop":
+                self.tokens_generated += 1
+                stop_reason = sequence.on_token(response.token)
+                if stop_reason and reason is None:
+                    reason = stop_reason
+                    stopped.append(response.uid)
+
+            if reason is not None:
+                del self._active[response.uid]
+                self.sequences_completed += 1
+                sequence.finish(reason)
+
+        if stopped:
+            # Annulées / échéance dépassée : retirer du lot sans attendre
+            with self.model_lock:
+                self.generator.remove(stopped)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._active and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending and not self._active:
+                    return
+
+            try:
+                self._step()
+            except Exception as e:
+                sys.stderr.write(f"[MLX LLM] Batch decoding error: {str(e)}\n")
+                sys.stderr.flush()
+
+                failed = list(self._active.values())
+                self._active.clear()
+                with self.model_lock:
+                    try:
+                        self.generator.remove([s.uid for s in failed])
+                    except Exception:
+                        pass
+                for sequence in failed:
+                    sequence.finish(error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        """Taille de lot moyenne, pas de décodage et séquences en cours"""
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "per_sequence_sampling": self.per_sequence_sampling,
+            "active": len(self._active),
+            "pending": pending,
+            "steps": self.steps,
+            "tokens_generated": self.tokens_generated,
+            "sequences_completed": self.sequences_completed,
+            "avg_batch_size": round(self._batch_size_sum / self.steps, 2) if self.steps else 0.0,
+            "max_observed_batch": self.max_observed_batch
+        }
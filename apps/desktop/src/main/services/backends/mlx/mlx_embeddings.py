@@ -8,64 +8,581 @@ Communication via stdin/stdout en JSON
 """
 
 import sys
-import json
+import gc
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from pathlib import Path
 import numpy as np
 from sentence_transformers import SentenceTransformer
-from typing import Dict, List, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from mlx_request_dispatcher import RequestDispatcher
+
+try:
+    from embedding_store import EmbeddingStore, DEFAULT_STORE_MAX_MB
+except ImportError:
+    # En développement: module partagé avec src/python/utils (copié à côté au build)
+    sys.path.insert(0, str(Path(__file__).resolve().parents[4] / "python" / "utils"))
+    from embedding_store import EmbeddingStore, DEFAULT_STORE_MAX_MB
+
+
+DEFAULT_MODEL = "sentence-transformers/all-mpnet-base-v2"
+DEFAULT_MEMORY_BUDGET_MB = 2048
+DEFAULT_MAX_MODELS = 4
+DEFAULT_MAX_TOKENS_PER_BATCH = 8192
+DEFAULT_MAX_BATCH_SIZE = 128
+DEFAULT_COALESCE_WINDOW_MS = 5.0
+
+# Modèles dont la recette Matryoshka applique layer_norm au vecteur complet avant troncature
+_LAYER_NORM_MODELS = ("nomic-embed-text", "nomic-embed-text-v1.5")
+
 
 class MLXEmbeddingServer:
-    def __init__(self):
+    def __init__(
+        self,
+        memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+        max_models: int = DEFAULT_MAX_MODELS,
+        max_tokens_per_batch: int = DEFAULT_MAX_TOKENS_PER_BATCH,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        coalesce_window_ms: float = DEFAULT_COALESCE_WINDOW_MS,
+        max_workers: int = 1,
+        store_path: Optional[str] = None,
+        store_max_mb: float = DEFAULT_STORE_MAX_MB,
+        dimensions: Optional[int] = None,
+        float16: bool = False
+    ):
+        # Pool de modèles résidents, du moins au plus récemment utilisé
+        self.models: "OrderedDict[str, Dict]" = OrderedDict()
+        self.memory_budget_mb = memory_budget_mb
+        self.max_models = max(1, max_models)
+        # Statistiques par modèle, conservées après éviction
+        self.model_stats: Dict[str, Dict] = {}
+        self.evictions = 0
+
+        # Batching dynamique
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.coalesce_window_ms = coalesce_window_ms
+        self.coalesced_requests = 0
+
+        # Cache persistant (sha256(texte), modèle, révision): seuls les textes
+        # jamais vus passent par le modèle
+        self.store = EmbeddingStore(store_path, store_max_mb) if store_path else None
+
+        # Sortie par défaut (surchargée par requête): troncature Matryoshka, float16
+        self._check_dimensions(dimensions)
+        self.dimensions = dimensions
+        self.float16 = float16
+
+        # Protège le pool (status est traité pendant qu'un worker charge un modèle)
+        self._pool_lock = threading.RLock()
+
+        # ping/status répondent immédiatement, embed passe par les workers
+        # et les requêtes embed proches sont regroupées en une passe
+        self.dispatcher = RequestDispatcher(
+            "[MLX]",
+            self.handle_request,
+            control_commands=("ping", "status", "store_stats"),
+            max_workers=max_workers,
+            batch_handlers={"embed": self.generate_embeddings_coalesced},
+            batch_window_ms=coalesce_window_ms
+        )
+
+        # Modèle le plus récemment utilisé (compatibilité avec status)
         self.model = None
         self.current_model_name = None
 
-    def load_model(self, model_name: str):
-        """Charge un modèle d'embeddings"""
-        if self.current_model_name == model_name and self.model is not None:
+    def _estimate_model_size_mb(self, model) -> float:
+        """Taille des poids et buffers du modèle en Mo"""
+        total_bytes = 0
+        for tensor in list(model.parameters()) + list(model.buffers()):
+            total_bytes += tensor.numel() * tensor.element_size()
+        return total_bytes / (1024 * 1024)
+
+    def _memory_used_mb(self) -> float:
+        return sum(entry["size_mb"] for entry in self.models.values())
+
+    def _stats_for(self, model_name: str) -> Dict:
+        return self.model_stats.setdefault(model_name, {
+            "loads": 0,
+            "requests": 0,
+            "evictions": 0
+        })
+
+    def _evict_if_needed(self, keep: str):
+        """Évince les modèles LRU tant que le budget mémoire ou le nombre max est dépassé"""
+        evicted = False
+        while len(self.models) > 1 and (
+            len(self.models) > self.max_models
+            or self._memory_used_mb() > self.memory_budget_mb
+        ):
+            victim = next(name for name in self.models if name != keep)
+            entry = self.models.pop(victim)
+            self._stats_for(victim)["evictions"] += 1
+            self.evictions += 1
+
+            sys.stderr.write(f"[MLX] Evicting model: {victim} ({entry['size_mb']:.0f} MB)\n")
+            sys.stderr.flush()
+            evicted = True
+
+            # Dernières références au modèle évincé, sinon gc ne peut pas le libérer
+            if self.current_model_name == victim:
+                self.model = None
+                self.current_model_name = None
+            del entry
+
+        if not evicted:
             return
 
+        # Rendre la mémoire au système (Metal / CUDA gardent un cache d'allocation)
+        gc.collect()
         try:
-            sys.stderr.write(f"[MLX] Loading model: {model_name}\n")
-            sys.stderr.flush()
+            import torch
+            if torch.backends.mps.is_available():
+                torch.mps.empty_cache()
+            elif torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+
+    def load_model(self, model_name: str):
+        """Charge un modèle d'embeddings (ou le réutilise depuis le pool)"""
+        with self._pool_lock:
+            entry = self.models.get(model_name)
+
+        if entry is None:
+            try:
+                sys.stderr.write(f"[MLX] Loading model: {model_name}\n")
+                sys.stderr.flush()
+
+                load_start = time.perf_counter()
+                model = SentenceTransformer(model_name)
+                load_time_ms = (time.perf_counter() - load_start) * 1000
+
+                entry = {
+                    "model": model,
+                    "size_mb": self._estimate_model_size_mb(model),
+                    "load_time_ms": load_time_ms,
+                    "warmup_time_ms": None,
+                    "loaded_at": time.time(),
+                    "last_used": time.time(),
+                    "revision": self._model_revision(model_name)
+                }
+                with self._pool_lock:
+                    self.models[model_name] = entry
+                    self._stats_for(model_name)["loads"] += 1
+                    self._evict_if_needed(keep=model_name)
+
+                sys.stderr.write(
+                    f"[MLX] Model loaded successfully ({load_time_ms:.0f} ms, {entry['size_mb']:.0f} MB)\n"
+                )
+                sys.stderr.flush()
+
+            except Exception as e:
+                sys.stderr.write(f"[MLX] Error loading model: {str(e)}\n")
+                sys.stderr.flush()
+                raise
+
+        with self._pool_lock:
+            if model_name in self.models:
+                self.models.move_to_end(model_name)
+            entry["last_used"] = time.time()
 
-            self.model = SentenceTransformer(model_name)
+            self.model = entry["model"]
             self.current_model_name = model_name
+            return self.model
 
-            sys.stderr.write(f"[MLX] Model loaded successfully\n")
-            sys.stderr.flush()
-        except Exception as e:
-            sys.stderr.write(f"[MLX] Error loading model: {str(e)}\n")
-            sys.stderr.flush()
-            raise
+    @staticmethod
+    def _model_revision(model_name: str) -> str:
+        """Commit du snapshot Hugging Face du modèle (clé du cache persistant), "" si inconnu"""
+        try:
+            from huggingface_hub import try_to_load_from_cache
+            path = try_to_load_from_cache(model_name, "config.json")
+            if isinstance(path, str):
+                # .../models--org--name/snapshots/<commit>/config.json
+                return Path(path).parent.name
+        except Exception:
+            pass
+        return ""
+
+    def _token_lengths(self, model, texts: List[str]) -> List[int]:
+        """Longueur en tokens de chaque texte (approximation si pas de tokenizer)"""
+        tokenizer = getattr(model, "tokenizer", None)
+        max_length = getattr(model, "max_seq_length", None) or 512
+
+        if tokenizer is not None:
+            try:
+                encoded = tokenizer(
+                    texts,
+                    add_special_tokens=True,
+                    truncation=True,
+                    max_length=max_length
+                )
+                return [len(ids) for ids in encoded["input_ids"]]
+            except Exception:
+                pass
+
+        # ~4 caractères par token
+        return [min(max_length, len(t) // 4 + 2) for t in texts]
+
+    def _make_batches(self, order: List[int], lengths: List[int]) -> List[List[int]]:
+        """
+        Découpe des indices triés par longueur en lots
+
+        Le coût d'un lot est nb_textes x plus_long_texte (padding compris) ;
+        on ferme le lot quand ce coût dépasserait max_tokens_per_batch.
+        """
+        batches = []
+        current: List[int] = []
+        longest = 0
+
+        for idx in order:
+            candidate_longest = max(longest, lengths[idx])
+            if current and (
+                (len(current) + 1) * candidate_longest > self.max_tokens_per_batch
+                or len(current) >= self.max_batch_size
+            ):
+                batches.append(current)
+                current = []
+                candidate_longest = lengths[idx]
+
+            current.append(idx)
+            longest = candidate_longest
+
+        if current:
+            batches.append(current)
+
+        return batches
+
+    def _encode_batched(
+        self,
+        model,
+        texts: List[str],
+        should_stop: Optional[Callable[[], Optional[str]]] = None
+    ) -> Tuple[List[List[float]], int, Optional[Dict]]:
+        """
+        Encode des textes triés par longueur en tokens, par lots à budget de tokens,
+        puis restaure l'ordre d'origine
+
+        should_stop est consulté avant chaque lot ; s'il retourne une raison
+        ('cancelled', 'deadline'), les textes restants valent None.
+
+        Returns:
+            Tuple (embeddings dans l'ordre d'entrée, nombre de lots, infos d'arrêt ou None)
+        """
+        if not texts:
+            return [], 0, None
+
+        lengths = self._token_lengths(model, texts)
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+        batches = self._make_batches(order, lengths)
+        # Coût d'un lot en tokens paddés, pour estimer le temps économisé
+        costs = [len(batch) * max(lengths[i] for i in batch) for batch in batches]
+
+        results: List[List[float]] = [None] * len(texts)
+        start = time.perf_counter()
+
+        for n, batch in enumerate(batches):
+            reason = should_stop() if should_stop else None
+            if reason:
+                done_tokens = sum(costs[:n])
+                per_token = (time.perf_counter() - start) / done_tokens if done_tokens else 0.0
+                stop = {
+                    "stopped": reason,
+                    "completed": sum(len(b) for b in batches[:n]),
+                    "time_saved_ms": round(per_token * sum(costs[n:]) * 1000, 1)
+                }
+                sys.stderr.write(f"[MLX] Encoding {reason} after {n}/{len(batches)} batches\n")
+                sys.stderr.flush()
+                return results, n, stop
+
+            embeddings = model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+            for idx, emb in zip(batch, embeddings):
+                results[idx] = emb.tolist()
+
+        return results, len(batches), None
+
+    def _encode_cached(
+        self,
+        model_name: str,
+        model,
+        texts: List[str],
+        should_stop: Optional[Callable[[], Optional[str]]] = None
+    ) -> Tuple[List[List[float]], int, Optional[Dict], int]:
+        """
+        _encode_batched précédé d'une recherche groupée dans le cache persistant
+
+        Seuls les textes absents du cache sont encodés, puis enregistrés.
+
+        Returns:
+            Tuple (embeddings, nombre de lots, infos d'arrêt ou None, textes trouvés en cache)
+        """
+        if self.store is None or not texts:
+            return (*self._encode_batched(model, texts, should_stop=should_stop), 0)
+
+        with self._pool_lock:
+            revision = self.models.get(model_name, {}).get("revision", "")
+
+        results = self.store.get_many(texts, model_name, revision)
+        missing = [i for i, embedding in enumerate(results) if embedding is None]
+        hits = len(texts) - len(missing)
+
+        computed, num_batches, stop = self._encode_batched(
+            model, [texts[i] for i in missing], should_stop=should_stop
+        )
+        for i, embedding in zip(missing, computed):
+            results[i] = embedding
+        self.store.put_many([texts[i] for i in missing], computed, model_name, revision)
+
+        if stop:
+            stop["completed"] += hits
+        return results, num_batches, stop, hits
+
+    def _reduce(
+        self,
+        embeddings: List[Optional[List[float]]],
+        dimensions: Optional[int],
+        float16: bool,
+        model_name: str = ""
+    ) -> List[Optional[List[float]]]:
+        """
+        Troncature Matryoshka (premières composantes, renormalisées L2) puis float16
 
-    def generate_embedding(self, text: Union[str, List[str]], model_name: str) -> Dict:
-        """Génère un embedding pour un ou plusieurs textes"""
+        Appliquée à la sortie seulement : le cache persistant garde les vecteurs complets.
+        Pour nomic-embed-text v1.5, layer_norm est d'abord appliqué au vecteur complet
+        (à une échelle près, effacée par la normalisation : retrancher la moyenne).
+        Les valeurs float16 sont écrites avec 5 chiffres significatifs, comme
+        les embedders Ollama (text_rag/ollama_embeddings.py).
+        """
+        if not dimensions and not float16:
+            return embeddings
+
+        layer_norm = model_name.split(":", 1)[0].rsplit("/", 1)[-1].lower() in _LAYER_NORM_MODELS
+        reduced = []
+        for embedding in embeddings:
+            if embedding is None:
+                reduced.append(None)
+                continue
+            vector = np.asarray(embedding, dtype=np.float32)
+            if dimensions and dimensions < vector.shape[0]:
+                if layer_norm:
+                    vector = vector - vector.mean()
+                vector = vector[:dimensions]
+                norm = np.linalg.norm(vector)
+                if norm:
+                    vector = vector / norm
+            if float16:
+                reduced.append([float(f"{value:.5g}") for value in vector.astype(np.float16).tolist()])
+            else:
+                reduced.append(vector.tolist())
+        return reduced
+
+    @staticmethod
+    def _check_dimensions(dimensions: Optional[int]):
+        """Refuse une troncature vide ou négative (ValueError)"""
+        if dimensions is not None and (isinstance(dimensions, bool) or not isinstance(dimensions, int) or dimensions < 1):
+            raise ValueError(f"dimensions must be a positive integer, got {dimensions!r}")
+
+    def _output_options(self, request: Dict) -> Tuple[Optional[int], bool]:
+        """dimensions / float16 d'une requête, sinon ceux du serveur"""
+        return request.get("dimensions", self.dimensions), request.get("float16", self.float16)
+
+    @staticmethod
+    def _dimensions(embeddings: List[Optional[List[float]]]) -> int:
+        """Dimension des embeddings (ignore les textes non calculés)"""
+        return next((len(e) for e in embeddings if e is not None), 0)
+
+    def _stop_check(self, request: Dict) -> Callable[[], Optional[str]]:
+        """Test d'arrêt (cancel / deadline) d'une requête donnée"""
+        return lambda: self.dispatcher.check_stop(request.get("id"))
+
+    def generate_embedding(
+        self,
+        text: Union[str, List[str]],
+        model_name: str,
+        should_stop: Optional[Callable[[], Optional[str]]] = None,
+        dimensions: Optional[int] = None,
+        float16: Optional[bool] = None
+    ) -> Dict:
+        """
+        Génère un embedding pour un ou plusieurs textes
+
+        dimensions / float16 (défaut: ceux du serveur) réduisent les embeddings retournés.
+        """
         try:
+            if dimensions is not None:
+                self._check_dimensions(dimensions)
+
             # Charger le modèle si nécessaire
-            self.load_model(model_name)
+            model = self.load_model(model_name)
+            self._stats_for(model_name)["requests"] += 1
 
             # Générer l'embedding
             is_batch = isinstance(text, list)
             texts = text if is_batch else [text]
 
-            embeddings = self.model.encode(
-                texts,
-                show_progress_bar=False,
-                convert_to_numpy=True
+            embeddings, num_batches, stop, from_store = self._encode_cached(
+                model_name, model, texts, should_stop=should_stop or self.dispatcher.check_stop
+            )
+            embeddings = self._reduce(
+                embeddings,
+                self.dimensions if dimensions is None else dimensions,
+                self.float16 if float16 is None else float16,
+                model_name
             )
 
             # Convertir en liste Python
-            if is_batch:
-                result = [emb.tolist() for emb in embeddings]
-            else:
-                result = embeddings[0].tolist()
+            result = embeddings if is_batch else embeddings[0]
 
-            return {
+            response = {
                 "success": True,
                 "embeddings": result,
-                "dimensions": len(result) if not is_batch else len(result[0]),
+                "dimensions": self._dimensions(embeddings),
+                "model": model_name,
+                "batches": num_batches,
+                "from_store": from_store
+            }
+            if stop:
+                response.update(stop, partial=True)
+            return response
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
                 "model": model_name
             }
 
+    def generate_embeddings_coalesced(self, requests: List[Dict]) -> List[Dict]:
+        """
+        Traite plusieurs requêtes embed arrivées ensemble en une seule passe par modèle
+
+        Les réponses sont retournées dans l'ordre des requêtes.
+        """
+        if len(requests) == 1:
+            request = requests[0]
+            return [self.generate_embedding(
+                request.get("text"),
+                request.get("model", DEFAULT_MODEL),
+                self._stop_check(request),
+                *self._output_options(request)
+            )]
+
+        responses: List[Dict] = [None] * len(requests)
+
+        # Regrouper par modèle
+        groups: "OrderedDict[str, List[int]]" = OrderedDict()
+        for i, request in enumerate(requests):
+            model_name = request.get("model", DEFAULT_MODEL)
+            try:
+                self._check_dimensions(self._output_options(request)[0])
+            except ValueError as e:
+                # Refusée avant la passe commune
+                responses[i] = {"success": False, "error": str(e), "model": model_name}
+                continue
+            groups.setdefault(model_name, []).append(i)
+
+        for model_name, indices in groups.items():
+            try:
+                model = self.load_model(model_name)
+
+                all_texts: List[str] = []
+                spans = []
+                for i in indices:
+                    text = requests[i].get("text")
+                    texts = text if isinstance(text, list) else [text]
+                    spans.append((i, isinstance(text, list), len(all_texts), len(texts)))
+                    all_texts.extend(texts)
+
+                # Le lot commun ne s'arrête que si toutes ses requêtes sont arrêtées
+                group_ids = [requests[i].get("id") for i in indices]
+
+                def group_stopped() -> Optional[str]:
+                    reasons = [self.dispatcher.check_stop(rid) for rid in group_ids]
+                    return reasons[0] if all(reasons) else None
+
+                embeddings, num_batches, stop, from_store = self._encode_cached(
+                    model_name, model, all_texts, should_stop=group_stopped
+                )
+                self._stats_for(model_name)["requests"] += len(indices)
+                self.coalesced_requests += len(indices)
+
+                for i, is_batch, offset, count in spans:
+                    result = self._reduce(
+                        embeddings[offset:offset + count], *self._output_options(requests[i]), model_name
+                    )
+                    dimensions = self._dimensions(result)
+                    if not is_batch:
+                        result = result[0]
+                    responses[i] = {
+                        "success": True,
+                        "embeddings": result,
+                        "dimensions": dimensions,
+                        "model": model_name,
+                        "batches": num_batches,
+                        "coalesced": len(indices),
+                        "from_store": from_store
+                    }
+                    if stop:
+                        responses[i].update(stop, partial=True)
+
+            except Exception:
+                # Une requête invalide ne doit pas faire échouer les autres
+                for i in indices:
+                    responses[i] = self.generate_embedding(
+                        requests[i].get("text"),
+                        model_name,
+                        self._stop_check(requests[i]),
+                        *self._output_options(requests[i])
+                    )
+
+        return responses
+
+    def warmup(self, model_name: str) -> Dict:
+        """
+        Charge le modèle puis l'exécute sur des entrées factices
+
+        Évite que la première vraie requête paie la compilation des kernels,
+        la croissance de l'allocateur et les défauts de page sur les poids.
+        """
+        try:
+            model = self.load_model(model_name)
+            entry = self.models[model_name]
+
+            sys.stderr.write(f"[MLX] Warming up model: {model_name}\n")
+            sys.stderr.flush()
+
+            warmup_start = time.perf_counter()
+
+            # Toucher tous les poids pour les rendre résidents
+            for param in model.parameters():
+                param.detach().sum().item()
+
+            # Formes représentatives: requête courte seule, lot de chunks longs
+            max_words = min(model.max_seq_length or 256, 512)
+            long_text = " ".join(["warmup"] * max_words)
+            model.encode(["warmup"], show_progress_bar=False, convert_to_numpy=True)
+            model.encode([long_text] * 8, show_progress_bar=False, convert_to_numpy=True)
+
+            entry["warmup_time_ms"] = (time.perf_counter() - warmup_start) * 1000
+
+            sys.stderr.write(f"[MLX] Warmup done ({entry['warmup_time_ms']:.0f} ms)\n")
+            sys.stderr.flush()
+
+            return {
+                "success": True,
+                "model": model_name,
+                "load_time_ms": round(entry["load_time_ms"], 2),
+                "warmup_time_ms": round(entry["warmup_time_ms"], 2)
+            }
+
         except Exception as e:
             return {
                 "success": False,
@@ -73,24 +590,69 @@ class MLXEmbeddingServer:
                 "model": model_name
             }
 
+    def get_status(self) -> Dict:
+        """Statut du serveur et du pool de modèles"""
+        with self._pool_lock:
+            return self._build_status()
+
+    def _build_status(self) -> Dict:
+        models = []
+        for name, entry in self.models.items():
+            stats = self._stats_for(name)
+            models.append({
+                "name": name,
+                "size_mb": round(entry["size_mb"], 1),
+                "load_time_ms": round(entry["load_time_ms"], 2),
+                "warmup_time_ms": round(entry["warmup_time_ms"], 2) if entry["warmup_time_ms"] is not None else None,
+                "last_used": entry["last_used"],
+                "requests": stats["requests"],
+                "loads": stats["loads"],
+                "evictions": stats["evictions"]
+            })
+
+        return {
+            "success": True,
+            "model_loaded": self.current_model_name,
+            "ready": self.model is not None,
+            "models": models,
+            "memory_budget_mb": self.memory_budget_mb,
+            "memory_used_mb": round(self._memory_used_mb(), 1),
+            "max_models": self.max_models,
+            "evictions": self.evictions,
+            "model_stats": self.model_stats,
+            "max_tokens_per_batch": self.max_tokens_per_batch,
+            "coalesce_window_ms": self.coalesce_window_ms,
+            "coalesced_requests": self.coalesced_requests,
+            "in_flight": self.dispatcher.in_flight(),
+            "cancelled_requests": self.dispatcher.cancelled_count,
+            "store": self.store.stats() if self.store is not None else None,
+            "output_dimensions": self.dimensions,
+            "output_float16": self.float16
+        }
+
     def handle_request(self, request: Dict) -> Dict:
         """Traite une requête"""
         command = request.get("command")
 
         if command == "embed":
             text = request.get("text")
-            model = request.get("model", "sentence-transformers/all-mpnet-base-v2")
-            return self.generate_embedding(text, model)
+            model = request.get("model", DEFAULT_MODEL)
+            return self.generate_embedding(text, model, None, *self._output_options(request))
+
+        elif command == "warmup":
+            model = request.get("model", DEFAULT_MODEL)
+            return self.warmup(model)
 
         elif command == "ping":
             return {"success": True, "message": "pong"}
 
         elif command == "status":
-            return {
-                "success": True,
-                "model_loaded": self.current_model_name,
-                "ready": self.model is not None
-            }
+            return self.get_status()
+
+        elif command == "store_stats":
+            if self.store is None:
+                return {"success": False, "error": "Embedding store disabled"}
+            return {"success": True, **self.store.stats()}
 
         else:
             return {
@@ -99,54 +661,50 @@ class MLXEmbeddingServer:
             }
 
     def run(self):
-        """Boucle principale de traitement des requêtes"""
+        """Boucle principale de traitement des requêtes (multiplexée)"""
         sys.stderr.write("[MLX] Embedding server started\n")
         sys.stderr.flush()
 
-        while True:
-            try:
-                # Lire une ligne depuis stdin
-                line = sys.stdin.readline()
-
-                if not line:
-                    # EOF - terminer proprement
-                    sys.stderr.write("[MLX] Received EOF, shutting down\n")
-                    sys.stderr.flush()
-                    break
-
-                # Parser la requête JSON
-                request = json.loads(line.strip())
-
-                # Traiter la requête
-                response = self.handle_request(request)
+        self.dispatcher.run()
 
-                # Envoyer la réponse en JSON
-                print(json.dumps(response))
-                sys.stdout.flush()
-
-            except json.JSONDecodeError as e:
-                error_response = {
-                    "success": False,
-                    "error": f"Invalid JSON: {str(e)}"
-                }
-                print(json.dumps(error_response))
-                sys.stdout.flush()
-
-            except KeyboardInterrupt:
-                sys.stderr.write("[MLX] Received interrupt, shutting down\n")
-                sys.stderr.flush()
-                break
+def main():
+    parser = argparse.ArgumentParser(description="MLX Embeddings Server")
+    parser.add_argument("--memory-budget-mb", type=float, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help="Memory budget for resident embedding models")
+    parser.add_argument("--max-models", type=int, default=DEFAULT_MAX_MODELS,
+                        help="Maximum number of resident embedding models")
+    parser.add_argument("--max-tokens-per-batch", type=int, default=DEFAULT_MAX_TOKENS_PER_BATCH,
+                        help="Padded token budget per forward batch")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help="Maximum number of texts per forward batch")
+    parser.add_argument("--coalesce-window-ms", type=float, default=DEFAULT_COALESCE_WINDOW_MS,
+                        help="Window for merging queued embed requests (0 = disabled)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker threads for embed/warmup requests")
+    parser.add_argument("--store-path",
+                        help="Persistent content-hash embedding store, SQLite file (disabled if omitted)")
+    parser.add_argument("--store-max-mb", type=float, default=DEFAULT_STORE_MAX_MB,
+                        help="Size of the persistent store before least-recently-used eviction")
+    parser.add_argument("--dimensions", type=int,
+                        help="Default Matryoshka truncation of returned embeddings (e.g. 256, 512)")
+    parser.add_argument("--float16", action="store_true", help="Return float16-rounded embeddings by default")
+    args = parser.parse_args()
 
-            except Exception as e:
-                error_response = {
-                    "success": False,
-                    "error": f"Unexpected error: {str(e)}"
-                }
-                print(json.dumps(error_response))
-                sys.stdout.flush()
+    if args.dimensions is not None and args.dimensions < 1:
+        parser.error("--dimensions must be >= 1")
 
-def main():
-    server = MLXEmbeddingServer()
+    server = MLXEmbeddingServer(
+        memory_budget_mb=args.memory_budget_mb,
+        max_models=args.max_models,
+        max_tokens_per_batch=args.max_tokens_per_batch,
+        max_batch_size=args.max_batch_size,
+        coalesce_window_ms=args.coalesce_window_ms,
+        max_workers=args.workers,
+        store_path=args.store_path,
+        store_max_mb=args.store_max_mb,
+        dimensions=args.dimensions,
+        float16=args.float16
+    )
     server.run()
 
 if __name__ == "__main__":
@@ -8,14 +8,57 @@ Communication via stdin/stdout en JSON
 """
 
 import sys
-import json
+import copy
 import os
-from typing import Dict, List, Optional, Generator
+import time
+import inspect
+import threading
+import argparse
+from typing import Dict, List, Optional, Generator, Tuple, Union
 from pathlib import Path
 
+from mlx_request_dispatcher import RequestDispatcher
+from mlx_prompt_cache import (
+    PROMPT_CACHE_AVAILABLE,
+    DEFAULT_KV_CACHE_BUDGET_MB,
+    DEFAULT_MAX_CONVERSATIONS,
+    DEFAULT_PREFIX_CACHE_BUDGET_MB,
+    DEFAULT_PREFIX_MIN_TOKENS,
+    DEFAULT_PREFIX_MIN_USES,
+    ConversationCacheStore,
+    PrefixCacheStore,
+    prefill_prompt_cache
+)
+from mlx_structured_output import ConstraintCache, ConstrainedDecoder
+from mlx_batch_scheduler import (
+    BATCH_GENERATOR_AVAILABLE,
+    DEFAULT_MAX_BATCH_SIZE,
+    BatchScheduler,
+    BatchSequence
+)
+
 try:
+    import mlx.core as mx
+    from mlx.utils import tree_flatten
     from mlx_lm import load, generate
-    from mlx_lm.utils import generate_step
+    try:
+        from mlx_lm.utils import generate_step
+    except ImportError:
+        # mlx-lm >= 0.21
+        from mlx_lm.generate import generate_step
+    try:
+        from mlx_lm.sample_utils import make_sampler
+    except ImportError:
+        make_sampler = None
+    try:
+        from mlx_lm.generate import speculative_generate_step
+    except ImportError:
+        speculative_generate_step = None
+    # Les paramètres acceptés par generate_step varient selon la version
+    GENERATE_STEP_PARAMS = set(inspect.signature(generate_step).parameters)
+    SPECULATIVE_STEP_PARAMS = set(
+        inspect.signature(speculative_generate_step).parameters
+    ) if speculative_generate_step is not None else set()
     MLX_AVAILABLE = True
 except ImportError:
     MLX_AVAILABLE = False
@@ -23,10 +66,221 @@ except ImportError:
     sys.stderr.flush()
 
 
+DEFAULT_NUM_DRAFT_TOKENS = 3
+DEFAULT_MAX_PROMPT_TOKENS = 8192
+DEFAULT_KV_GROUP_SIZE = 64
+DEFAULT_QUANTIZED_KV_START = 1024
+BYTES_PER_MB = 1024 * 1024
+
+
+def _memory_stat(name: str) -> Optional[float]:
+    """Statistique mémoire MLX en MB (mx.get_* ou mx.metal.get_* selon la version)"""
+    if not MLX_AVAILABLE:
+        return None
+    fn = getattr(mx, name, None) or getattr(getattr(mx, "metal", None), name, None)
+    return fn() / BYTES_PER_MB if fn is not None else None
+
+
+def _reset_peak_memory():
+    if not MLX_AVAILABLE:
+        return
+    fn = getattr(mx, "reset_peak_memory", None) or getattr(getattr(mx, "metal", None), "reset_peak_memory", None)
+    if fn is not None:
+        fn()
+
+
+# Balises de rôle ajoutées par les chat templates (estimation par message)
+CHAT_MESSAGE_OVERHEAD_TOKENS = 8
+
+
+class IncrementalDetokenizer:
+    """
+    Détokenisation incrémentale (repli si le tokenizer n'expose pas de detokenizer)
+
+    Même interface que le StreamingDetokenizer de mlx-lm. Seule une petite fenêtre
+    de tokens est re-décodée à chaque pas, et le texte est retenu tant qu'il se
+    termine par un caractère incomplet (séquence UTF-8 répartie sur plusieurs tokens).
+    """
+
+    def __init__(self, tokenizer):
+        self._tokenizer = tokenizer
+        self.reset()
+
+    def reset(self):
+        self.tokens: List[int] = []
+        self.text = ""
+        self._segment = ""
+        self._prefix_offset = 0
+        self._read_offset = 0
+
+    def _emit(self, final: bool = False):
+        prefix_text = self._tokenizer.decode(self.tokens[self._prefix_offset:self._read_offset])
+        new_text = self._tokenizer.decode(self.tokens[self._prefix_offset:])
+
+        if len(new_text) > len(prefix_text) and (final or not new_text.endswith("\ufffd")):
+            delta = new_text[len(prefix_text):]
+            self.text += delta
+            self._segment += delta
+            self._prefix_offset = self._read_offset
+            self._read_offset = len(self.tokens)
+
+    def add_token(self, token: int):
+        self.tokens.append(token)
+        self._emit()
+
+    def finalize(self):
+        self._emit(final=True)
+
+    @property
+    def last_segment(self) -> str:
+        """Texte ajouté depuis le dernier appel"""
+        segment = self._segment
+        self._segment = ""
+        return segment
+
+
+class GenerationStream:
+    """
+    Suivi d'une génération : détokenisation, chunks de streaming, timings, arrêt
+
+    Partagé par le chemin séquentiel et l'ordonnanceur par lots. La requête
+    (id et contrôle cancel/deadline) est capturée à la création : les tokens
+    peuvent ensuite être ajoutés depuis un autre thread.
+    """
+
+    def __init__(self, server: "MLXLLMServer", prompt_tokens: List[int], max_tokens: int, stream: bool):
+        self.dispatcher = server.dispatcher
+        self.request_id = self.dispatcher.current_request_id()
+        self.control = self.dispatcher.current_control()
+        self.model_name = server.current_model_name
+        self.detokenizer = server._make_detokenizer()
+
+        self.prompt_tokens = prompt_tokens
+        self.max_tokens = max_tokens
+        self.stream = stream
+        self.generated: List[int] = []
+        self.start = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+
+    def add_token(self, token: int) -> Optional[str]:
+        """Ajoute un token (et émet le chunk) ; retourne une raison d'arrêt ou None"""
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.generated.append(token)
+        self.detokenizer.add_token(token)
+
+        if self.stream:
+            # Envoyer uniquement le nouveau texte
+            delta = self.detokenizer.last_segment
+            if delta:
+                self.dispatcher.emit({
+                    "success": True,
+                    "type": "chunk",
+                    "content": delta,
+                    "done": False,
+                    "tokens": len(self.generated),
+                    **self.timings(now)
+                }, self.request_id)
+
+        return self.control.stop_reason() if self.control is not None else None
+
+    def timings(self, now: float) -> Dict:
+        """Temps jusqu'au premier token et débit de décodage (tokens/s après le premier)"""
+        if self.first_token_at is None:
+            return {"ttft_ms": None, "tokens_per_second": 0.0}
+
+        decode_time = now - self.first_token_at
+        return {
+            "ttft_ms": round((self.first_token_at - self.start) * 1000, 2),
+            "tokens_per_second": round((len(self.generated) - 1) / decode_time, 2) if decode_time > 0 else 0.0
+        }
+
+    def finish(self, finish_reason: str) -> Dict:
+        """Réponse finale (texte complet, usage, timings)"""
+        self.detokenizer.finalize()
+        end = time.perf_counter()
+        num_tokens = len(self.generated)
+
+        if self.stream:
+            # Texte retenu en fin de génération (caractère multi-token incomplet)
+            delta = self.detokenizer.last_segment
+            if delta:
+                self.dispatcher.emit({
+                    "success": True,
+                    "type": "chunk",
+                    "content": delta,
+                    "done": False,
+                    "tokens": num_tokens
+                }, self.request_id)
+
+        response = {
+            "success": True,
+            "content": self.detokenizer.text,
+            "model": self.model_name,
+            "finish_reason": finish_reason,
+            "tokens_generated": num_tokens,
+            "usage": {
+                "prompt_tokens": len(self.prompt_tokens),
+                "completion_tokens": num_tokens,
+                "total_tokens": len(self.prompt_tokens) + num_tokens
+            },
+            **self.timings(end),
+            "total_time_ms": round((end - self.start) * 1000, 2)
+        }
+
+        if finish_reason in ("cancelled", "deadline"):
+            # Estimation: tokens restants au rythme observé
+            per_token = (end - self.start) / num_tokens if num_tokens else 0.0
+            response["partial"] = True
+            response["time_saved_ms"] = round(per_token * (self.max_tokens - num_tokens) * 1000, 1)
+
+            sys.stderr.write(f"[MLX LLM] Generation {finish_reason} after {num_tokens} tokens\n")
+            sys.stderr.flush()
+
+        if self.stream:
+            # Message de fin
+            response.update({"type": "complete", "done": True})
+
+        return response
+
+
 class MLXLLMServer:
     """Serveur MLX pour génération de texte avec LLM"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        kv_cache_budget_mb: float = DEFAULT_KV_CACHE_BUDGET_MB,
+        max_conversations: int = DEFAULT_MAX_CONVERSATIONS,
+        prefix_cache_budget_mb: float = DEFAULT_PREFIX_CACHE_BUDGET_MB,
+        prefix_min_tokens: int = DEFAULT_PREFIX_MIN_TOKENS,
+        prefix_min_uses: int = DEFAULT_PREFIX_MIN_USES,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        num_draft_tokens: int = DEFAULT_NUM_DRAFT_TOKENS,
+        max_prompt_tokens: int = DEFAULT_MAX_PROMPT_TOKENS,
+        kv_bits: Optional[int] = None,
+        kv_group_size: int = DEFAULT_KV_GROUP_SIZE,
+        quantized_kv_start: int = DEFAULT_QUANTIZED_KV_START,
+        max_kv_size: Optional[int] = None,
+        memory_budget_mb: Optional[float] = None
+    ):
+        """
+        Args:
+            kv_cache_budget_mb: Budget mémoire des caches KV conservés entre les tours
+            max_conversations: Nombre maximum de conversations dont le cache est conservé
+            prefix_cache_budget_mb: Budget mémoire des préfixes partagés (0 = désactivé)
+            prefix_min_tokens: Taille minimale d'un préfixe partagé
+            prefix_min_uses: Occurrences d'un préfixe avant de le précalculer
+            max_batch_size: Générations décodées ensemble (1 = séquentiel)
+            num_draft_tokens: Tokens proposés par le modèle brouillon à chaque pas
+            max_prompt_tokens: Budget de tokens d'un prompt de chat (historique tronqué au-delà)
+            kv_bits: Quantification du cache KV (8 ou 4 bits, None = pleine précision)
+            kv_group_size: Taille des groupes de quantification du cache KV
+            quantized_kv_start: Nombre de tokens avant de quantifier le cache KV
+            max_kv_size: Cache KV glissant limité à ce nombre de tokens (None = illimité)
+            memory_budget_mb: Mémoire maximale (poids + caches) ; au-delà, une requête
+                voit son max_tokens réduit ou est refusée (None = pas de limite)
+        """
         self.model = None
         self.tokenizer = None
         self.current_model_name = None
@@ -34,9 +288,71 @@ class MLXLLMServer:
         self.default_temp = 0.7
         self.default_top_p = 0.9
         self.default_max_tokens = 2048
+        self.max_prompt_tokens = max_prompt_tokens
+
+        # Cache KV: quantification, fenêtre glissante et budget mémoire
+        self.kv_bits = kv_bits
+        self.kv_group_size = kv_group_size
+        self.quantized_kv_start = quantized_kv_start
+        self.max_kv_size = max_kv_size
+        self.memory_budget_mb = memory_budget_mb
+        self.refused_requests = 0
+
+        # Sorties structurées: contraintes compilées (JSON schema / regex) et leurs masques
+        self.constraints = ConstraintCache()
+        self.load_time_ms = None
+        self.warmup_time_ms = None
+
+        # Décodage spéculatif (modèle brouillon optionnel)
+        self.draft_model = None
+        self.draft_model_name = None
+        self.num_draft_tokens = num_draft_tokens
+        self.speculative_stats = {"requests": 0, "proposed": 0, "accepted": 0, "tokens": 0}
+
+        # Caches KV par conversation (désactivé si mlx-lm est trop ancien)
+        self.conversation_cache = None
+        if MLX_AVAILABLE and PROMPT_CACHE_AVAILABLE and "prompt_cache" in GENERATE_STEP_PARAMS:
+            self.conversation_cache = ConversationCacheStore(kv_cache_budget_mb, max_conversations)
+
+        # Préfixes partagés entre conversations (prompt système, persona)
+        self.prefix_cache = None
+        if self.conversation_cache is not None and prefix_cache_budget_mb > 0:
+            self.prefix_cache = PrefixCacheStore(
+                budget_mb=prefix_cache_budget_mb,
+                min_tokens=prefix_min_tokens,
+                min_uses=prefix_min_uses
+            )
 
-    def load_model(self, model_path: str, adapter_path: Optional[str] = None) -> Dict:
-        """Charge un modèle MLX"""
+        # Décodage par lots : un worker par séquence du lot pour que les
+        # requêtes puissent attendre ensemble leur fin ; le modèle n'étant pas
+        # réentrant, tous ses accès passent par model_lock
+        self.max_batch_size = max_batch_size if MLX_AVAILABLE and BATCH_GENERATOR_AVAILABLE else 1
+        self.scheduler: Optional[BatchScheduler] = None
+        self.model_lock = threading.RLock()
+
+        # ping/status ne doivent jamais attendre derrière une génération
+        self.dispatcher = RequestDispatcher(
+            "[MLX LLM]",
+            self.handle_request,
+            control_commands=("ping", "status"),
+            max_workers=max(1, self.max_batch_size),
+            exclusive_commands=("load", "unload", "warmup")
+        )
+
+    def load_model(
+        self,
+        model_path: str,
+        adapter_path: Optional[str] = None,
+        warmup: bool = False,
+        draft_model_path: Optional[str] = None
+    ) -> Dict:
+        """
+        Charge un modèle MLX (et le préchauffe si warmup=True)
+
+        Avec draft_model_path, un petit modèle brouillon (même vocabulaire) est
+        chargé à côté : il propose num_draft_tokens tokens que le modèle principal
+        vérifie en une seule passe (décodage spéculatif).
+        """
         try:
             if not MLX_AVAILABLE:
                 return {
@@ -44,6 +360,12 @@ class MLXLLMServer:
                     "error": "mlx-lm not installed. Install with: pip install mlx-lm"
                 }
 
+            if draft_model_path and speculative_generate_step is None:
+                return {
+                    "success": False,
+                    "error": "Speculative decoding requires a newer mlx-lm (speculative_generate_step)"
+                }
+
             sys.stderr.write(f"[MLX LLM] Loading model: {model_path}\n")
             sys.stderr.flush()
 
@@ -54,17 +376,48 @@ class MLXLLMServer:
                 sys.stderr.flush()
 
             # Charger le modèle et le tokenizer
-            self.model, self.tokenizer = load(model_path, adapter_path=adapter_path)
+            self._stop_scheduler()
+            load_start = time.perf_counter()
+            warnings = []
+            with self.model_lock:
+                self.model, self.tokenizer = load(model_path, adapter_path=adapter_path)
+                self.draft_model, self.draft_model_name = None, None
+                if draft_model_path:
+                    self.draft_model, draft_tokenizer = load(draft_model_path)
+                    self.draft_model_name = draft_model_path
+                    # Les tokens proposés doivent avoir le même sens pour les deux modèles
+                    if getattr(draft_tokenizer, "vocab_size", None) != getattr(self.tokenizer, "vocab_size", None):
+                        warnings.append("Draft model vocabulary differs from the main model")
+                # Les caches KV (et masques de contraintes) sont propres au modèle
+                self._clear_prompt_caches()
+                self.constraints.clear()
             self.current_model_name = model_path
             self.model_path = model_path
+            self.load_time_ms = (time.perf_counter() - load_start) * 1000
+            self.warmup_time_ms = None
+            self.speculative_stats = {"requests": 0, "proposed": 0, "accepted": 0, "tokens": 0}
+            self._start_scheduler()
 
-            sys.stderr.write(f"[MLX LLM] Model loaded successfully\n")
+            sys.stderr.write(f"[MLX LLM] Model loaded successfully ({self.load_time_ms:.0f} ms)\n")
+            if self.draft_model is not None:
+                sys.stderr.write(f"[MLX LLM] Draft model: {draft_model_path} ({self.num_draft_tokens} tokens/step)\n")
+            for warning in warnings:
+                sys.stderr.write(f"[MLX LLM] Warning: {warning}\n")
             sys.stderr.flush()
 
+            if warmup:
+                warmup_result = self.warmup()
+                if not warmup_result.get("success"):
+                    return warmup_result
+
             return {
                 "success": True,
                 "model": model_path,
-                "ready": True
+                "ready": True,
+                "draft_model": self.draft_model_name,
+                "load_time_ms": round(self.load_time_ms, 2),
+                "warmup_time_ms": round(self.warmup_time_ms, 2) if self.warmup_time_ms is not None else None,
+                "warnings": warnings
             }
 
         except Exception as e:
@@ -75,13 +428,75 @@ class MLXLLMServer:
                 "error": str(e)
             }
 
+    def warmup(self, prompt_tokens: int = 256, max_tokens: int = 8) -> Dict:
+        """
+        Préchauffe le modèle chargé
+
+        Force la matérialisation de tous les poids puis exécute un prefill et
+        quelques pas de décodage factices, pour que la première vraie requête
+        ne paie pas la compilation des kernels ni les défauts de page.
+        """
+        try:
+            if self.model is None or self.tokenizer is None:
+                return {
+                    "success": False,
+                    "error": "No model loaded. Load a model first."
+                }
+
+            sys.stderr.write("[MLX LLM] Warming up model\n")
+            sys.stderr.flush()
+
+            warmup_start = time.perf_counter()
+
+            with self.model_lock:
+                # Toucher tous les poids
+                mx.eval([param for _, param in tree_flatten(self.model.parameters())])
+
+                # Prefill d'une longueur représentative + quelques tokens décodés
+                prompt = " ".join(["warmup"] * prompt_tokens)
+                generate(
+                    self.model,
+                    self.tokenizer,
+                    prompt=prompt,
+                    max_tokens=max_tokens,
+                    verbose=False
+                )
+
+            self.warmup_time_ms = (time.perf_counter() - warmup_start) * 1000
+
+            sys.stderr.write(f"[MLX LLM] Warmup done ({self.warmup_time_ms:.0f} ms)\n")
+            sys.stderr.flush()
+
+            return {
+                "success": True,
+                "model": self.current_model_name,
+                "load_time_ms": round(self.load_time_ms, 2) if self.load_time_ms is not None else None,
+                "warmup_time_ms": round(self.warmup_time_ms, 2)
+            }
+
+        except Exception as e:
+            sys.stderr.write(f"[MLX LLM] Warmup error: {str(e)}\n")
+            sys.stderr.flush()
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
     def unload_model(self) -> Dict:
         """Décharge le modèle pour libérer la mémoire"""
         try:
-            self.model = None
-            self.tokenizer = None
+            self._stop_scheduler()
+            with self.model_lock:
+                self.model = None
+                self.tokenizer = None
+                self.draft_model = None
+                self.draft_model_name = None
+                self._clear_prompt_caches()
+                self.constraints.clear()
             self.current_model_name = None
             self.model_path = None
+            self.load_time_ms = None
+            self.warmup_time_ms = None
 
             sys.stderr.write("[MLX LLM] Model unloaded\n")
             sys.stderr.flush()
@@ -96,15 +511,261 @@ class MLXLLMServer:
                 "error": str(e)
             }
 
+    def _start_scheduler(self):
+        """Démarre l'ordonnanceur par lots pour le modèle chargé"""
+        # Avec un modèle brouillon, on privilégie la latence d'un flux unique
+        if self.max_batch_size <= 1 or self.draft_model is not None:
+            return
+
+        # Le BatchGenerator gère son propre cache KV, ni quantifié ni glissant
+        if self.kv_bits or self.max_kv_size:
+            sys.stderr.write("[MLX LLM] Continuous batching disabled (--kv-bits / --max-kv-size)\n")
+            sys.stderr.flush()
+            return
+
+        self.scheduler = BatchScheduler(
+            self.model,
+            self.tokenizer,
+            self.model_lock,
+            max_batch_size=self.max_batch_size,
+            default_sampler=self._make_sampler(self.default_temp, self.default_top_p)
+        )
+        sys.stderr.write(f"[MLX LLM] Continuous batching enabled (max_batch_size={self.max_batch_size})\n")
+        sys.stderr.flush()
+
+    def _stop_scheduler(self):
+        """Arrête l'ordonnanceur (les séquences en cours se terminent d'abord)"""
+        scheduler, self.scheduler = self.scheduler, None
+        if scheduler is not None:
+            scheduler.close()
+
+    def _clear_prompt_caches(self):
+        """Vide les caches KV (conversations et préfixes)"""
+        if self.conversation_cache is not None:
+            self.conversation_cache.clear()
+        if self.prefix_cache is not None:
+            self.prefix_cache.clear()
+
+    def _prefix_prompt_cache(self, prefix: Union[str, List[int]], prompt_tokens: List[int]) -> Optional[List]:
+        """Copie du cache KV d'un préfixe partagé du prompt (None si absent)"""
+        prefix_tokens = self.tokenizer.encode(prefix) if isinstance(prefix, str) else prefix
+
+        # Le préfixe doit tokeniser à l'identique en tête du prompt
+        if len(prefix_tokens) >= len(prompt_tokens) or prompt_tokens[:len(prefix_tokens)] != prefix_tokens:
+            return None
+
+        cache = self.prefix_cache.lookup(
+            self.current_model_name,
+            prefix_tokens,
+            lambda: prefill_prompt_cache(self.model, prefix_tokens, self.max_kv_size)
+        )
+        return (cache, len(prefix_tokens)) if cache is not None else None
+
+    def _make_sampler(self, temperature: float, top_p: float):
+        """Échantillonneur mlx-lm (None si la version ne fournit pas make_sampler)"""
+        if make_sampler is None:
+            return None
+        return make_sampler(temp=temperature, top_p=top_p)
+
+    def _sampling_kwargs(self, temperature: float, top_p: float) -> Dict:
+        """Arguments d'échantillonnage pour generate_step (selon la version de mlx-lm)"""
+        if make_sampler is not None:
+            return {"sampler": self._make_sampler(temperature, top_p)}
+        return {"temp": temperature, "top_p": top_p}
+
+    def _kv_cache_kwargs(self) -> Dict:
+        """Options de cache KV pour generate_step (quantification, fenêtre glissante)"""
+        kwargs = {"max_kv_size": self.max_kv_size}
+        if self.kv_bits:
+            kwargs.update({
+                "kv_bits": self.kv_bits,
+                "kv_group_size": self.kv_group_size,
+                "quantized_kv_start": self.quantized_kv_start
+            })
+        return kwargs
+
+    def _kv_bytes_per_token(self, quantized: bool = False) -> Optional[float]:
+        """
+        Taille du cache KV par token, d'après la configuration du modèle (None si inconnue)
+
+        quantized=True donne la taille une fois le cache quantifié (si kv_bits).
+        """
+        args = getattr(self.model, "args", None)
+        layers = getattr(self.model, "layers", None)
+        num_layers = len(layers) if layers is not None else getattr(args, "num_hidden_layers", None)
+        num_heads = getattr(args, "num_attention_heads", None)
+        hidden_size = getattr(args, "hidden_size", None)
+        if not num_layers or not num_heads:
+            return None
+
+        num_kv_heads = getattr(args, "num_key_value_heads", None) or num_heads
+        head_dim = getattr(args, "head_dim", None) or (hidden_size // num_heads if hidden_size else None)
+        if not head_dim:
+            return None
+
+        # float16 par défaut ; quantifié: bits/8 + échelle et biais float16 par groupe
+        bytes_per_value = 2.0
+        if quantized and self.kv_bits:
+            bytes_per_value = self.kv_bits / 8 + 4 / self.kv_group_size
+
+        return num_layers * 2 * num_kv_heads * head_dim * bytes_per_value
+
+    def _admit(self, prompt_length: int, max_tokens: int) -> Tuple[int, Optional[Dict]]:
+        """
+        Vérifie qu'une requête tient dans le budget mémoire avant de la lancer
+
+        Estime le cache KV nécessaire (prompt + génération, borné par max_kv_size),
+        évince des conversations en cache si besoin, puis réduit max_tokens ou
+        refuse la requête (MemoryError) si même le prompt ne tient pas.
+
+        Returns:
+            Tuple (max_tokens éventuellement réduit, infos mémoire ou None)
+        """
+        per_token = self._kv_bytes_per_token()
+        active_mb = _memory_stat("get_active_memory")
+        if not self.memory_budget_mb or per_token is None or active_mb is None:
+            return max_tokens, None
+
+        # Avec kv_bits, le cache reste en float16 jusqu'à quantized_kv_start tokens,
+        # puis tout le cache est quantifié
+        quantized_per_token = self._kv_bytes_per_token(quantized=True)
+        full_precision_tokens = self.quantized_kv_start if self.kv_bits else None
+
+        def kv_bytes(tokens: int) -> float:
+            if self.max_kv_size:
+                tokens = min(tokens, self.max_kv_size)
+            if full_precision_tokens is None:
+                return tokens * per_token
+            return max(min(tokens, full_precision_tokens) * per_token, tokens * quantized_per_token)
+
+        def kv_mb(tokens: int) -> float:
+            return kv_bytes(tokens) / BYTES_PER_MB
+
+        def kv_tokens(budget_mb: float) -> int:
+            # Inverse de kv_mb : nombre de tokens (prompt compris) qui tiennent dans le budget
+            budget = budget_mb * BYTES_PER_MB
+            if full_precision_tokens is not None and full_precision_tokens * per_token <= budget:
+                return int(budget / quantized_per_token)
+            return int(budget / per_token)
+
+        available = self.memory_budget_mb - active_mb
+        needed = kv_mb(prompt_length + max_tokens)
+
+        if needed > available and self.conversation_cache is not None:
+            available += self.conversation_cache.evict(needed - available)
+
+        info = {
+            "budget_mb": self.memory_budget_mb,
+            "available_mb": round(available, 1),
+            "kv_estimate_mb": round(needed, 1)
+        }
+
+        if needed <= available:
+            return max_tokens, info
+
+        if kv_mb(prompt_length + 1) > available:
+            self.refused_requests += 1
+            raise MemoryError(
+                f"Request needs ~{needed:.0f} MB of KV cache, {max(available, 0):.0f} MB available "
+                f"(memory budget {self.memory_budget_mb:.0f} MB)"
+            )
+
+        # Le prompt tient: on limite la génération à ce qu'il reste
+        fitted = kv_tokens(available) - prompt_length
+        info["max_tokens_requested"] = max_tokens
+        info["kv_estimate_mb"] = round(kv_mb(prompt_length + fitted), 1)
+
+        sys.stderr.write(f"[MLX LLM] Memory budget: max_tokens reduced from {max_tokens} to {fitted}\n")
+        sys.stderr.flush()
+        return fitted, info
+
+    def _make_detokenizer(self):
+        """Détokeniseur de streaming (une instance par génération)"""
+        detokenizer = getattr(self.tokenizer, "detokenizer", None)
+        if detokenizer is None:
+            detokenizer = IncrementalDetokenizer(self.tokenizer)
+        else:
+            # Le tokenizer mlx-lm partage une seule instance : en faire une copie
+            detokenizer = copy.copy(detokenizer)
+        detokenizer.reset()
+        return detokenizer
+
+    def _generate_tokens(
+        self,
+        prompt_tokens: List[int],
+        max_tokens: int,
+        temperature: float,
+        top_p: float,
+        prompt_cache: Optional[List] = None,
+        constraint: Optional[ConstrainedDecoder] = None
+    ) -> Generator[int, None, None]:
+        """
+        Génère les ids de tokens un par un (s'arrête sur EOS ou max_tokens)
+
+        Avec prompt_cache, prompt_tokens ne contient que les tokens absents du cache.
+        Avec constraint, les logits sont masqués à chaque pas (sortie structurée).
+        """
+        eos_token_id = self.tokenizer.eos_token_id
+
+        kwargs = {
+            **self._sampling_kwargs(temperature, top_p),
+            **self._kv_cache_kwargs(),
+            "max_tokens": max_tokens,
+            "prompt_cache": prompt_cache,
+            "logits_processors": [constraint] if constraint is not None else None
+        }
+        kwargs = {
+            key: value for key, value in kwargs.items()
+            if value is not None and key in GENERATE_STEP_PARAMS
+        }
+
+        steps = generate_step(mx.array(prompt_tokens), self.model, **kwargs)
+        try:
+            for _, (token, _) in zip(range(max_tokens), steps):
+                token = token.item() if hasattr(token, "item") else token
+                if token == eos_token_id:
+                    break
+                yield token
+        finally:
+            steps.close()
+
     def generate_text(
         self,
         prompt: str,
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
         top_p: Optional[float] = None,
-        stream: bool = True
+        stream: bool = True,
+        conversation_id: Optional[str] = None,
+        prefix: Union[str, List[int], None] = None,
+        prompt_tokens: Optional[List[int]] = None,
+        json_schema: Union[Dict, str, None] = None,
+        regex: Optional[str] = None
     ) -> Dict:
-        """Génère du texte à partir d'un prompt"""
+        """
+        Génère du texte à partir d'un prompt (ou de ses tokens, déjà calculés)
+
+        Avec conversation_id, le cache KV du tour précédent est réutilisé : seul
+        le suffixe qui diffère de ce qui a déjà été calculé est prefill. Sinon,
+        si le prompt commence par un préfixe partagé fréquent (prefix, ex: le
+        prompt système), on part de son cache KV précalculé.
+
+        Sans conversation_id ni préfixe partagé, et si l'ordonnanceur par lots
+        est actif, la génération rejoint le lot de décodage en cours
+        (continuous batching).
+
+        En streaming, chaque chunk ne contient que le nouveau texte (coupé sur
+        des frontières de caractères complètes), avec le temps jusqu'au premier
+        token et le débit courant ; le message final porte les compteurs d'usage.
+
+        La génération s'arrête au prochain token si la requête est annulée
+        (commande cancel) ou si son échéance (deadline_ms) est dépassée ; le
+        texte partiel est alors retourné avec une estimation du temps économisé.
+
+        Avec json_schema ou regex, un masque de logits (précalculé par état et mis
+        en cache par contrainte) n'autorise que les tokens qui gardent la sortie
+        valide ; ces requêtes passent par le décodage séquentiel.
+        """
         try:
             if self.model is None or self.tokenizer is None:
                 return {
@@ -112,6 +773,15 @@ class MLXLLMServer:
                     "error": "No model loaded. Load a model first."
                 }
 
+            constraint = None
+            if json_schema is not None or regex is not None:
+                if "logits_processors" not in GENERATE_STEP_PARAMS:
+                    return {
+                        "success": False,
+                        "error": "Structured output requires a newer mlx-lm (logits_processors)"
+                    }
+                constraint = self.constraints.decoder(self.tokenizer, json_schema, regex)
+
             # Paramètres de génération
             max_tokens = max_tokens or self.default_max_tokens
             temperature = temperature or self.default_temp
@@ -120,54 +790,44 @@ class MLXLLMServer:
             sys.stderr.write(f"[MLX LLM] Generating (max_tokens={max_tokens}, temp={temperature}, top_p={top_p})\n")
             sys.stderr.flush()
 
-            if stream:
-                # Génération en streaming
-                response_text = ""
-                for text in generate(
-                    self.model,
-                    self.tokenizer,
-                    prompt=prompt,
-                    max_tokens=max_tokens,
-                    temp=temperature,
-                    top_p=top_p,
-                    verbose=False
-                ):
-                    response_text = text
-                    # Envoyer chaque chunk
-                    chunk_response = {
-                        "success": True,
-                        "type": "chunk",
-                        "content": text,
-                        "done": False
-                    }
-                    print(json.dumps(chunk_response))
-                    sys.stdout.flush()
+            if prompt_tokens is None:
+                prompt_tokens = self.tokenizer.encode(prompt)
 
-                # Envoyer le message de fin
-                final_response = {
-                    "success": True,
-                    "type": "complete",
-                    "content": response_text,
-                    "done": True
-                }
-                return final_response
+            max_tokens, memory = self._admit(len(prompt_tokens), max_tokens)
+            _reset_peak_memory()
+            generation = GenerationStream(self, prompt_tokens, max_tokens, stream)
+
+            # Le BatchGenerator ne sait pas partir d'un cache KV existant
+            use_prefix = bool(prefix) and self.prefix_cache is not None
+            if self.scheduler is not None and not conversation_id and not use_prefix and constraint is None:
+                response = self._generate_batched(generation, temperature, top_p)
             else:
-                # Génération non-streaming
-                response = generate(
-                    self.model,
-                    self.tokenizer,
-                    prompt=prompt,
-                    max_tokens=max_tokens,
-                    temp=temperature,
-                    top_p=top_p,
-                    verbose=False
+                response = self._generate_serial(
+                    generation, temperature, top_p, conversation_id, prefix, constraint
                 )
 
-                return {
-                    "success": True,
-                    "content": response,
-                    "model": self.current_model_name
+            if constraint is not None and response.get("success"):
+                response["constraint"] = constraint.report(generation.generated)
+
+            if response.get("success"):
+                # Pic global du processus (inclut les autres séquences d'un lot)
+                peak_mb = _memory_stat("get_peak_memory")
+                response["memory"] = {
+                    **(memory or {}),
+                    "peak_mb": round(peak_mb, 1) if peak_mb is not None else None,
+                    "kv_bits": self.kv_bits,
+                    "max_kv_size": self.max_kv_size
                 }
+            return response
+
+        except MemoryError as e:
+            sys.stderr.write(f"[MLX LLM] Request refused: {str(e)}\n")
+            sys.stderr.flush()
+            return {
+                "success": False,
+                "error": str(e),
+                "refused": "memory_budget"
+            }
 
         except Exception as e:
             sys.stderr.write(f"[MLX LLM] Generation error: {str(e)}\n")
@@ -177,15 +837,196 @@ class MLXLLMServer:
                 "error": str(e)
             }
 
+    def _generate_serial(
+        self,
+        generation: "GenerationStream",
+        temperature: float,
+        top_p: float,
+        conversation_id: Optional[str],
+        prefix: Union[str, List[int], None],
+        constraint: Optional[ConstrainedDecoder] = None
+    ) -> Dict:
+        """
+        Génération séquentielle (generate_step), avec réutilisation des caches KV
+
+        model_lock n'est pris que pour chaque pas de décodage : le lot de
+        l'ordonnanceur continue d'avancer entre deux tokens.
+        """
+        if self.draft_model is not None and not conversation_id and constraint is None:
+            # Pas d'ordonnanceur avec un brouillon : rien à faire avancer en parallèle
+            with self.model_lock:
+                return self._generate_speculative(generation, temperature, top_p)
+
+        prompt_tokens = generation.prompt_tokens
+
+        prefix_hit = False
+
+        def prefix_entry() -> Optional[Tuple[List, int]]:
+            nonlocal prefix_hit
+            if not prefix or self.prefix_cache is None:
+                return None
+            entry = self._prefix_prompt_cache(prefix, prompt_tokens)
+            prefix_hit = entry is not None
+            return entry
+
+        with self.model_lock:
+            if conversation_id and self.conversation_cache is not None:
+                # Le préfixe partagé n'est consulté qu'en l'absence de cache de conversation,
+                # avant que acquire ne compte les tokens à calculer
+                prompt_cache, reused = self.conversation_cache.acquire(
+                    conversation_id, self.model, prompt_tokens, self.max_kv_size, fallback=prefix_entry
+                )
+            else:
+                prompt_cache, reused = prefix_entry() or (None, 0)
+
+        finish_reason = "stop"
+        steps = self._generate_tokens(
+            prompt_tokens[reused:], generation.max_tokens, temperature, top_p, prompt_cache, constraint
+        )
+        try:
+            while True:
+                with self.model_lock:
+                    token = next(steps, None)
+                if token is None:
+                    if len(generation.generated) >= generation.max_tokens:
+                        finish_reason = "length"
+                    break
+                stop_reason = generation.add_token(token)
+                if stop_reason:
+                    finish_reason = stop_reason
+                    break
+        finally:
+            with self.model_lock:
+                steps.close()
+
+        if conversation_id and prompt_cache is not None:
+            # Le cache contient maintenant le prompt et la réponse
+            with self.model_lock:
+                self.conversation_cache.release(
+                    conversation_id, prompt_cache, prompt_tokens + generation.generated
+                )
+
+        response = generation.finish(finish_reason)
+
+        if prompt_cache is not None:
+            response["cache"] = {
+                "conversation_id": conversation_id,
+                "prefix_hit": prefix_hit,
+                "reused_tokens": reused,
+                "prefill_tokens": len(prompt_tokens) - reused
+            }
+
+        return response
+
+    def _generate_speculative(self, generation: "GenerationStream", temperature: float, top_p: float) -> Dict:
+        """
+        Décodage spéculatif : le brouillon propose k tokens, le modèle principal
+        les vérifie en une passe et garde le plus long préfixe accepté
+        """
+        kwargs = {
+            **self._sampling_kwargs(temperature, top_p),
+            **self._kv_cache_kwargs(),
+            "num_draft_tokens": self.num_draft_tokens,
+            "max_tokens": generation.max_tokens
+        }
+        kwargs = {key: value for key, value in kwargs.items() if key in SPECULATIVE_STEP_PARAMS}
+
+        eos_token_id = self.tokenizer.eos_token_id
+        accepted = 0
+        proposed = 0
+        rounds = 0
+        produced = 0
+        in_round = False
+        finish_reason = "length"
+
+        steps = speculative_generate_step(
+            mx.array(generation.prompt_tokens), self.model, self.draft_model, **kwargs
+        )
+        for token, _, from_draft in steps:
+            # Les tokens d'une passe de vérification arrivent ensemble: brouillons
+            # acceptés puis un token du modèle principal. Comptés avant tout arrêt
+            # (EOS, stop) pour ne pas biaiser le taux d'acceptation.
+            if not in_round:
+                rounds += 1
+                # mlx-lm ne propose pas plus de tokens qu'il n'en reste à générer
+                proposed += min(self.num_draft_tokens, generation.max_tokens - produced)
+                in_round = True
+            produced += 1
+            if from_draft:
+                accepted += 1
+            else:
+                in_round = False
+
+            token = token.item() if hasattr(token, "item") else token
+            if token == eos_token_id:
+                finish_reason = "stop"
+                break
+
+            stop_reason = generation.add_token(token)
+            if stop_reason:
+                finish_reason = stop_reason
+                break
+            if len(generation.generated) >= generation.max_tokens:
+                break
+
+        steps.close()
+
+        self.speculative_stats["requests"] += 1
+        self.speculative_stats["proposed"] += proposed
+        self.speculative_stats["accepted"] += accepted
+        self.speculative_stats["tokens"] += len(generation.generated)
+
+        response = generation.finish(finish_reason)
+        response["speculative"] = {
+            "draft_model": self.draft_model_name,
+            "num_draft_tokens": self.num_draft_tokens,
+            "draft_tokens_proposed": proposed,
+            "draft_tokens_accepted": accepted,
+            "acceptance_rate": round(accepted / proposed, 4) if proposed else 0.0,
+            # Tokens produits par passe du modèle principal (1.0 = pas de gain)
+            "tokens_per_verify_step": round(produced / rounds, 2) if rounds else 0.0
+        }
+        return response
+
+    def _generate_batched(self, generation: "GenerationStream", temperature: float, top_p: float) -> Dict:
+        """Génération via l'ordonnanceur par lots (attend la fin de la séquence)"""
+        sequence = self.scheduler.submit(BatchSequence(
+            generation.prompt_tokens,
+            generation.max_tokens,
+            self._make_sampler(temperature, top_p),
+            generation.add_token
+        ))
+        sequence.done.wait()
+
+        if sequence.error:
+            return {
+                "success": False,
+                "error": sequence.error
+            }
+
+        response = generation.finish(sequence.finish_reason)
+        response["batched"] = True
+        return response
+
     def chat(
         self,
         messages: List[Dict[str, str]],
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
         top_p: Optional[float] = None,
-        stream: bool = True
+        stream: bool = True,
+        conversation_id: Optional[str] = None,
+        max_prompt_tokens: Optional[int] = None,
+        json_schema: Union[Dict, str, None] = None,
+        regex: Optional[str] = None
     ) -> Dict:
-        """Chat avec historique de messages"""
+        """
+        Chat avec historique de messages (cache KV réutilisé si conversation_id)
+
+        Le prompt est construit avec le chat template du tokenizer ; si l'historique
+        dépasse le budget de tokens, les tours les plus anciens sont retirés.
+        La réponse peut être contrainte par json_schema ou regex (voir generate_text).
+        """
         try:
             if self.model is None or self.tokenizer is None:
                 return {
@@ -193,18 +1034,41 @@ class MLXLLMServer:
                     "error": "No model loaded. Load a model first."
                 }
 
-            # Formatter les messages en prompt
-            # Format standard pour la plupart des modèles de chat
-            prompt = self._format_chat_messages(messages)
+            max_tokens = max_tokens or self.default_max_tokens
+            budget = self._prompt_budget(max_tokens, max_prompt_tokens)
+            prompt_tokens, kept, budget_info = self._fit_chat_messages(messages, budget)
+
+            # Les messages système de tête forment un préfixe partagé entre conversations
+            system_messages = []
+            for msg in kept:
+                if msg.get("role") != "system":
+                    break
+                system_messages.append(msg)
+
+            prefix_tokens = None
+            if system_messages:
+                try:
+                    prefix_tokens = self._chat_tokens(system_messages, add_generation_prompt=False)
+                except Exception:
+                    # Certains templates refusent un historique sans message utilisateur
+                    prefix_tokens = None
 
             # Utiliser generate_text avec le prompt formaté
-            return self.generate_text(
-                prompt=prompt,
+            response = self.generate_text(
+                prompt="",
                 max_tokens=max_tokens,
                 temperature=temperature,
                 top_p=top_p,
-                stream=stream
+                stream=stream,
+                conversation_id=conversation_id,
+                prefix=prefix_tokens,
+                prompt_tokens=prompt_tokens,
+                json_schema=json_schema,
+                regex=regex
             )
+            if response.get("success"):
+                response["prompt_budget"] = budget_info
+            return response
 
         except Exception as e:
             sys.stderr.write(f"[MLX LLM] Chat error: {str(e)}\n")
@@ -214,8 +1078,100 @@ class MLXLLMServer:
                 "error": str(e)
             }
 
-    def _format_chat_messages(self, messages: List[Dict[str, str]]) -> str:
-        """Formate les messages de chat en prompt"""
+    def _context_window(self) -> Optional[int]:
+        """Taille de contexte du modèle chargé (si sa configuration l'indique)"""
+        args = getattr(self.model, "args", None)
+        for name in ("max_position_embeddings", "max_seq_len", "max_sequence_length"):
+            value = getattr(args, name, None)
+            if isinstance(value, int) and value > 0:
+                return value
+        return None
+
+    def _prompt_budget(self, max_tokens: int, max_prompt_tokens: Optional[int] = None) -> int:
+        """Budget de tokens du prompt: limite configurée, bornée par contexte - génération"""
+        budget = max_prompt_tokens or self.max_prompt_tokens
+        context = self._context_window()
+        if context is not None:
+            budget = min(budget, max(context - max_tokens, 1))
+        return budget
+
+    def _chat_tokens(self, messages: List[Dict[str, str]], add_generation_prompt: bool = True) -> List[int]:
+        """Tokens du prompt de chat (chat template du tokenizer, sinon ChatML)"""
+        if getattr(self.tokenizer, "chat_template", None):
+            return list(self.tokenizer.apply_chat_template(
+                messages,
+                add_generation_prompt=add_generation_prompt
+            ))
+        return self.tokenizer.encode(self._format_chat_messages(messages, add_generation_prompt))
+
+    def _fit_chat_messages(
+        self,
+        messages: List[Dict[str, str]],
+        budget: int
+    ) -> Tuple[List[int], List[Dict[str, str]], Dict]:
+        """
+        Retire les tours les plus anciens jusqu'à tenir dans le budget
+
+        Les messages système de tête et le dernier message sont toujours gardés.
+        Le coût de chaque message est estimé une fois (contenu + balises), puis
+        le prompt retenu est vérifié avec le vrai template.
+
+        Returns:
+            Tuple (tokens du prompt, messages gardés, infos de budget)
+        """
+        tokens = self._chat_tokens(messages)
+        full_length = len(tokens)
+        kept = messages
+
+        if full_length > budget:
+            n_system = 0
+            while n_system < len(messages) and messages[n_system].get("role") == "system":
+                n_system += 1
+            system, history = messages[:n_system], messages[n_system:]
+
+            def cost(msg: Dict[str, str]) -> int:
+                return len(self.tokenizer.encode(msg.get("content", ""))) + CHAT_MESSAGE_OVERHEAD_TOKENS
+
+            # Estimation incrémentale: on remonte depuis le message le plus récent
+            remaining = budget - sum(cost(msg) for msg in system)
+            start = len(history)
+            for i in range(len(history) - 1, -1, -1):
+                remaining -= cost(history[i])
+                if remaining < 0 and i < len(history) - 1:
+                    break
+                start = i
+
+            # Vérification avec le template, en retirant un tour de plus si besoin
+            while True:
+                # L'historique doit commencer par un message utilisateur (alternance des rôles)
+                while start < len(history) - 1 and history[start].get("role") != "user":
+                    start += 1
+                kept = system + history[start:]
+                tokens = self._chat_tokens(kept)
+                if len(tokens) <= budget or start >= len(history) - 1:
+                    break
+                start += 1
+
+            sys.stderr.write(
+                f"[MLX LLM] Prompt over budget ({full_length} > {budget} tokens), "
+                f"dropped {len(messages) - len(kept)} messages\n"
+            )
+            sys.stderr.flush()
+
+        return tokens, kept, {
+            "budget": budget,
+            "tokens_used": len(tokens),
+            "tokens_trimmed": full_length - len(tokens),
+            "messages_dropped": len(messages) - len(kept),
+            "over_budget": len(tokens) > budget
+        }
+
+    def _format_chat_messages(
+        self,
+        messages: List[Dict[str, str]],
+        add_generation_prompt: bool = True
+    ) -> str:
+        """Formate les messages de chat en prompt (ChatML, si le tokenizer n'a pas de template)"""
         # Format ChatML par défaut (compatible avec la plupart des modèles)
         formatted = ""
         for msg in messages:
@@ -230,7 +1186,8 @@ class MLXLLMServer:
                 formatted += f"<|im_start|>assistant\n{content}<|im_end|>\n"
 
         # Ajouter le début de la réponse de l'assistant
-        formatted += "<|im_start|>assistant\n"
+        if add_generation_prompt:
+            formatted += "<|im_start|>assistant\n"
 
         return formatted
 
@@ -240,7 +1197,47 @@ class MLXLLMServer:
             "success": True,
             "model_loaded": self.current_model_name,
             "ready": self.model is not None,
-            "mlx_available": MLX_AVAILABLE
+            "mlx_available": MLX_AVAILABLE,
+            "load_time_ms": round(self.load_time_ms, 2) if self.load_time_ms is not None else None,
+            "warmup_time_ms": round(self.warmup_time_ms, 2) if self.warmup_time_ms is not None else None,
+            "in_flight": self.dispatcher.in_flight(),
+            "cancelled_requests": self.dispatcher.cancelled_count,
+            "conversation_cache": self.conversation_cache.stats() if self.conversation_cache is not None else None,
+            "prefix_cache": self.prefix_cache.stats() if self.prefix_cache is not None else None,
+            "batching": self.scheduler.stats() if self.scheduler is not None else None,
+            "speculative": self._speculative_status(),
+            "kv_cache": self._kv_cache_status(),
+            "structured_output": self.constraints.stats()
+        }
+
+    def _kv_cache_status(self) -> Dict:
+        """Configuration du cache KV et mémoire MLX courante"""
+        active_mb = _memory_stat("get_active_memory")
+        peak_mb = _memory_stat("get_peak_memory")
+        per_token = self._kv_bytes_per_token(quantized=True) if self.model is not None else None
+        return {
+            "kv_bits": self.kv_bits,
+            "kv_group_size": self.kv_group_size,
+            "quantized_kv_start": self.quantized_kv_start,
+            "max_kv_size": self.max_kv_size,
+            "kv_kb_per_token": round(per_token / 1024, 2) if per_token is not None else None,
+            "memory_budget_mb": self.memory_budget_mb,
+            "active_memory_mb": round(active_mb, 1) if active_mb is not None else None,
+            "peak_memory_mb": round(peak_mb, 1) if peak_mb is not None else None,
+            "refused_requests": self.refused_requests
+        }
+
+    def _speculative_status(self) -> Optional[Dict]:
+        """Taux d'acceptation cumulé du décodage spéculatif"""
+        if self.draft_model is None:
+            return None
+
+        stats = self.speculative_stats
+        return {
+            "draft_model": self.draft_model_name,
+            "num_draft_tokens": self.num_draft_tokens,
+            **stats,
+            "acceptance_rate": round(stats["accepted"] / stats["proposed"], 4) if stats["proposed"] else 0.0
         }
 
     def handle_request(self, request: Dict) -> Dict:
@@ -250,7 +1247,12 @@ class MLXLLMServer:
         if command == "load":
             model_path = request.get("model_path")
             adapter_path = request.get("adapter_path")
-            return self.load_model(model_path, adapter_path)
+            warmup = request.get("warmup", False)
+            draft_model_path = request.get("draft_model_path")
+            return self.load_model(model_path, adapter_path, warmup, draft_model_path)
+
+        elif command == "warmup":
+            return self.warmup()
 
         elif command == "unload":
             return self.unload_model()
@@ -261,7 +1263,13 @@ class MLXLLMServer:
             temperature = request.get("temperature")
             top_p = request.get("top_p")
             stream = request.get("stream", True)
-            return self.generate_text(prompt, max_tokens, temperature, top_p, stream)
+            conversation_id = request.get("conversation_id")
+            prefix = request.get("prefix")
+            return self.generate_text(
+                prompt, max_tokens, temperature, top_p, stream, conversation_id, prefix,
+                json_schema=request.get("json_schema"),
+                regex=request.get("regex")
+            )
 
         elif command == "chat":
             messages = request.get("messages", [])
@@ -269,7 +1277,19 @@ class MLXLLMServer:
             temperature = request.get("temperature")
             top_p = request.get("top_p")
             stream = request.get("stream", True)
-            return self.chat(messages, max_tokens, temperature, top_p, stream)
+            conversation_id = request.get("conversation_id")
+            max_prompt_tokens = request.get("max_prompt_tokens")
+            return self.chat(
+                messages, max_tokens, temperature, top_p, stream, conversation_id, max_prompt_tokens,
+                json_schema=request.get("json_schema"),
+                regex=request.get("regex")
+            )
+
+        elif command == "forget":
+            # Libère le cache KV d'une conversation terminée
+            conversation_id = request.get("conversation_id")
+            dropped = self.conversation_cache.drop(conversation_id) if self.conversation_cache is not None else False
+            return {"success": True, "conversation_id": conversation_id, "dropped": dropped}
 
         elif command == "status":
             return self.get_status()
@@ -284,56 +1304,58 @@ class MLXLLMServer:
             }
 
     def run(self):
-        """Boucle principale de traitement des requêtes"""
+        """Boucle principale de traitement des requêtes (multiplexée)"""
         sys.stderr.write("[MLX LLM] Server started\n")
         sys.stderr.flush()
 
-        while True:
-            try:
-                # Lire une ligne depuis stdin
-                line = sys.stdin.readline()
-
-                if not line:
-                    # EOF - terminer proprement
-                    sys.stderr.write("[MLX LLM] Received EOF, shutting down\n")
-                    sys.stderr.flush()
-                    break
-
-                # Parser la requête JSON
-                request = json.loads(line.strip())
-
-                # Traiter la requête
-                response = self.handle_request(request)
-
-                # Envoyer la réponse en JSON (sauf si c'est du streaming, déjà envoyé)
-                if response.get("type") != "chunk":
-                    print(json.dumps(response))
-                    sys.stdout.flush()
-
-            except json.JSONDecodeError as e:
-                error_response = {
-                    "success": False,
-                    "error": f"Invalid JSON: {str(e)}"
-                }
-                print(json.dumps(error_response))
-                sys.stdout.flush()
-
-            except KeyboardInterrupt:
-                sys.stderr.write("[MLX LLM] Received interrupt, shutting down\n")
-                sys.stderr.flush()
-                break
-
-            except Exception as e:
-                error_response = {
-                    "success": False,
-                    "error": f"Unexpected error: {str(e)}"
-                }
-                print(json.dumps(error_response))
-                sys.stdout.flush()
+        self.dispatcher.run()
 
 
 def main():
-    server = MLXLLMServer()
+    parser = argparse.ArgumentParser(description="MLX LLM Server")
+    parser.add_argument("--kv-cache-budget-mb", type=float, default=DEFAULT_KV_CACHE_BUDGET_MB,
+                        help="Memory budget for per-conversation KV caches")
+    parser.add_argument("--max-conversations", type=int, default=DEFAULT_MAX_CONVERSATIONS,
+                        help="Maximum number of conversations whose KV cache is kept")
+    parser.add_argument("--prefix-cache-budget-mb", type=float, default=DEFAULT_PREFIX_CACHE_BUDGET_MB,
+                        help="Memory budget for shared prompt prefixes (0 = disabled)")
+    parser.add_argument("--prefix-min-tokens", type=int, default=DEFAULT_PREFIX_MIN_TOKENS,
+                        help="Minimum prefix length (tokens) worth caching")
+    parser.add_argument("--prefix-min-uses", type=int, default=DEFAULT_PREFIX_MIN_USES,
+                        help="Occurrences of a prefix before its KV cache is precomputed")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help="Concurrent generations decoded together (1 = sequential)")
+    parser.add_argument("--num-draft-tokens", type=int, default=DEFAULT_NUM_DRAFT_TOKENS,
+                        help="Tokens proposed by the draft model per speculative step")
+    parser.add_argument("--max-prompt-tokens", type=int, default=DEFAULT_MAX_PROMPT_TOKENS,
+                        help="Chat prompt token budget (oldest turns are dropped beyond it)")
+    parser.add_argument("--kv-bits", type=int, choices=[4, 8], default=None,
+                        help="Quantize the KV cache to 4 or 8 bits")
+    parser.add_argument("--kv-group-size", type=int, default=DEFAULT_KV_GROUP_SIZE,
+                        help="Group size for KV cache quantization")
+    parser.add_argument("--quantized-kv-start", type=int, default=DEFAULT_QUANTIZED_KV_START,
+                        help="Tokens kept in full precision before quantizing the KV cache")
+    parser.add_argument("--max-kv-size", type=int, default=None,
+                        help="Rotating KV cache size in tokens (sliding window)")
+    parser.add_argument("--memory-budget-mb", type=float, default=None,
+                        help="Hard memory budget: requests are truncated or refused beyond it")
+    args = parser.parse_args()
+
+    server = MLXLLMServer(
+        kv_cache_budget_mb=args.kv_cache_budget_mb,
+        max_conversations=args.max_conversations,
+        prefix_cache_budget_mb=args.prefix_cache_budget_mb,
+        prefix_min_tokens=args.prefix_min_tokens,
+        prefix_min_uses=args.prefix_min_uses,
+        max_batch_size=args.max_batch_size,
+        num_draft_tokens=args.num_draft_tokens,
+        max_prompt_tokens=args.max_prompt_tokens,
+        kv_bits=args.kv_bits,
+        kv_group_size=args.kv_group_size,
+        quantized_kv_start=args.quantized_kv_start,
+        max_kv_size=args.max_kv_size,
+        memory_budget_mb=args.memory_budget_mb
+    )
     server.run()
 
 
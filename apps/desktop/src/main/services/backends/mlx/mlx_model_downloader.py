@@ -11,6 +11,9 @@ import json
 import os
 from typing import Dict, Optional, Callable
 from pathlib import Path
+from functools import partial
+
+from mlx_request_dispatcher import RequestDispatcher
 
 try:
     from huggingface_hub import snapshot_download, hf_hub_download
@@ -22,8 +25,13 @@ except ImportError:
     sys.stderr.flush()
 
 
-def make_tqdm_progress(repo_id):
-    """Factory pour créer une classe tqdm avec repo_id"""
+def make_tqdm_progress(repo_id, emit: Optional[Callable[[Dict], None]] = None):
+    """
+    Factory pour créer une classe tqdm avec repo_id
+
+    emit est appelé depuis les threads de téléchargement de huggingface_hub :
+    il doit donc porter lui-même l'id de la requête.
+    """
     class TqdmProgress(tqdm):
         """Classe tqdm personnalisée pour envoyer la progression via stdout"""
 
@@ -53,7 +61,10 @@ def make_tqdm_progress(repo_id):
                         "percentage": round(percentage, 2),
                         "current_file": self.desc or ""
                     }
-                    print(json.dumps(progress), flush=True)
+                    if emit is not None:
+                        emit(progress)
+                    else:
+                        print(json.dumps(progress), flush=True)
 
     return TqdmProgress
 
@@ -104,6 +115,14 @@ class MLXModelDownloader:
         self.models_dir = Path(models_dir)
         self.models_dir.mkdir(parents=True, exist_ok=True)
 
+        # ping/list sont instantanés ; téléchargements et suppressions en parallèle
+        self.dispatcher = RequestDispatcher(
+            "[MLX Downloader]",
+            self.handle_request,
+            control_commands=("ping", "list"),
+            max_workers=2
+        )
+
     def download_model(
         self,
         repo_id: str,
@@ -167,11 +186,11 @@ class MLXModelDownloader:
                 "repo_id": repo_id,
                 "local_dir": str(local_dir)
             }
-            print(json.dumps(start_msg))
-            sys.stdout.flush()
+            self.dispatcher.emit(start_msg)
 
             # Télécharger avec snapshot_download et progression
-            TqdmProgressClass = make_tqdm_progress(repo_id)
+            emit = partial(self.dispatcher.emit, request_id=self.dispatcher.current_request_id())
+            TqdmProgressClass = make_tqdm_progress(repo_id, emit)
             downloaded_path = snapshot_download(
                 repo_id=repo_id,
                 local_dir=str(local_dir),
@@ -195,8 +214,7 @@ class MLXModelDownloader:
                 "local_path": str(downloaded_path),
                 "size": model_size
             }
-            print(json.dumps(complete_msg))
-            sys.stdout.flush()
+            self.dispatcher.emit(complete_msg)
 
             return {
                 "success": True,
@@ -355,51 +373,11 @@ class MLXModelDownloader:
             }
 
     def run(self):
-        """Boucle principale de traitement des requêtes"""
+        """Boucle principale de traitement des requêtes (multiplexée)"""
         sys.stderr.write("[MLX Downloader] Downloader started\n")
         sys.stderr.flush()
 
-        while True:
-            try:
-                # Lire une ligne depuis stdin
-                line = sys.stdin.readline()
-
-                if not line:
-                    # EOF - terminer proprement
-                    sys.stderr.write("[MLX Downloader] Received EOF, shutting down\n")
-                    sys.stderr.flush()
-                    break
-
-                # Parser la requête JSON
-                request = json.loads(line.strip())
-
-                # Traiter la requête
-                response = self.handle_request(request)
-
-                # Envoyer la réponse en JSON
-                print(json.dumps(response))
-                sys.stdout.flush()
-
-            except json.JSONDecodeError as e:
-                error_response = {
-                    "success": False,
-                    "error": f"Invalid JSON: {str(e)}"
-                }
-                print(json.dumps(error_response))
-                sys.stdout.flush()
-
-            except KeyboardInterrupt:
-                sys.stderr.write("[MLX Downloader] Received interrupt, shutting down\n")
-                sys.stderr.flush()
-                break
-
-            except Exception as e:
-                error_response = {
-                    "success": False,
-                    "error": f"Unexpected error: {str(e)}"
-                }
-                print(json.dumps(error_response))
-                sys.stdout.flush()
+        self.dispatcher.run()
 
 
 def main():
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+MLX Prompt Cache
+Réutilisation du cache KV entre les tours d'une conversation
+
+Sans cache, chaque tour de chat re-prefill tout l'historique : le coût cumulé
+croît de manière quadratique avec la longueur de la conversation. Ici, le cache
+KV de chaque conversation est conservé après la génération ; au tour suivant,
+seuls les tokens qui suivent le plus long préfixe commun sont calculés.
+
+Les préfixes partagés par des conversations différentes (prompt système,
+persona, instructions RAG) ont leur propre cache, indexé par un hash des tokens
+du préfixe : une nouvelle conversation part d'une copie de l'état précalculé.
+
+Les caches sont gardés en LRU sous un budget mémoire.
+"""
+
+import sys
+import copy
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import mlx.core as mx
+    from mlx_lm.models.cache import make_prompt_cache, trim_prompt_cache, can_trim_prompt_cache
+    PROMPT_CACHE_AVAILABLE = True
+except ImportError:
+    PROMPT_CACHE_AVAILABLE = False
+
+
+DEFAULT_KV_CACHE_BUDGET_MB = 2048
+DEFAULT_MAX_CONVERSATIONS = 8
+DEFAULT_PREFIX_CACHE_BUDGET_MB = 512
+DEFAULT_MAX_PREFIXES = 16
+DEFAULT_PREFIX_MIN_TOKENS = 64
+DEFAULT_PREFIX_MIN_USES = 2
+PREFILL_STEP_SIZE = 2048
+
+
+def common_prefix_length(a: List[int], b: List[int]) -> int:
+    """Longueur du plus long préfixe commun de deux séquences de tokens"""
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+def _state_nbytes(state: Any) -> int:
+    """Taille des tableaux d'un état de cache (tuples imbriqués pour les caches quantifiés)"""
+    if isinstance(state, (tuple, list)):
+        return sum(_state_nbytes(item) for item in state)
+    return getattr(state, "nbytes", 0) or 0
+
+
+def cache_nbytes(cache: List[Any]) -> int:
+    """Taille mémoire d'un cache KV (somme des couches)"""
+    total = 0
+    for layer in cache:
+        nbytes = getattr(layer, "nbytes", None)
+        if nbytes is None:
+            nbytes = _state_nbytes(getattr(layer, "state", None) or ())
+        total += nbytes
+    return total
+
+
+def cache_offset(cache: List[Any]) -> Optional[int]:
+    """Nombre de tokens présents dans le cache (None si inconnu)"""
+    if not cache:
+        return None
+    return getattr(cache[0], "offset", None)
+
+
+def prefill_prompt_cache(model, tokens: List[int], max_kv_size: Optional[int] = None) -> List[Any]:
+    """Calcule le cache KV d'une séquence de tokens (par tranches)"""
+    cache = make_prompt_cache(model, max_kv_size=max_kv_size)
+    for i in range(0, len(tokens), PREFILL_STEP_SIZE):
+        model(mx.array(tokens[i:i + PREFILL_STEP_SIZE])[None], cache=cache)
+        mx.eval([layer.state for layer in cache])
+    return cache
+
+
+class ConversationCacheStore:
+    """
+    Caches KV par conversation, en LRU sous budget mémoire
+
+    Un cache est retiré du store pendant la génération (acquire) puis remis
+    avec les tokens qu'il contient (release) : une conversation n'est jamais
+    utilisée par deux générations à la fois.
+    """
+
+    def __init__(
+        self,
+        budget_mb: float = DEFAULT_KV_CACHE_BUDGET_MB,
+        max_entries: int = DEFAULT_MAX_CONVERSATIONS
+    ):
+        """
+        Args:
+            budget_mb: Mémoire maximale occupée par les caches conservés
+            max_entries: Nombre maximum de conversations conservées
+        """
+        self.budget_mb = budget_mb
+        self.max_entries = max(1, max_entries)
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reused_tokens = 0
+        self.prefill_tokens = 0
+
+    def _memory_used_mb(self) -> float:
+        return sum(entry["size_mb"] for entry in self._entries.values())
+
+    def acquire(
+        self,
+        conversation_id: str,
+        model,
+        prompt_tokens: List[int],
+        max_kv_size: Optional[int] = None,
+        fallback: Optional[Callable[[], Optional[Tuple[List[Any], int]]]] = None
+    ) -> Tuple[List[Any], int]:
+        """
+        Cache KV à utiliser pour générer la suite de prompt_tokens
+
+        max_kv_size crée un cache glissant (les plus anciens tokens sont écrasés).
+        fallback fournit un cache de départ quand la conversation n'a rien de
+        réutilisable (ex: préfixe partagé) : ses tokens comptent comme réutilisés
+        dans reused_tokens / prefill_tokens, la requête reste un miss.
+
+        Returns:
+            Tuple (cache, nombre de tokens du prompt déjà présents dans le cache)
+        """
+        with self._lock:
+            entry = self._entries.pop(conversation_id, None)
+
+        cache, reused = None, 0
+        if entry is not None:
+            # Au moins un token doit être calculé pour obtenir les logits
+            common = min(
+                common_prefix_length(entry["tokens"], prompt_tokens),
+                len(prompt_tokens) - 1
+            )
+            excess = len(entry["tokens"]) - common
+
+            if common > 0 and (excess == 0 or can_trim_prompt_cache(entry["cache"])):
+                if excess:
+                    trim_prompt_cache(entry["cache"], excess)
+                cache, reused = entry["cache"], common
+
+        hit = cache is not None
+        if not hit and fallback is not None:
+            cache, reused = fallback() or (None, 0)
+
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.reused_tokens += reused
+            self.prefill_tokens += len(prompt_tokens) - reused
+
+        if cache is None:
+            return make_prompt_cache(model, max_kv_size=max_kv_size), 0
+
+        return cache, reused
+
+    def release(self, conversation_id: str, cache: List[Any], tokens: List[int]):
+        """Remet le cache d'une conversation après génération"""
+        offset = cache_offset(cache)
+        if offset is None:
+            return
+
+        # Le décodage peut avoir calculé un token de plus que ceux retournés
+        if offset > len(tokens):
+            if not can_trim_prompt_cache(cache):
+                return
+            trim_prompt_cache(cache, offset - len(tokens))
+        tokens = list(tokens[:offset])
+
+        size_mb = cache_nbytes(cache) / (1024 * 1024)
+        if size_mb > self.budget_mb:
+            return
+
+        with self._lock:
+            self._entries[conversation_id] = {
+                "cache": cache,
+                "tokens": tokens,
+                "size_mb": size_mb,
+                "last_used": time.time()
+            }
+            self._entries.move_to_end(conversation_id)
+
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries
+                or self._memory_used_mb() > self.budget_mb
+            ):
+                evicted, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+                sys.stderr.write(f"[MLX LLM] Evicted KV cache of conversation {evicted}\n")
+                sys.stderr.flush()
+
+    def evict(self, needed_mb: float) -> float:
+        """Évince les conversations les moins récentes jusqu'à libérer needed_mb"""
+        freed = 0.0
+        with self._lock:
+            while self._entries and freed < needed_mb:
+                _, entry = self._entries.popitem(last=False)
+                freed += entry["size_mb"]
+                self.evictions += 1
+        return freed
+
+    def drop(self, conversation_id: str) -> bool:
+        """Oublie le cache d'une conversation"""
+        with self._lock:
+            return self._entries.pop(conversation_id, None) is not None
+
+    def clear(self):
+        """Vide tous les caches (ex: changement de modèle)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs de réutilisation et occupation mémoire"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "conversations": [
+                    {
+                        "id": conversation_id,
+                        "tokens": len(entry["tokens"]),
+                        "size_mb": round(entry["size_mb"], 2)
+                    }
+                    for conversation_id, entry in self._entries.items()
+                ],
+                "memory_used_mb": round(self._memory_used_mb(), 2),
+                "memory_budget_mb": self.budget_mb,
+                "max_conversations": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "reused_tokens": self.reused_tokens,
+                "prefill_tokens": self.prefill_tokens,
+                "evictions": self.evictions
+            }
+
+
+class PrefixCacheStore:
+    """
+    Caches KV de préfixes fréquents, partagés entre conversations
+
+    Un préfixe n'est précalculé qu'à partir de min_uses occurrences, pour ne pas
+    payer un prefill supplémentaire pour des prompts système uniques. Chaque
+    requête reçoit une copie du cache : la génération l'étend sans toucher à
+    l'original.
+    """
+
+    def __init__(
+        self,
+        budget_mb: float = DEFAULT_PREFIX_CACHE_BUDGET_MB,
+        max_entries: int = DEFAULT_MAX_PREFIXES,
+        min_tokens: int = DEFAULT_PREFIX_MIN_TOKENS,
+        min_uses: int = DEFAULT_PREFIX_MIN_USES
+    ):
+        """
+        Args:
+            budget_mb: Mémoire maximale occupée par les préfixes précalculés
+            max_entries: Nombre maximum de préfixes conservés
+            min_tokens: Taille minimale d'un préfixe pour être mis en cache
+            min_uses: Nombre d'occurrences avant de précalculer un préfixe
+        """
+        self.budget_mb = budget_mb
+        self.max_entries = max(1, max_entries)
+        self.min_tokens = min_tokens
+        self.min_uses = max(1, min_uses)
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._uses: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.evictions = 0
+        self.saved_tokens = 0
+
+    @staticmethod
+    def make_key(model_name: str, tokens: List[int]) -> str:
+        """Clé de cache: sha256(modèle + tokens du préfixe)"""
+        raw = f"{model_name}\x00" + ",".join(map(str, tokens))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _memory_used_mb(self) -> float:
+        return sum(entry["size_mb"] for entry in self._entries.values())
+
+    def _count_use(self, key: str) -> int:
+        uses = self._uses.pop(key, 0) + 1
+        self._uses[key] = uses
+        # Compteurs bornés : on oublie les préfixes les plus anciens
+        while len(self._uses) > self.max_entries * 16:
+            self._uses.popitem(last=False)
+        return uses
+
+    def lookup(
+        self,
+        model_name: str,
+        tokens: List[int],
+        build: Callable[[], List[Any]]
+    ) -> Optional[List[Any]]:
+        """
+        Copie du cache KV du préfixe, ou None s'il n'est pas (encore) en cache
+
+        build calcule le cache du préfixe quand il devient assez fréquent.
+        """
+        if len(tokens) < self.min_tokens:
+            return None
+
+        key = self.make_key(model_name, tokens)
+
+        with self._lock:
+            uses = self._count_use(key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry["hits"] += 1
+                self.hits += 1
+                self.saved_tokens += len(tokens)
+                return copy.deepcopy(entry["cache"])
+
+            self.misses += 1
+
+        if uses < self.min_uses:
+            return None
+
+        start = time.perf_counter()
+        cache = build()
+        build_time_ms = (time.perf_counter() - start) * 1000
+        size_mb = cache_nbytes(cache) / (1024 * 1024)
+
+        sys.stderr.write(f"[MLX LLM] Cached prompt prefix ({len(tokens)} tokens, {build_time_ms:.0f} ms)\n")
+        sys.stderr.flush()
+
+        if size_mb <= self.budget_mb:
+            with self._lock:
+                self.builds += 1
+                self._entries[key] = {
+                    "cache": cache,
+                    "tokens": len(tokens),
+                    "size_mb": size_mb,
+                    "hits": 0,
+                    "build_time_ms": build_time_ms
+                }
+                while len(self._entries) > 1 and (
+                    len(self._entries) > self.max_entries
+                    or self._memory_used_mb() > self.budget_mb
+                ):
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+            cache = copy.deepcopy(cache)
+
+        return cache
+
+    def clear(self):
+        """Vide tous les préfixes (ex: changement de modèle)"""
+        with self._lock:
+            self._entries.clear()
+            self._uses.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Taux de hit, tokens de prefill économisés et occupation mémoire"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "prefixes": [
+                    {
+                        "key": key[:12],
+                        "tokens": entry["tokens"],
+                        "size_mb": round(entry["size_mb"], 2),
+                        "hits": entry["hits"],
+                        "build_time_ms": round(entry["build_time_ms"], 2)
+                    }
+                    for key, entry in self._entries.items()
+                ],
+                "memory_used_mb": round(self._memory_used_mb(), 2),
+                "memory_budget_mb": self.budget_mb,
+                "min_tokens": self.min_tokens,
+                "min_uses": self.min_uses,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "builds": self.builds,
+                "evictions": self.evictions,
+                "prefill_tokens_saved": self.saved_tokens
+            }
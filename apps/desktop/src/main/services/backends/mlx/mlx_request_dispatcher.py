@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+MLX Request Dispatcher
+Boucle stdin/stdout multiplexée partagée par les serveurs MLX
+
+- Un thread lecteur parse les requêtes JSON au fil de l'eau
+- Les commandes de contrôle (ping, status, ...) sont traitées immédiatement,
+  sans jamais attendre derrière un travail lourd
+- Les autres commandes passent par une file et un pool de workers
+- Chaque message émis pour une requête porte son `id` (si fourni), les
+  réponses peuvent donc arriver dans le désordre
+- `{"command": "cancel", "request_id": ...}` annule une requête en file ou en
+  cours, et `deadline_ms` fixe une échéance relative à la réception ; les
+  handlers interrogent check_stop() à chaque frontière de travail (token, lot)
+- Les commandes exclusives (ex: load) servent de barrière avec plusieurs
+  workers : elles attendent la fin des requêtes reçues avant elles, et les
+  requêtes reçues après attendent leur fin. Une commande ne peut pas être à
+  la fois exclusive et regroupée (batch_handlers) : un lot coalescé
+  franchirait la barrière
+"""
+
+import sys
+import json
+import time
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+_STOP = object()
+_UNSET = object()
+
+
+class RequestControl:
+    """État d'annulation / échéance d'une requête"""
+
+    def __init__(self, deadline_ms: Optional[float] = None):
+        self.received_at = time.monotonic()
+        self.cancelled = threading.Event()
+        self.deadline = self.received_at + deadline_ms / 1000 if deadline_ms else None
+
+    def stop_reason(self) -> Optional[str]:
+        """'cancelled', 'deadline' ou None"""
+        if self.cancelled.is_set():
+            return "cancelled"
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            return "deadline"
+        return None
+
+
+class RequestDispatcher:
+    """Dispatch des requêtes JSON-lines vers un handler, avec workers et coalescence"""
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Dict], Optional[Dict]],
+        control_commands: Iterable[str] = ("ping", "status"),
+        max_workers: int = 1,
+        batch_handlers: Optional[Dict[str, Callable[[List[Dict]], List[Dict]]]] = None,
+        batch_window_ms: float = 0.0,
+        exclusive_commands: Iterable[str] = ()
+    ):
+        """
+        Args:
+            name: Préfixe des logs (ex: "[MLX LLM]")
+            handler: Traite une requête et retourne la réponse finale (None = rien à envoyer)
+            control_commands: Commandes légères traitées directement par le thread lecteur
+                (cancel est toujours traité par le dispatcher lui-même)
+            max_workers: Nombre de workers pour les commandes lourdes
+            batch_handlers: Commandes dont les requêtes proches sont traitées ensemble
+            batch_window_ms: Fenêtre de regroupement pour batch_handlers
+            exclusive_commands: Commandes qui ne s'exécutent jamais en même temps
+                qu'une autre requête, dans l'ordre de réception
+
+        Raises:
+            ValueError: Si une commande est à la fois exclusive et dans batch_handlers
+        """
+        self.name = name
+        self.handler = handler
+        self.control_commands = set(control_commands)
+        self.max_workers = max(1, max_workers)
+        self.batch_handlers = batch_handlers or {}
+        self.batch_window_ms = batch_window_ms
+        self.exclusive_commands = set(exclusive_commands)
+
+        overlap = self.exclusive_commands & set(self.batch_handlers)
+        if overlap:
+            raise ValueError(f"Commands cannot be both exclusive and batched: {', '.join(sorted(overlap))}")
+
+        self._work: "queue.Queue[Any]" = queue.Queue()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._in_flight: Dict[Any, Dict] = {}
+        self._in_flight_lock = threading.Lock()
+        self._controls: Dict[Any, RequestControl] = {}
+        self.cancelled_count = 0
+
+        # Ordre de réception des requêtes en file / en cours (barrières exclusives)
+        self._seq = 0
+        self._unfinished: Dict[int, bool] = {}
+        self._order = threading.Condition()
+
+    def _log(self, message: str):
+        sys.stderr.write(f"{self.name} {message}\n")
+        sys.stderr.flush()
+
+    def current_request_id(self) -> Any:
+        """ID de la requête traitée par le thread courant (None si aucun)"""
+        return getattr(self._local, "request_id", None)
+
+    def current_control(self) -> Optional[RequestControl]:
+        """Contrôle (annulation / échéance) de la requête du thread courant"""
+        return getattr(self._local, "control", None)
+
+    def emit(self, message: Dict, request_id: Any = _UNSET):
+        """Écrit un message JSON sur stdout (thread-safe), tagué avec l'id de requête"""
+        if request_id is _UNSET:
+            request_id = self.current_request_id()
+        if request_id is not None:
+            message = {**message, "id": request_id}
+
+        line = json.dumps(message)
+        with self._write_lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    def check_stop(self, request_id: Any = _UNSET) -> Optional[str]:
+        """
+        Indique si une requête doit s'arrêter ('cancelled', 'deadline' ou None)
+
+        Sans argument, concerne la requête traitée par le thread courant.
+        """
+        if request_id is _UNSET:
+            control = self.current_control()
+        else:
+            with self._in_flight_lock:
+                control = self._controls.get(request_id)
+
+        return control.stop_reason() if control is not None else None
+
+    def cancel(self, request_id: Any) -> Dict:
+        """Annule une requête en file ou en cours"""
+        with self._in_flight_lock:
+            control = self._controls.get(request_id)
+            running = request_id in self._in_flight
+
+        if control is None:
+            return {
+                "success": False,
+                "error": f"Unknown or finished request: {request_id}",
+                "request_id": request_id
+            }
+
+        control.cancelled.set()
+        self.cancelled_count += 1
+        self._log(f"Cancel requested for {request_id}")
+
+        return {
+            "success": True,
+            "request_id": request_id,
+            "state": "running" if running else "queued"
+        }
+
+    def in_flight(self) -> List[Dict]:
+        """Requêtes en cours de traitement (pour status)"""
+        now = time.time()
+        with self._in_flight_lock:
+            return [
+                {
+                    "id": request_id,
+                    "command": info["command"],
+                    "elapsed_ms": round((now - info["started_at"]) * 1000, 1)
+                }
+                for request_id, info in self._in_flight.items()
+            ]
+
+    def _register(self, request: Dict) -> RequestControl:
+        """Crée le contrôle d'une requête à sa réception"""
+        control = RequestControl(request.get("deadline_ms"))
+        request_id = request.get("id")
+        if request_id is not None:
+            with self._in_flight_lock:
+                self._controls[request_id] = control
+        return control
+
+    def _track(self, request: Dict):
+        request_id = request.get("id")
+        if request_id is not None:
+            with self._in_flight_lock:
+                self._in_flight[request_id] = {
+                    "command": request.get("command"),
+                    "started_at": time.time()
+                }
+
+    def _untrack(self, request: Dict):
+        request_id = request.get("id")
+        if request_id is not None:
+            with self._in_flight_lock:
+                self._in_flight.pop(request_id, None)
+                self._controls.pop(request_id, None)
+
+    def _enqueue(self, request: Dict):
+        """Met une requête en file en notant son rang de réception"""
+        exclusive = request.get("command") in self.exclusive_commands
+        with self._order:
+            self._seq += 1
+            seq = self._seq
+            self._unfinished[seq] = exclusive
+        self._work.put((request, self._register(request), seq))
+
+    def _blocked(self, seq: int) -> bool:
+        """Une requête exclusive attend tout ce qui précède, les autres attendent les exclusives"""
+        exclusive = self._unfinished.get(seq, False)
+        return any(
+            other < seq and (exclusive or other_exclusive)
+            for other, other_exclusive in self._unfinished.items()
+        )
+
+    def _wait_turn(self, seq: int):
+        if not self.exclusive_commands:
+            return
+        with self._order:
+            while self._blocked(seq):
+                self._order.wait()
+
+    def _done(self, seq: int):
+        with self._order:
+            self._unfinished.pop(seq, None)
+            self._order.notify_all()
+
+    def _stopped_response(self, reason: str) -> Dict:
+        """Réponse pour une requête arrêtée avant d'avoir commencé"""
+        return {
+            "success": False,
+            "stopped": reason,
+            "error": f"Request {reason} before it started"
+        }
+
+    def _process(self, request: Dict, control: Optional[RequestControl] = None):
+        """Traite une requête et émet sa réponse"""
+        request_id = request.get("id")
+        track = control is not None
+
+        if track:
+            reason = control.stop_reason()
+            if reason:
+                self._untrack(request)
+                self.emit(self._stopped_response(reason), request_id)
+                return
+            self._track(request)
+
+        self._local.request_id = request_id
+        self._local.control = control
+
+        try:
+            response = self.handler(request)
+        except Exception as e:
+            response = {
+                "success": False,
+                "error": f"Unexpected error: {str(e)}"
+            }
+        finally:
+            if track:
+                self._untrack(request)
+            self._local.request_id = None
+            self._local.control = None
+
+        if response is not None:
+            self.emit(response, request_id)
+
+    def _process_batch(self, command: str, items: List[Tuple[Dict, RequestControl, int]]):
+        """Traite un groupe de requêtes de même commande en un seul appel"""
+        requests = []
+        for request, control, _ in items:
+            reason = control.stop_reason()
+            if reason:
+                self._untrack(request)
+                self.emit(self._stopped_response(reason), request.get("id"))
+            else:
+                self._track(request)
+                requests.append(request)
+
+        if not requests:
+            return
+
+        try:
+            responses = self.batch_handlers[command](requests)
+        except Exception as e:
+            responses = [
+                {"success": False, "error": f"Unexpected error: {str(e)}"}
+                for _ in requests
+            ]
+        finally:
+            for request in requests:
+                self._untrack(request)
+
+        for request, response in zip(requests, responses):
+            self.emit(response, request.get("id"))
+
+    def _worker(self):
+        carry = None
+
+        while True:
+            item = carry if carry is not None else self._work.get()
+            carry = None
+
+            if item is _STOP:
+                # Laisser le signal d'arrêt aux autres workers
+                self._work.put(_STOP)
+                return
+
+            request, control, seq = item
+            command = request.get("command")
+
+            if command not in self.batch_handlers or self.batch_window_ms <= 0:
+                self._wait_turn(seq)
+                try:
+                    self._process(request, control)
+                finally:
+                    self._done(seq)
+                continue
+
+            # Regrouper les requêtes de même commande arrivées dans la fenêtre
+            burst = [item]
+            deadline = time.monotonic() + self.batch_window_ms / 1000
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                try:
+                    nxt = self._work.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+                if nxt is _STOP or nxt[0].get("command") != command:
+                    carry = nxt
+                    break
+
+                burst.append(nxt)
+
+            for _, _, burst_seq in burst:
+                self._wait_turn(burst_seq)
+            try:
+                self._process_batch(command, burst)
+            finally:
+                for _, _, burst_seq in burst:
+                    self._done(burst_seq)
+
+    def run(self):
+        """Lit stdin jusqu'à EOF, puis attend la fin des requêtes en cours"""
+        workers = [
+            threading.Thread(target=self._worker, daemon=True)
+            for _ in range(self.max_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for line in sys.stdin:
+                line = line.strip()
+                if not line:
+                    continue
+
+                try:
+                    # Parser la requête JSON
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    self.emit({
+                        "success": False,
+                        "error": f"Invalid JSON: {str(e)}"
+                    }, None)
+                    continue
+
+                if not isinstance(request, dict):
+                    self.emit({
+                        "success": False,
+                        "error": "Invalid request: expected a JSON object"
+                    }, None)
+                    continue
+
+                if request.get("command") == "cancel":
+                    self.emit(self.cancel(request.get("request_id")), request.get("id"))
+                elif request.get("command") in self.control_commands:
+                    self._process(request)
+                else:
+                    self._enqueue(request)
+
+            # EOF - terminer proprement après les requêtes en cours
+            self._log("Received EOF, shutting down")
+
+        except KeyboardInterrupt:
+            self._log("Received interrupt, shutting down")
+            return
+
+        self._work.put(_STOP)
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,1037 @@
+#!/usr/bin/env python3
+"""
+MLX Structured Output
+Décodage contraint (JSON schema ou regex) pour mlx_llm_server.py
+
+La contrainte est compilée en automate (regex -> NFA -> DFA construit à la
+demande) ; à chaque pas de décodage, un masque de logits n'autorise que les
+tokens dont le texte garde la sortie dans le langage de l'automate. EOS n'est
+autorisé que dans un état acceptant : la sortie est valide dès le premier essai
+(sauf si max_tokens l'interrompt).
+
+Coût par token:
+- les tokens autorisés sont calculés une fois par état de l'automate : tout le
+  vocabulaire avance d'un caractère à la fois en numpy, sur les classes de
+  caractères de l'automate (transitions état x classe mises en cache)
+- ils sont gardés en bits compactés (1 bit par token) dans un cache LRU borné
+  en octets, partagé par les contraintes compilées ; le masque additif n'est
+  construit qu'au moment du pas (et réutilisé tant que l'état ne change pas)
+
+Sous-ensemble JSON schema supporté: type (object, array, string, number,
+integer, boolean, null, ou liste de types), properties/required (dans l'ordre
+déclaré), items, minItems/maxItems, enum, const, anyOf/oneOf, pattern,
+minLength/maxLength. Les $ref et schémas récursifs ne sont pas supportés.
+"""
+
+import re
+import json
+import time
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import mlx.core as mx
+    MLX_AVAILABLE = True
+except ImportError:
+    MLX_AVAILABLE = False
+
+
+DEFAULT_MAX_CONSTRAINTS = 32
+# Budget des tokens autorisés en cache (bits compactés, toutes contraintes confondues)
+DEFAULT_MASK_CACHE_MB = 64
+
+# Espace optionnel entre éléments JSON
+JSON_WHITESPACE = r"[ ]?"
+JSON_STRING_CHAR = r'([^"\\\x00-\x1f]|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})'
+JSON_PRIMITIVES = {
+    "string": '"' + JSON_STRING_CHAR + '*"',
+    "integer": r"-?(0|[1-9][0-9]*)",
+    "number": r"-?(0|[1-9][0-9]*)(\.[0-9]+)?([eE][+-]?[0-9]+)?",
+    "boolean": r"(true|false)",
+    "null": r"null",
+}
+
+
+# ============================================================================
+# JSON schema -> regex
+# ============================================================================
+
+def _literal(text: str) -> str:
+    """Échappe un texte pour la syntaxe regex supportée"""
+    return "".join("\\" + ch if ch in "\\.^$|?*+()[]{}" else ch for ch in text)
+
+
+def _object_regex(properties: Dict[str, Any], required: List[str]) -> str:
+    """
+    Propriétés dans l'ordre déclaré ; les optionnelles peuvent manquer
+
+    Construction linéaire (chaque propriété apparaît au plus deux fois) : body
+    couvre les préfixes non vides déjà écrits, can_be_empty indique qu'aucune
+    propriété obligatoire n'a encore été rencontrée.
+    """
+    separator = JSON_WHITESPACE + "," + JSON_WHITESPACE
+    body = ""
+    can_be_empty = True
+
+    for name, schema in properties.items():
+        member = _literal(json.dumps(name)) + JSON_WHITESPACE + ":" + JSON_WHITESPACE + schema_to_regex(schema)
+        if name in required:
+            if not body:
+                body = member
+            elif can_be_empty:
+                body = f"({body}{separator})?{member}"
+            else:
+                body = f"{body}{separator}{member}"
+            can_be_empty = False
+        elif not body:
+            body = member
+        elif can_be_empty:
+            body = f"({body}({separator}{member})?|{member})"
+        else:
+            body = f"{body}({separator}{member})?"
+
+    if body and can_be_empty:
+        body = f"({body})?"
+    return r"\{" + JSON_WHITESPACE + body + JSON_WHITESPACE + r"\}"
+
+
+def _array_regex(schema: Dict[str, Any]) -> str:
+    item = schema_to_regex(schema.get("items", {"type": ["string", "number", "boolean", "null"]}))
+    separator = JSON_WHITESPACE + "," + JSON_WHITESPACE
+    min_items = schema.get("minItems", 0)
+    max_items = schema.get("maxItems")
+
+    if max_items == 0:
+        body = ""
+    elif min_items == 0:
+        upper = "" if max_items is None else str(max_items - 1)
+        body = f"({item}({separator}{item}){{0,{upper}}})?"
+    else:
+        upper = "" if max_items is None else str(max_items - 1)
+        body = f"{item}({separator}{item}){{{min_items - 1},{upper}}}"
+
+    return r"\[" + JSON_WHITESPACE + body + JSON_WHITESPACE + r"\]"
+
+
+def _string_regex(schema: Dict[str, Any]) -> str:
+    if "pattern" in schema:
+        return '"' + _pattern_regex(schema["pattern"]) + '"'
+
+    min_length = schema.get("minLength")
+    max_length = schema.get("maxLength")
+    if min_length is None and max_length is None:
+        return JSON_PRIMITIVES["string"]
+
+    upper = "" if max_length is None else str(max_length)
+    return '"' + JSON_STRING_CHAR + "{" + str(min_length or 0) + "," + upper + '}"'
+
+
+def _pattern_regex(pattern: str) -> str:
+    """
+    Contenu d'une chaîne JSON pour un `pattern` de JSON schema
+
+    Comme en JSON schema, le pattern n'est pas ancré : une alternative sans ^
+    (ou $) accepte du texte libre avant (ou après). Les caractères produits par
+    le pattern sont limités à ceux qu'une chaîne JSON contient tels quels (ni ",
+    ni \\, ni caractère de contrôle), pour que la sortie reste du JSON valide.
+
+    Raises:
+        ValueError: Regex invalide, ancre au milieu du pattern, ou pattern qui
+            ne peut produire que des caractères à échapper
+    """
+    tree = _RegexParser(pattern, keep_anchors=True).parse()
+    free_text = JSON_STRING_CHAR + "*"
+
+    branches = []
+    for branch in (tree[1] if tree[0] == "alt" else [tree]):
+        items = list(branch[1]) if branch[0] == "cat" else [branch]
+        anchored_start = bool(items) and items[0] == ("anchor", "^")
+        if anchored_start:
+            items = items[1:]
+        anchored_end = bool(items) and items[-1] == ("anchor", "$")
+        if anchored_end:
+            items = items[:-1]
+
+        body = _json_safe_node(("cat", items))
+        if body is not None:
+            branches.append(
+                ("" if anchored_start else free_text) + _regex_source(body) + ("" if anchored_end else free_text)
+            )
+
+    if not branches:
+        raise ValueError(f"JSON schema pattern {pattern!r} only matches characters that JSON strings must escape")
+    return "(" + "|".join(branches) + ")"
+
+
+# Caractères qu'une chaîne JSON ne peut pas contenir sans échappement
+_JSON_ESCAPED_RANGES = [(0x00, 0x1F), (0x22, 0x22), (0x5C, 0x5C)]
+
+
+def _json_safe_charset(charset: "CharSet") -> Optional["CharSet"]:
+    """Intersection avec les caractères JSON non échappés (None si vide)"""
+    if charset.negated:
+        return CharSet(list(charset.ranges) + _JSON_ESCAPED_RANGES, negated=True)
+
+    ranges = []
+    for low, high in charset.ranges:
+        for excluded_low, excluded_high in _JSON_ESCAPED_RANGES:
+            if excluded_high < low or excluded_low > high:
+                continue
+            if excluded_low > low:
+                ranges.append((low, excluded_low - 1))
+            low = max(low, excluded_high + 1)
+            if low > high:
+                break
+        if low <= high:
+            ranges.append((low, high))
+    return CharSet(ranges) if ranges else None
+
+
+def _json_safe_node(node) -> Optional[Any]:
+    """Arbre de regex restreint aux caractères JSON non échappés (None si langage vide)"""
+    kind = node[0]
+    if kind == "anchor":
+        raise ValueError("Regex anchors are only supported at the start or end of a JSON schema pattern")
+
+    if kind == "char":
+        charset = _json_safe_charset(node[1])
+        return ("char", charset) if charset is not None else None
+
+    if kind == "cat":
+        items = [_json_safe_node(item) for item in node[1]]
+        return None if any(item is None for item in items) else ("cat", items)
+
+    if kind == "alt":
+        branches = [branch for branch in map(_json_safe_node, node[1]) if branch is not None]
+        if not branches:
+            return None
+        return branches[0] if len(branches) == 1 else ("alt", branches)
+
+    _, child, minimum, maximum = node
+    child = _json_safe_node(child)
+    if child is None:
+        return ("cat", []) if minimum == 0 else None
+    return ("repeat", child, minimum, maximum)
+
+
+def _class_char(code: int) -> str:
+    if code > 0xFFFF:
+        return chr(code)
+    if code < 0x20 or code >= 0x7F or chr(code) in "\\]^-[":
+        return f"\\u{code:04x}"
+    return chr(code)
+
+
+def _regex_source(node) -> str:
+    """Regex (syntaxe de _RegexParser) d'un arbre de regex"""
+    kind = node[0]
+    if kind == "char":
+        charset = node[1]
+        ranges = "".join(
+            _class_char(low) if low == high else f"{_class_char(low)}-{_class_char(high)}"
+            for low, high in charset.ranges
+        )
+        return "[" + ("^" if charset.negated else "") + ranges + "]"
+
+    if kind == "cat":
+        return "".join(_regex_source(item) for item in node[1])
+
+    if kind == "alt":
+        return "(" + "|".join(_regex_source(branch) for branch in node[1]) + ")"
+
+    _, child, minimum, maximum = node
+    return "(" + _regex_source(child) + ")" + "{" + f"{minimum},{'' if maximum is None else maximum}" + "}"
+
+
+def schema_to_regex(schema: Dict[str, Any]) -> str:
+    """
+    Convertit un JSON schema en regex (JSON compact, espaces optionnels)
+
+    Raises:
+        ValueError: Construction non supportée
+    """
+    if not isinstance(schema, dict):
+        raise ValueError(f"Invalid JSON schema: {schema!r}")
+
+    if "$ref" in schema:
+        raise ValueError("JSON schema $ref is not supported")
+
+    if "const" in schema:
+        return _literal(json.dumps(schema["const"]))
+
+    if "enum" in schema:
+        return "(" + "|".join(_literal(json.dumps(value)) for value in schema["enum"]) + ")"
+
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            return "(" + "|".join(schema_to_regex(sub) for sub in schema[key]) + ")"
+
+    schema_type = schema.get("type")
+    if schema_type is None:
+        if "properties" in schema:
+            schema_type = "object"
+        elif "items" in schema:
+            schema_type = "array"
+        else:
+            raise ValueError("JSON schema needs a type (free-form values are not supported)")
+
+    if isinstance(schema_type, list):
+        return "(" + "|".join(schema_to_regex({**schema, "type": t}) for t in schema_type) + ")"
+
+    if schema_type == "object":
+        properties = schema.get("properties")
+        if not properties:
+            raise ValueError("JSON schema objects need explicit properties")
+        return _object_regex(properties, schema.get("required", []))
+
+    if schema_type == "array":
+        return _array_regex(schema)
+
+    if schema_type == "string":
+        return _string_regex(schema)
+
+    if schema_type in JSON_PRIMITIVES:
+        return JSON_PRIMITIVES[schema_type]
+
+    raise ValueError(f"Unsupported JSON schema type: {schema_type}")
+
+
+# ============================================================================
+# Regex -> automate
+# ============================================================================
+
+class CharSet:
+    """Ensemble de caractères (intervalles de codes, éventuellement complémenté)"""
+
+    __slots__ = ("ranges", "negated")
+
+    def __init__(self, ranges: List[Tuple[int, int]], negated: bool = False):
+        self.ranges = tuple(ranges)
+        self.negated = negated
+
+    def matches(self, ch: str) -> bool:
+        code = ord(ch)
+        for low, high in self.ranges:
+            if low <= code <= high:
+                return not self.negated
+        return self.negated
+
+    def matches_codes(self, codes: np.ndarray) -> np.ndarray:
+        """matches() pour un tableau de codes de caractères"""
+        result = np.zeros(codes.shape, dtype=bool)
+        for low, high in self.ranges:
+            result |= (codes >= low) & (codes <= high)
+        return ~result if self.negated else result
+
+
+_CLASS_ESCAPES = {
+    "d": ([(48, 57)], False),
+    "D": ([(48, 57)], True),
+    "w": ([(48, 57), (65, 90), (95, 95), (97, 122)], False),
+    "W": ([(48, 57), (65, 90), (95, 95), (97, 122)], True),
+    "s": ([(9, 13), (32, 32)], False),
+    "S": ([(9, 13), (32, 32)], True),
+}
+_CHAR_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "f": "\f", "v": "\v", "0": "\0"}
+
+
+class _RegexParser:
+    """Parseur d'un sous-ensemble de regex (groupes, alternatives, classes, quantificateurs)"""
+
+    def __init__(self, pattern: str, keep_anchors: bool = False):
+        """
+        Args:
+            pattern: Regex à analyser
+            keep_anchors: Garder ^ et $ dans l'arbre (nœuds "anchor") au lieu
+                de les ignorer
+        """
+        self.pattern = pattern
+        self.keep_anchors = keep_anchors
+        self.pos = 0
+
+    def parse(self):
+        node = self._alternation()
+        if self.pos != len(self.pattern):
+            raise ValueError(f"Unexpected '{self.pattern[self.pos]}' at position {self.pos} in regex")
+        return node
+
+    def _peek(self) -> Optional[str]:
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+    def _next(self) -> str:
+        if self.pos >= len(self.pattern):
+            raise ValueError("Unexpected end of regex")
+        ch = self.pattern[self.pos]
+        self.pos += 1
+        return ch
+
+    def _alternation(self):
+        branches = [self._concatenation()]
+        while self._peek() == "|":
+            self.pos += 1
+            branches.append(self._concatenation())
+        return branches[0] if len(branches) == 1 else ("alt", branches)
+
+    def _concatenation(self):
+        items = []
+        while self._peek() not in (None, "|", ")"):
+            atom = self._atom()
+            if atom is not None:
+                items.append(self._quantified(atom))
+        return items[0] if len(items) == 1 else ("cat", items)
+
+    def _quantified(self, atom):
+        while True:
+            ch = self._peek()
+            if ch == "*":
+                self.pos += 1
+                atom = ("repeat", atom, 0, None)
+            elif ch == "+":
+                self.pos += 1
+                atom = ("repeat", atom, 1, None)
+            elif ch == "?":
+                self.pos += 1
+                atom = ("repeat", atom, 0, 1)
+            elif ch == "{" and re.match(r"\{(\d+(,\d*)?|,\d+)\}", self.pattern[self.pos:]):
+                end = self.pattern.index("}", self.pos)
+                low, _, high = self.pattern[self.pos + 1:end].partition(",")
+                has_comma = "," in self.pattern[self.pos:end]
+                self.pos = end + 1
+                minimum = int(low or 0)
+                maximum = (int(high) if high else None) if has_comma else minimum
+                atom = ("repeat", atom, minimum, maximum)
+            else:
+                return atom
+            if self._peek() == "?":
+                # Quantificateur non gourmand: même langage
+                self.pos += 1
+
+    def _atom(self):
+        ch = self._next()
+        if ch == "(":
+            if self.pattern.startswith("?:", self.pos):
+                self.pos += 2
+            elif self._peek() == "?":
+                raise ValueError("Regex lookarounds and named groups are not supported")
+            node = self._alternation()
+            if self._next() != ")":
+                raise ValueError("Unbalanced parenthesis in regex")
+            return node
+        if ch == "[":
+            return ("char", self._char_class())
+        if ch == ".":
+            return ("char", CharSet([(10, 10)], negated=True))
+        if ch in "^$":
+            # Ancres: la contrainte porte toujours sur la sortie entière
+            return ("anchor", ch) if self.keep_anchors else None
+        if ch == "\\":
+            return ("char", self._escape())
+        if ch in "*+?":
+            raise ValueError(f"Nothing to repeat at position {self.pos - 1} in regex")
+        return ("char", CharSet([(ord(ch), ord(ch))]))
+
+    def _escape_char(self) -> Any:
+        """Caractère échappé: retourne un code, ou un CharSet pour \\d, \\w, \\s..."""
+        ch = self._next()
+        if ch in _CLASS_ESCAPES:
+            ranges, negated = _CLASS_ESCAPES[ch]
+            return CharSet(ranges, negated)
+        if ch in _CHAR_ESCAPES:
+            return ord(_CHAR_ESCAPES[ch])
+        if ch in "xu":
+            width = 2 if ch == "x" else 4
+            digits = self.pattern[self.pos:self.pos + width]
+            if len(digits) != width or not all(c in "0123456789abcdefABCDEF" for c in digits):
+                raise ValueError(f"Invalid \\{ch} escape in regex")
+            self.pos += width
+            return int(digits, 16)
+        if ch.isalnum():
+            raise ValueError(f"Unsupported regex escape \\{ch}")
+        return ord(ch)
+
+    def _escape(self) -> CharSet:
+        value = self._escape_char()
+        return value if isinstance(value, CharSet) else CharSet([(value, value)])
+
+    def _char_class(self) -> CharSet:
+        negated = self._peek() == "^"
+        if negated:
+            self.pos += 1
+
+        ranges: List[Tuple[int, int]] = []
+        first = True
+        while True:
+            ch = self._next()
+            if ch == "]" and not first:
+                break
+            first = False
+
+            if ch == "\\":
+                value = self._escape_char()
+                if isinstance(value, CharSet):
+                    if value.negated:
+                        raise ValueError("Negated escapes inside a regex class are not supported")
+                    ranges.extend(value.ranges)
+                    continue
+                low = value
+            else:
+                low = ord(ch)
+
+            if self._peek() == "-" and self.pattern[self.pos + 1:self.pos + 2] not in ("]", ""):
+                self.pos += 1
+                end = self._next()
+                high = self._escape_char() if end == "\\" else ord(end)
+                if isinstance(high, CharSet) or high < low:
+                    raise ValueError("Invalid range in regex class")
+                ranges.append((low, high))
+            else:
+                ranges.append((low, low))
+
+        return CharSet(ranges, negated)
+
+
+class RegexAutomaton:
+    """
+    Automate d'une regex (correspondance complète)
+
+    NFA de Thompson, déterminisé à la demande : les états du DFA (ensembles
+    d'états du NFA) et leurs transitions par caractère sont mis en cache. Tout
+    état non vide peut encore atteindre un état acceptant.
+    """
+
+    DEAD = -1
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self._epsilon: List[List[int]] = []
+        self._edges: List[List[Tuple[CharSet, int]]] = []
+
+        start, self._accept = self._build(_RegexParser(pattern).parse())
+
+        self._state_ids: Dict[frozenset, int] = {}
+        self._state_edges: List[List[Tuple[CharSet, int]]] = []
+        self._accepting: List[bool] = []
+        self._transitions: Dict[Tuple[int, str], int] = {}
+        self._lock = threading.Lock()
+        self.start = self._dfa_state(self._closure({start}))
+
+    @property
+    def num_states(self) -> int:
+        return len(self._accepting)
+
+    def _new_state(self) -> int:
+        self._epsilon.append([])
+        self._edges.append([])
+        return len(self._epsilon) - 1
+
+    def _build(self, node) -> Tuple[int, int]:
+        """Fragment NFA (entrée, sortie) d'un nœud de la regex"""
+        start = self._new_state()
+
+        if node is None or node == ("cat", []):
+            return start, start
+
+        kind = node[0]
+        if kind == "char":
+            end = self._new_state()
+            self._edges[start].append((node[1], end))
+            return start, end
+
+        if kind == "cat":
+            end = start
+            for item in node[1]:
+                item_start, item_end = self._build(item)
+                self._epsilon[end].append(item_start)
+                end = item_end
+            return start, end
+
+        if kind == "alt":
+            end = self._new_state()
+            for branch in node[1]:
+                branch_start, branch_end = self._build(branch)
+                self._epsilon[start].append(branch_start)
+                self._epsilon[branch_end].append(end)
+            return start, end
+
+        # repeat: copies obligatoires, puis optionnelles ou boucle
+        _, child, minimum, maximum = node
+        end = start
+        for _ in range(minimum):
+            item_start, item_end = self._build(child)
+            self._epsilon[end].append(item_start)
+            end = item_end
+
+        if maximum is None:
+            item_start, item_end = self._build(child)
+            loop = self._new_state()
+            self._epsilon[end].append(loop)
+            self._epsilon[loop].append(item_start)
+            self._epsilon[item_end].append(loop)
+            return start, loop
+
+        final = self._new_state()
+        for _ in range(maximum - minimum):
+            item_start, item_end = self._build(child)
+            self._epsilon[end].append(item_start)
+            self._epsilon[end].append(final)
+            end = item_end
+        self._epsilon[end].append(final)
+        return start, final
+
+    def _closure(self, states) -> frozenset:
+        stack = list(states)
+        closure = set(states)
+        while stack:
+            for target in self._epsilon[stack.pop()]:
+                if target not in closure:
+                    closure.add(target)
+                    stack.append(target)
+        return frozenset(closure)
+
+    def _dfa_state(self, states: frozenset) -> int:
+        state = self._state_ids.get(states)
+        if state is None:
+            state = len(self._accepting)
+            self._state_ids[states] = state
+            self._state_edges.append([edge for nfa_state in states for edge in self._edges[nfa_state]])
+            self._accepting.append(self._accept in states)
+        return state
+
+    def step(self, state: int, ch: str) -> int:
+        """État suivant après un caractère (DEAD si la sortie devient invalide)"""
+        key = (state, ch)
+        nxt = self._transitions.get(key)
+        if nxt is None:
+            with self._lock:
+                targets = {target for charset, target in self._state_edges[state] if charset.matches(ch)}
+                nxt = self._dfa_state(self._closure(targets)) if targets else self.DEAD
+                self._transitions[key] = nxt
+        return nxt
+
+    def char_classes(self, codes: np.ndarray) -> Tuple[np.ndarray, List[int]]:
+        """
+        Classes d'équivalence des caractères donnés pour cet automate
+
+        Deux caractères acceptés par les mêmes CharSet ont les mêmes transitions
+        depuis tout état.
+
+        Returns:
+            (classe de chaque code, un code représentant par classe)
+        """
+        charsets = list({id(charset): charset for edges in self._edges for charset, _ in edges}.values())
+        if not charsets or not len(codes):
+            return np.zeros(len(codes), dtype=np.int32), [int(codes[0])] if len(codes) else []
+        signatures = np.stack([charset.matches_codes(codes) for charset in charsets], axis=1)
+        _, first, classes = np.unique(signatures, axis=0, return_index=True, return_inverse=True)
+        return classes.reshape(-1).astype(np.int32), [int(codes[i]) for i in first]
+
+    def walk(self, state: int, text: str) -> int:
+        for ch in text:
+            if state == self.DEAD:
+                break
+            state = self.step(state, ch)
+        return state
+
+    def is_accepting(self, state: int) -> bool:
+        return state != self.DEAD and self._accepting[state]
+
+    def fullmatch(self, text: str) -> bool:
+        return self.is_accepting(self.walk(self.start, text))
+
+
+# ============================================================================
+# Vocabulaire
+# ============================================================================
+
+def _bytes_to_unicode() -> Dict[int, str]:
+    """Table octet -> caractère des tokenizers BPE byte-level (GPT-2)"""
+    printable = (
+        list(range(ord("!"), ord("~") + 1))
+        + list(range(ord("¡"), ord("¬") + 1))
+        + list(range(ord("®"), ord("ÿ") + 1))
+    )
+    codes = printable[:]
+    offset = 0
+    for byte in range(256):
+        if byte not in printable:
+            printable.append(byte)
+            codes.append(256 + offset)
+            offset += 1
+    return dict(zip(printable, (chr(code) for code in codes)))
+
+
+def token_strings(tokenizer) -> List[Optional[str]]:
+    """
+    Texte de chaque token du vocabulaire (None pour les tokens spéciaux et les
+    octets isolés d'un caractère multi-octets, jamais autorisés sous contrainte)
+    """
+    hf_tokenizer = getattr(tokenizer, "_tokenizer", tokenizer)
+    vocab = hf_tokenizer.get_vocab()
+    special_ids = set(getattr(hf_tokenizer, "all_special_ids", None) or [])
+    byte_decoder = {char: byte for byte, char in _bytes_to_unicode().items()}
+    byte_level = any("Ġ" in token for token in vocab)
+
+    strings: List[Optional[str]] = [None] * (max(vocab.values()) + 1)
+    for token, token_id in vocab.items():
+        if token_id in special_ids:
+            continue
+
+        if byte_level:
+            try:
+                data = bytes(byte_decoder[char] for char in token)
+            except KeyError:
+                continue
+        else:
+            # SentencePiece: ▁ pour l'espace, <0xNN> pour les octets bruts
+            byte_match = re.fullmatch(r"<0x([0-9A-Fa-f]{2})>", token)
+            data = bytes([int(byte_match.group(1), 16)]) if byte_match else token.replace("▁", " ").encode("utf-8")
+
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            continue
+        if text:
+            strings[token_id] = text
+
+    return strings
+
+
+class TokenIndex:
+    """
+    Vocabulaire en colonnes de caractères, pour avancer tous les tokens en numpy
+
+    Les tokens sont triés par longueur décroissante : columns[p] contient le
+    p-ième caractère des tokens qui en ont plus de p, qui forment un préfixe de
+    token_ids. Les caractères sont numérotés densément (codes[i] = code du
+    caractère i).
+    """
+
+    def __init__(self, tokenizer):
+        strings = token_strings(tokenizer)
+        self.strings = strings
+
+        eos_ids = getattr(tokenizer, "eos_token_ids", None) or [tokenizer.eos_token_id]
+        self.eos_token_ids = sorted(set(eos_ids))
+        self.size = max([len(strings)] + [token + 1 for token in self.eos_token_ids])
+
+        order = sorted((i for i, text in enumerate(strings) if text is not None), key=lambda i: -len(strings[i]))
+        self.token_ids = np.array(order, dtype=np.int64)
+        max_length = len(strings[order[0]]) if order else 0
+        columns: List[np.ndarray] = []
+        for position in range(max_length):
+            column = []
+            for token_id in order:
+                text = strings[token_id]
+                if len(text) <= position:
+                    break
+                column.append(ord(text[position]))
+            columns.append(np.array(column, dtype=np.int32))
+
+        self.codes = np.unique(np.concatenate(columns)) if columns else np.zeros(0, dtype=np.int32)
+        self.columns = [np.searchsorted(self.codes, column).astype(np.int32) for column in columns]
+
+    def allowed(self, transitions: "TransitionTable", state: int) -> np.ndarray:
+        """Tokens dont le texte, lu depuis state, ne sort pas du langage"""
+        states = np.full(len(self.token_ids), state, dtype=np.int32)
+        for column in self.columns:
+            current = states[:len(column)]
+            alive = np.flatnonzero(current != RegexAutomaton.DEAD)
+            if not len(alive):
+                break
+            current[alive] = transitions.step(current[alive], column[alive])
+        return self.token_ids[states != RegexAutomaton.DEAD]
+
+
+class TransitionTable:
+    """Transitions de l'automate par (état, classe de caractère), remplies à la demande"""
+
+    UNKNOWN = -2
+
+    def __init__(self, automaton: RegexAutomaton, index: TokenIndex):
+        self.automaton = automaton
+        # Caractère du vocabulaire -> classe de l'automate
+        self.classes, self.representatives = automaton.char_classes(index.codes)
+        self.table = np.full((16, max(1, len(self.representatives))), self.UNKNOWN, dtype=np.int32)
+
+    def _reserve(self, state: int):
+        if state >= len(self.table):
+            grown = np.full((2 * (state + 1), self.table.shape[1]), self.UNKNOWN, dtype=np.int32)
+            grown[:len(self.table)] = self.table
+            self.table = grown
+
+    def step(self, states: np.ndarray, chars: np.ndarray) -> np.ndarray:
+        """État suivant de chaque (état, caractère du vocabulaire)"""
+        classes = self.classes[chars]
+        self._reserve(int(states.max()))
+
+        width = self.table.shape[1]
+        flat = self.table.reshape(-1)
+        keys = states.astype(np.int64) * width + classes
+        nxt = flat[keys]
+        unknown = nxt == self.UNKNOWN
+        if unknown.any():
+            # Peu de paires distinctes (états x classes) à calculer par l'automate
+            seen = np.zeros(flat.size, dtype=bool)
+            seen[keys[unknown]] = True
+            for key in np.flatnonzero(seen).tolist():
+                state, char_class = divmod(key, width)
+                target = self.automaton.step(state, chr(self.representatives[char_class]))
+                self._reserve(target)
+                self.table[state, char_class] = target
+            nxt = self.table.reshape(-1)[keys]
+        return nxt
+
+
+class MaskCache:
+    """
+    Tokens autorisés par (contrainte, état), en bits compactés
+
+    LRU borné en octets, partagé par toutes les contraintes d'un ConstraintCache.
+    """
+
+    def __init__(self, max_mb: float = DEFAULT_MASK_CACHE_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries: "OrderedDict[Tuple[int, int], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[int, int]) -> Optional[np.ndarray]:
+        with self._lock:
+            packed = self._entries.get(key)
+            if packed is not None:
+                self._entries.move_to_end(key)
+            return packed
+
+    def put(self, key: Tuple[int, int], packed: np.ndarray):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.nbytes
+            self._entries[key] = packed
+            self.bytes += packed.nbytes
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def drop(self, owner: int):
+        """Oublie les entrées d'une contrainte sortie du cache"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == owner]:
+                self.bytes -= self._entries.pop(key).nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ============================================================================
+# Contraintes compilées et masques
+# ============================================================================
+
+class CompiledConstraint:
+    """Automate d'une contrainte ; tokens autorisés par état dans un MaskCache"""
+
+    _ids = itertools.count()
+
+    def __init__(self, kind: str, pattern: str, index: TokenIndex, masks: MaskCache):
+        self.kind = kind
+        self.automaton = RegexAutomaton(pattern)
+        self.index = index
+        self.transitions = TransitionTable(self.automaton, index)
+        self.masks = masks
+        self.uid = next(self._ids)
+        self._lock = threading.Lock()
+        self.mask_builds = 0
+        self.mask_build_ms = 0.0
+
+    def advance(self, state: int, token: int) -> int:
+        """État après un token (inchangé pour EOS / tokens sans texte)"""
+        text = self.index.strings[token] if 0 <= token < len(self.index.strings) else None
+        if text is None:
+            return state
+        return self.automaton.walk(state, text)
+
+    def allowed_bits(self, state: int) -> np.ndarray:
+        """Tokens autorisés dans cet état (bits compactés, index.size bits)"""
+        key = (self.uid, state)
+        packed = self.masks.get(key)
+        if packed is not None:
+            return packed
+
+        with self._lock:
+            packed = self.masks.get(key)
+            if packed is not None:
+                return packed
+
+            start = time.perf_counter()
+            bits = np.zeros(self.index.size, dtype=bool)
+            if state != RegexAutomaton.DEAD:
+                bits[self.index.allowed(self.transitions, state)] = True
+            if self.automaton.is_accepting(state) or not bits.any():
+                bits[self.index.eos_token_ids] = True
+            packed = np.packbits(bits)
+
+            self.masks.put(key, packed)
+            self.mask_builds += 1
+            self.mask_build_ms += (time.perf_counter() - start) * 1000
+            return packed
+
+    def mask(self, state: int, vocab_size: int):
+        """Masque additif (0 autorisé, -inf interdit) pour les logits dans cet état"""
+        bits = np.unpackbits(self.allowed_bits(state), count=self.index.size).astype(bool)
+        if vocab_size <= len(bits):
+            bits = bits[:vocab_size]
+        else:
+            bits = np.concatenate([bits, np.zeros(vocab_size - len(bits), dtype=bool)])
+        return mx.where(mx.array(bits), 0.0, -float("inf")).astype(mx.float32)
+
+    def matches(self, tokens: List[int]) -> bool:
+        """La sortie générée est-elle complète et valide ?"""
+        state = self.automaton.start
+        for token in tokens:
+            state = self.advance(state, token)
+        return self.automaton.is_accepting(state)
+
+
+class ConstrainedDecoder:
+    """
+    Logits processor (mlx-lm) d'une génération contrainte
+
+    Appelé à chaque pas avec les tokens déjà vus et les logits du pas courant :
+    l'état avance avec le dernier token échantillonné, puis le masque en cache
+    de cet état est ajouté aux logits.
+    """
+
+    def __init__(self, constraint: CompiledConstraint, cache_hit: bool):
+        self.constraint = constraint
+        self.cache_hit = cache_hit
+        self.state = constraint.automaton.start
+        self._started = False
+        # Dernier masque construit (l'état se répète, ex: dans une chaîne JSON)
+        self._mask_key: Optional[Tuple[int, int]] = None
+        self._mask = None
+        self.steps = 0
+        self.overhead_ms = 0.0
+
+    def __call__(self, tokens, logits):
+        start = time.perf_counter()
+        if self._started:
+            # Le premier appel suit le prefill: pas encore de token généré
+            last = tokens[-1]
+            self.state = self.constraint.advance(self.state, last.item() if hasattr(last, "item") else last)
+        self._started = True
+
+        key = (self.state, logits.shape[-1])
+        if key != self._mask_key:
+            self._mask = self.constraint.mask(*key)
+            self._mask_key = key
+        logits = logits + self._mask
+        self.steps += 1
+        self.overhead_ms += (time.perf_counter() - start) * 1000
+        return logits
+
+    def report(self, generated: List[int]) -> Dict[str, Any]:
+        """Validité de la sortie et coût de la contrainte"""
+        return {
+            "type": self.constraint.kind,
+            "valid": self.constraint.matches(generated),
+            "compiled_cache_hit": self.cache_hit,
+            "automaton_states": self.constraint.automaton.num_states,
+            "overhead_ms": round(self.overhead_ms, 2),
+            "overhead_per_token_ms": round(self.overhead_ms / self.steps, 3) if self.steps else 0.0
+        }
+
+
+class ConstraintCache:
+    """
+    Contraintes compilées par schéma / regex (LRU), liées au tokenizer du modèle
+    chargé ; à vider au changement de modèle
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_CONSTRAINTS, max_mask_mb: float = DEFAULT_MASK_CACHE_MB):
+        self.max_entries = max_entries
+        self.masks = MaskCache(max_mask_mb)
+        self._entries: "OrderedDict[Tuple[str, str], CompiledConstraint]" = OrderedDict()
+        self._index: Optional[TokenIndex] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decoder(
+        self,
+        tokenizer,
+        json_schema: Any = None,
+        regex: Optional[str] = None
+    ) -> Optional[ConstrainedDecoder]:
+        """
+        Logits processor pour une requête (None sans contrainte)
+
+        Raises:
+            ValueError: Schéma / regex invalide ou non supporté
+        """
+        if json_schema is None and regex is None:
+            return None
+        if json_schema is not None and regex is not None:
+            raise ValueError("Use either json_schema or regex, not both")
+
+        if json_schema is not None:
+            if isinstance(json_schema, str):
+                try:
+                    json_schema = json.loads(json_schema)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid JSON schema: {e}")
+            key = ("json_schema", json.dumps(json_schema, sort_keys=True))
+        else:
+            key = ("regex", regex)
+
+        with self._lock:
+            constraint = self._entries.get(key)
+            if constraint is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return ConstrainedDecoder(constraint, cache_hit=True)
+
+            if self._index is None:
+                self._index = TokenIndex(tokenizer)
+
+            pattern = schema_to_regex(json_schema) if json_schema is not None else regex
+            constraint = CompiledConstraint(key[0], pattern, self._index, self.masks)
+
+            self.misses += 1
+            self._entries[key] = constraint
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.masks.drop(evicted.uid)
+
+        return ConstrainedDecoder(constraint, cache_hit=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index = None
+        self.masks.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            "constraints": len(entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached_masks": len(self.masks),
+            "mask_cache_mb": round(self.masks.bytes / 1024 / 1024, 2),
+            "max_mask_cache_mb": round(self.masks.max_bytes / 1024 / 1024, 2),
+            "mask_evictions": self.masks.evictions,
+            "mask_build_ms": round(sum(c.mask_build_ms for c in entries), 1)
+        }
@@ -22,6 +22,15 @@ import type {
   VisionResponse,
 } from '../backend-types';
 
+// Modèles dont la recette Matryoshka applique layer_norm au vecteur complet avant troncature
+const LAYER_NORM_MODELS = ['nomic-embed-text', 'nomic-embed-text-v1.5'];
+
+/** nomic-embed-text v1.5 (nom Ollama ou Hugging Face, tag ignoré) */
+function usesLayerNorm(model: string): boolean {
+  const name = model.split(':')[0].split('/').pop() ?? '';
+  return LAYER_NORM_MODELS.includes(name.toLowerCase());
+}
+
 export class OllamaExternalBackend extends BaseAIBackend {
   readonly type: BackendType = 'ollama-external';
   readonly capabilities: BackendCapability[] = ['chat', 'embeddings', 'vision'];
@@ -212,10 +221,15 @@ export class OllamaExternalBackend extends BaseAIBackend {
       }
     }
 
+    if (request.dimensions !== undefined && !(Number.isInteger(request.dimensions) && request.dimensions >= 1)) {
+      throw new Error(`dimensions must be a positive integer, got ${request.dimensions}`);
+    }
+    const reduced = embeddings.map((embedding) => this.reduceEmbedding(embedding, request));
+
     return {
-      embeddings: Array.isArray(request.text) ? embeddings : embeddings[0],
+      embeddings: Array.isArray(request.text) ? reduced : reduced[0],
       model: request.model,
-      dimensions: embeddings[0]?.length || 0,
+      dimensions: reduced[0]?.length || 0,
     };
   }
 
@@ -421,6 +435,35 @@ export class OllamaExternalBackend extends BaseAIBackend {
     await this.listModels();
   }
 
+  /**
+   * Troncature Matryoshka (premières composantes, renormalisées L2) puis arrondi float16
+   *
+   * nomic-embed-text v1.5 applique layer_norm au vecteur complet avant de tronquer :
+   * à une échelle près (effacée par la normalisation), retrancher la moyenne.
+   * Valeurs float16 écrites avec 5 chiffres significatifs, comme les embedders Python.
+   */
+  private reduceEmbedding(embedding: number[], request: EmbeddingRequest): number[] {
+    let vector = embedding;
+    if (request.dimensions && request.dimensions < vector.length) {
+      let head = vector.slice(0, request.dimensions);
+      if (usesLayerNorm(request.model)) {
+        const mean = vector.reduce((sum, value) => sum + value, 0) / vector.length;
+        head = head.map((value) => value - mean);
+      }
+      const norm = Math.sqrt(head.reduce((sum, value) => sum + value * value, 0));
+      vector = norm ? head.map((value) => value / norm) : head;
+    }
+    if (request.float16) {
+      // 11 bits de mantisse, exposant minimal -14 (sous-normaux)
+      vector = vector.map((value) => {
+        if (value === 0) return 0;
+        const step = 2 ** (Math.max(Math.floor(Math.log2(Math.abs(value))), -14) - 10);
+        return Number((Math.round(value / step) * step).toPrecision(5));
+      });
+    }
+    return vector;
+  }
+
   private formatSize(bytes: number): string {
     if (bytes < 1024) return `${bytes} B`;
     if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
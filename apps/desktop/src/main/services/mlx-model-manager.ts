@@ -11,6 +11,7 @@ import { spawn, ChildProcess } from 'child_process';
 import { join } from 'path';
 import { EventEmitter } from 'events';
 import { logger } from './log-service';
+import { findPendingRequest } from './backends/mlx/mlx-request-queue';
 
 export interface MLXModel {
   id: string;
@@ -244,6 +245,7 @@ export class MLXModelManager extends EventEmitter {
       const request = {
         command: 'download',
         repo_id: repoId,
+        id: requestId,
       };
 
       const requestLine = JSON.stringify(request) + '\n';
@@ -430,7 +432,8 @@ export class MLXModelManager extends EventEmitter {
         },
       });
 
-      const requestLine = JSON.stringify(request) + '\n';
+      // L'id permet au downloader de répondre dans le désordre
+      const requestLine = JSON.stringify({ ...request, id }) + '\n';
       this.downloaderProcess!.stdin?.write(requestLine);
     });
   }
@@ -462,10 +465,10 @@ export class MLXModelManager extends EventEmitter {
         this.currentDownloadRepoId = undefined;
       }
 
-      // Sinon, résoudre la première requête en attente
-      const entries = Array.from(this.requestQueue.entries());
-      if (entries.length > 0) {
-        const [id, callback] = entries[0];
+      // Sinon, résoudre la requête correspondante (par id, ou la première en attente)
+      const pending = findPendingRequest(this.requestQueue, response.id);
+      if (pending) {
+        const [id, callback] = pending;
         this.requestQueue.delete(id);
 
         if (response.success !== false) {
@@ -0,0 +1,602 @@
+"""
+Async Ollama Embeddings
+Client asyncio pour les embeddings Ollama, même API que OllamaEmbedder
+
+Pour les pipelines d'indexation asyncio: aucune requête bloquante ni pool de
+threads. Les requêtes passent par un petit client HTTP/1.1 sur les streams
+asyncio (connexions keep-alive réutilisées, réponses chunked ou Content-Length),
+et un sémaphore borne le nombre de requêtes en vol.
+
+Comme OllamaEmbedder: lots /api/embed avec repli sur /api/embeddings, cache LRU
+des embeddings, réessais avec backoff et jitter (503/429, erreurs transitoires),
+texte par texte en dernier recours, dimensions / float16. Le checkpoint, le
+cache persistant et le découpage en fenêtres restent propres à OllamaEmbedder.
+"""
+
+import sys
+import ssl
+import json
+import time
+import random
+import asyncio
+from pathlib import Path
+from urllib.parse import urlsplit
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .ollama_embeddings import (
+        DEFAULT_MAX_BATCH_SIZE,
+        DEFAULT_POOL_SIZE,
+        DEFAULT_BUSY_RETRIES,
+        DEFAULT_MAX_RETRIES,
+        BUSY_BACKOFF_SECONDS,
+        MAX_BACKOFF_SECONDS,
+        RETRY_BACKOFF_SECONDS,
+        OllamaTransientError,
+        OllamaBusyError,
+        OllamaModelNotFoundError,
+        BatchEmbeddingResult,
+        BatchEmbeddingError,
+        QueryEmbeddingCache,
+        DEFAULT_CACHE_TTL_SECONDS,
+        l2_normalize,
+        truncate_embedding,
+        to_float16,
+        uses_layer_norm,
+    )
+except ImportError:
+    # Exécuté comme script: ajouter src/python au path
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from text_rag.ollama_embeddings import (
+        DEFAULT_MAX_BATCH_SIZE,
+        DEFAULT_POOL_SIZE,
+        DEFAULT_BUSY_RETRIES,
+        DEFAULT_MAX_RETRIES,
+        BUSY_BACKOFF_SECONDS,
+        MAX_BACKOFF_SECONDS,
+        RETRY_BACKOFF_SECONDS,
+        OllamaTransientError,
+        OllamaBusyError,
+        OllamaModelNotFoundError,
+        BatchEmbeddingResult,
+        BatchEmbeddingError,
+        QueryEmbeddingCache,
+        DEFAULT_CACHE_TTL_SECONDS,
+        l2_normalize,
+        truncate_embedding,
+        to_float16,
+        uses_layer_norm,
+    )
+
+
+# Requêtes d'embedding en vol par défaut (cf. OLLAMA_NUM_PARALLEL côté serveur)
+DEFAULT_ASYNC_CONCURRENCY = 4
+
+
+class AsyncHTTPConnectionPool:
+    """
+    Client HTTP/1.1 minimal sur asyncio, avec connexions keep-alive réutilisées
+
+    Une connexion restée inactive peut avoir été fermée par le serveur : la
+    requête est alors renvoyée une fois sur une connexion neuve.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = DEFAULT_POOL_SIZE):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "localhost"
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.pool_size = max(1, pool_size)
+        self.connections_opened = 0
+        self.requests = 0
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        timeout: float = 30,
+    ) -> Tuple[int, bytes]:
+        """
+        Envoie une requête (corps JSON) et lit la réponse complète
+
+        Returns:
+            Tuple (code HTTP, corps)
+
+        Raises:
+            ConnectionError, asyncio.TimeoutError, OllamaTransientError (réponse illisible)
+        """
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        head = (
+            f"{method} {self.base_path}{path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Accept: application/json\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "\r\n"
+        ).encode("latin-1")
+
+        for attempt in range(2):
+            reused = bool(self._idle)
+            if reused:
+                reader, writer = self._idle.pop()
+            else:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=self.ssl), timeout
+                )
+                self.connections_opened += 1
+
+            try:
+                writer.write(head + body)
+                await writer.drain()
+                status, headers, data = await asyncio.wait_for(self._read_response(reader), timeout)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if reused and attempt == 0:
+                    continue
+                raise ConnectionError(str(e) or "Connection closed by server") from e
+            except BaseException:
+                # Timeout / annulation: réponse en cours de lecture, connexion inutilisable
+                writer.close()
+                raise
+
+            self.requests += 1
+            if headers.get("connection", "").lower() == "close" or len(self._idle) >= self.pool_size:
+                writer.close()
+            else:
+                self._idle.append((reader, writer))
+            return status, data
+
+        raise ConnectionError("Connection closed by server")
+
+    @classmethod
+    async def _read_response(cls, reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str], bytes]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by server")
+        try:
+            return await cls._parse_response(reader, status_line)
+        except (ValueError, IndexError) as e:
+            # Ligne de statut, taille de chunk ou Content-Length illisible (réponse tronquée)
+            raise OllamaTransientError(f"Malformed HTTP response from Ollama: {e}") from e
+
+    @staticmethod
+    async def _parse_response(reader: asyncio.StreamReader, status_line: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        status = int(status_line.split()[1])
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            # Ollama (Go net/http) envoie les grosses réponses en chunked
+            parts = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                parts.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b"".join(parts)
+        elif "content-length" in headers:
+            data = await reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await reader.read()
+            headers["connection"] = "close"
+
+        return status, headers, data
+
+    async def close(self):
+        """Ferme les connexions inactives"""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+class AsyncOllamaEmbedder:
+    """
+    Client asyncio pour Ollama Embeddings API (même API que OllamaEmbedder, en coroutines)
+
+        async with AsyncOllamaEmbedder(concurrency=4) as embedder:
+            embeddings = await embedder.generate_embeddings_batch(chunks)
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        model: str = "nomic-embed-text",
+        timeout: int = 30,
+        verbose: bool = False,
+        cache_size: int = 256,
+        cache_ttl: float = DEFAULT_CACHE_TTL_SECONDS,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+        busy_retries: int = DEFAULT_BUSY_RETRIES,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        dimensions: Optional[int] = None,
+        float16: bool = False,
+    ):
+        """
+        Args:
+            base_url: URL de base Ollama (défaut: http://localhost:11434)
+            model: Nom du modèle d'embedding
+            timeout: Timeout en secondes
+            verbose: Activer les logs détaillés
+            cache_size: Taille du cache LRU des embeddings (0 = désactivé)
+            cache_ttl: Durée de vie des entrées du cache en secondes
+            max_batch_size: Nombre maximum de textes par requête /api/embed
+            pool_size: Nombre de connexions keep-alive gardées ouvertes vers Ollama
+            concurrency: Requêtes en vol au maximum (sémaphore partagé par tous les appels)
+            busy_retries: Réessais d'un lot quand Ollama répond 503/429
+            max_retries: Réessais sur erreur transitoire (timeout, connexion, 5xx)
+            dimensions: Troncature Matryoshka des embeddings retournés (None = complets)
+            float16: Arrondir les valeurs retournées à la précision float16
+        """
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.verbose = verbose
+        self.max_batch_size = max(1, max_batch_size)
+        self.concurrency = max(1, concurrency)
+        self.busy_retries = busy_retries
+        self.max_retries = max_retries
+        if dimensions is not None and dimensions < 1:
+            raise ValueError(f"dimensions must be >= 1, got {dimensions}")
+        self.dimensions = dimensions
+        self.float16 = float16
+        # None = pas encore testé ; False = serveur ancien sans /api/embed
+        self.batch_endpoint_available: Optional[bool] = None
+        self.batch_stats = {"batch_requests": 0, "legacy_requests": 0, "texts": 0}
+
+        self.pool = AsyncHTTPConnectionPool(self.base_url, max(pool_size, self.concurrency))
+        # Créé à la première requête, dans la boucle d'événements de l'appelant
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.cache = None
+        if cache_size > 0:
+            self.cache = QueryEmbeddingCache(max_entries=cache_size, ttl_seconds=cache_ttl)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """Ferme les connexions HTTP"""
+        await self.pool.close()
+
+    async def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Tuple[int, Any]:
+        """Requête JSON bornée par le sémaphore ; erreurs réseau en OllamaTransientError"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        timeout = timeout or self.timeout
+        async with self._semaphore:
+            try:
+                status, body = await self.pool.request(method, path, payload, timeout)
+            except asyncio.TimeoutError:
+                raise OllamaTransientError(f"Ollama request timed out after {timeout}s")
+            except (ValueError, IndexError) as e:
+                raise OllamaTransientError(f"Malformed HTTP response from Ollama: {e}")
+            except OSError:
+                raise OllamaTransientError(
+                    f"Cannot connect to Ollama at {self.base_url}. "
+                    "Make sure Ollama is running."
+                )
+
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            data = body.decode("utf-8", "replace")
+        return status, data
+
+    def _http_error(self, status: int, data: Any) -> Exception:
+        """Exception typée pour une réponse HTTP en erreur d'Ollama"""
+        detail = data.get("error", "") if isinstance(data, dict) else str(data)
+        if status in (429, 503):
+            return OllamaBusyError(f"Ollama is busy (HTTP {status})")
+        if status == 404:
+            return OllamaModelNotFoundError(
+                f"Model '{self.model}' not found. "
+                f"Run: ollama pull {self.model}"
+            )
+        if status >= 500:
+            return OllamaTransientError(f"Ollama HTTP error: {status} {detail}")
+        return Exception(f"Ollama HTTP error: {status} {detail}")
+
+    @staticmethod
+    def _is_model_error(data: Any) -> bool:
+        """Un 404 d'Ollama sur un modèle absent porte une erreur JSON (pas une route inconnue)"""
+        return isinstance(data, dict) and "model" in str(data.get("error", "")).lower()
+
+    def _output(self, embedding: List[float]) -> List[float]:
+        """Embedding tel que retourné: troncature Matryoshka puis float16 si demandés"""
+        if self.dimensions:
+            embedding = truncate_embedding(embedding, self.dimensions, uses_layer_norm(self.model))
+        if self.float16:
+            embedding = to_float16(embedding)
+        return embedding
+
+    async def generate_embedding(self, text: str) -> List[float]:
+        """
+        Génère un embedding pour un texte
+
+        Raises:
+            Exception si erreur
+        """
+        if self.cache is not None:
+            cached = self.cache.get(text, self.model)
+            if cached is not None:
+                return self._output(list(cached))
+
+        embedding = await self._embed_legacy(text)
+        if self.cache is not None:
+            self.cache.put(text, self.model, list(embedding))
+        return self._output(embedding)
+
+    async def _embed_legacy(self, text: str) -> List[float]:
+        """Un texte via /api/embeddings, normalisé (L2) comme les vecteurs de /api/embed"""
+        status, data = await self._request("POST", "/api/embeddings", {"model": self.model, "prompt": text})
+        if status >= 400:
+            raise self._http_error(status, data)
+        if not isinstance(data, dict) or "embedding" not in data:
+            raise ValueError("No embedding in response")
+        self.batch_stats["legacy_requests"] += 1
+        return l2_normalize(data["embedding"])
+
+    async def _embed_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """
+        Embeddings d'un lot de textes en une requête /api/embed
+
+        Returns:
+            Liste d'embeddings, ou None si le serveur ne connaît pas /api/embed
+        """
+        status, data = await self._request("POST", "/api/embed", {"model": self.model, "input": texts})
+
+        if status in (404, 405) and not self._is_model_error(data):
+            # Endpoint inconnu (Ollama < 0.3.4): mémoriser pour les lots suivants
+            if self.verbose:
+                print("[AsyncOllamaEmbedder] /api/embed not available, using legacy /api/embeddings", file=sys.stderr)
+            self.batch_endpoint_available = False
+            return None
+        if status >= 400:
+            raise self._http_error(status, data)
+
+        embeddings = data.get("embeddings") if isinstance(data, dict) else None
+        if not isinstance(embeddings, list) or len(embeddings) != len(texts):
+            raise ValueError(
+                f"Expected {len(texts)} embeddings in response, got "
+                f"{len(embeddings) if isinstance(embeddings, list) else 0}"
+            )
+
+        self.batch_endpoint_available = True
+        self.batch_stats["batch_requests"] += 1
+        return embeddings
+
+    async def _embed_texts(self, chunk: List[str]) -> List[List[float]]:
+        """Embeddings d'un lot: /api/embed, ou un /api/embeddings par texte en repli"""
+        if self.batch_endpoint_available is not False:
+            batch = await self._embed_batch(chunk)
+            if batch is not None:
+                return batch
+
+        # Serveur sans /api/embed: textes envoyés en parallèle (bornés par le sémaphore)
+        return list(await asyncio.gather(*(self._embed_legacy(text) for text in chunk)))
+
+    async def _embed_chunk(self, chunk: List[str], result: BatchEmbeddingResult) -> List[List[float]]:
+        """Un lot, réessayé avec backoff exponentiel et jitter (saturation ou erreur transitoire)"""
+        busy_attempts = 0
+        error_attempts = 0
+
+        while True:
+            try:
+                return await self._embed_texts(chunk)
+            except OllamaBusyError:
+                busy_attempts += 1
+                if busy_attempts > self.busy_retries:
+                    raise
+                delay = BUSY_BACKOFF_SECONDS * 2 ** (busy_attempts - 1)
+            except OllamaTransientError:
+                error_attempts += 1
+                if error_attempts > self.max_retries:
+                    raise
+                delay = RETRY_BACKOFF_SECONDS * 2 ** (error_attempts - 1)
+
+            delay = min(delay, MAX_BACKOFF_SECONDS) * random.uniform(0.5, 1.5)
+            result.retries += 1
+            if self.verbose:
+                print(f"[AsyncOllamaEmbedder] Retrying batch of {len(chunk)} in {delay:.2f}s", file=sys.stderr)
+            await asyncio.sleep(delay)
+
+    async def _embed_chunk_safe(self, indices: List[int], texts: List[str], result: BatchEmbeddingResult) -> Dict[int, Any]:
+        """Embeddings d'un lot, texte par texte en dernier recours (index -> embedding ou exception)"""
+        try:
+            return dict(zip(indices, await self._embed_chunk([texts[i] for i in indices], result)))
+        except OllamaModelNotFoundError as e:
+            return {i: e for i in indices}
+        except Exception as e:
+            if len(indices) == 1:
+                return {indices[0]: e}
+            if self.verbose:
+                print(f"[AsyncOllamaEmbedder] Batch of {len(indices)} failed ({e}), retrying texts one by one", file=sys.stderr)
+
+        outcomes = await asyncio.gather(
+            *(self._embed_chunk([texts[i]], result) for i in indices), return_exceptions=True
+        )
+        return {i: outcome if isinstance(outcome, Exception) else outcome[0] for i, outcome in zip(indices, outcomes)}
+
+    async def embed_batch(self, texts: List[str]) -> BatchEmbeddingResult:
+        """
+        Génère des embeddings pour plusieurs textes, sans tout perdre sur une erreur
+
+        Les textes absents du cache sont découpés en lots de max_batch_size,
+        tous lancés ensemble ; le sémaphore en garde au plus `concurrency` en
+        vol. Les textes en échec sont signalés dans result.failed.
+
+        Returns:
+            BatchEmbeddingResult (embeddings dans l'ordre des textes, index en échec)
+        """
+        result = BatchEmbeddingResult(len(texts))
+        embeddings = result.embeddings
+
+        missing = []
+        for i, text in enumerate(texts):
+            cached = self.cache.get(text, self.model) if self.cache is not None else None
+            if cached is not None:
+                embeddings[i] = list(cached)
+                result.from_cache += 1
+            else:
+                missing.append(i)
+
+        chunks = [missing[start:start + self.max_batch_size] for start in range(0, len(missing), self.max_batch_size)]
+        outcomes = []
+        if chunks and self.batch_endpoint_available is None:
+            # Premier lot seul: fixe /api/embed vs repli avant de lancer les autres
+            outcomes.append(await self._embed_chunk_safe(chunks.pop(0), texts, result))
+        outcomes += await asyncio.gather(*(self._embed_chunk_safe(indices, texts, result) for indices in chunks))
+
+        for outcome in outcomes:
+            for i, value in outcome.items():
+                if isinstance(value, Exception):
+                    result.failed[i] = str(value)
+                    continue
+                embeddings[i] = value
+                if self.cache is not None:
+                    self.cache.put(texts[i], self.model, list(value))
+
+        if self.verbose and result.failed:
+            print(f"[AsyncOllamaEmbedder] {len(result.failed)}/{len(texts)} embeddings failed", file=sys.stderr)
+
+        if self.dimensions or self.float16:
+            result.embeddings = [self._output(e) if e is not None else None for e in embeddings]
+        self.batch_stats["texts"] += len(texts)
+        return result
+
+    async def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Génère des embeddings pour plusieurs textes (voir embed_batch)
+
+        Raises:
+            BatchEmbeddingError si des textes restent en échec
+        """
+        result = await self.embed_batch(texts)
+        if not result.ok:
+            raise BatchEmbeddingError(result)
+        return result.embeddings
+
+    async def check_availability(self) -> Dict[str, Any]:
+        """
+        Vérifie si Ollama est disponible et liste les modèles
+
+        Returns:
+            Dict avec available (bool), models (list), error (str)
+        """
+        try:
+            status, data = await self._request("GET", "/api/tags", timeout=5)
+            if status >= 400:
+                raise self._http_error(status, data)
+
+            models = [m["name"] for m in data.get("models", [])]
+            return {
+                "available": True,
+                "models": models,
+                "currentModel": self.model,
+                "modelAvailable": self.model in models,
+            }
+
+        except Exception as e:
+            return {
+                "available": False,
+                "models": [],
+                "error": str(e),
+            }
+
+    def get_status(self) -> Dict[str, Any]:
+        """Statut de l'embedder (modèle courant, cache, connexions)"""
+        return {
+            "success": True,
+            "model": self.model,
+            "baseUrl": self.base_url,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "batching": {
+                "maxBatchSize": self.max_batch_size,
+                "batchEndpoint": self.batch_endpoint_available,
+                "batchRequests": self.batch_stats["batch_requests"],
+                "legacyRequests": self.batch_stats["legacy_requests"],
+                "texts": self.batch_stats["texts"],
+            },
+            "concurrency": self.concurrency,
+            "connections": {
+                "opened": self.pool.connections_opened,
+                "requests": self.pool.requests,
+                "idle": len(self.pool._idle),
+            },
+        }
+
+
+async def _main_async(args) -> Dict[str, Any]:
+    async with AsyncOllamaEmbedder(
+        base_url=args.url,
+        model=args.model,
+        verbose=args.verbose,
+        concurrency=args.concurrency,
+        max_batch_size=args.max_batch_size,
+    ) as embedder:
+        if args.check:
+            return await embedder.check_availability()
+
+        start = time.perf_counter()
+        result = await embedder.embed_batch(args.texts)
+        done = next((e for e in result.embeddings if e is not None), None)
+        return {
+            **result.to_dict(),
+            "dims": len(done) if done else 0,
+            "elapsedSeconds": round(time.perf_counter() - start, 3),
+            "status": embedder.get_status(),
+        }
+
+
+def main():
+    """
+    Point d'entrée CLI pour tester le client asyncio
+    Usage: python async_ollama_embeddings.py "text 1" "text 2" [--concurrency 4]
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Async Ollama Embeddings Generator")
+    parser.add_argument("texts", nargs="*", help="Texts to embed")
+    parser.add_argument("--model", default="nomic-embed-text", help="Ollama model name")
+    parser.add_argument("--url", default="http://localhost:11434", help="Ollama base URL")
+    parser.add_argument("--check", action="store_true", help="Check Ollama availability")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_ASYNC_CONCURRENCY,
+                        help="Embedding requests in flight")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help="Maximum texts per /api/embed request")
+    parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+    args = parser.parse_args()
+
+    if not args.check and not args.texts:
+        parser.print_help()
+        sys.exit(1)
+
+    result = asyncio.run(_main_async(args))
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result.get("success", result.get("available")) else 1)
+
+
+if __name__ == "__main__":
+    main()
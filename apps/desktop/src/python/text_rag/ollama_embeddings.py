@@ -4,10 +4,262 @@ Wrapper Python pour générer des embeddings textuels via Ollama
 Utilisé pour le TEXT RAG côté Python
 """
 
+import os
 import sys
 import json
+import math
+import time
+import random
+import hashlib
+import struct
+import threading
 import requests
-from typing import List, Dict, Any, Optional
+from array import array
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Union, TextIO, BinaryIO
+
+try:
+    from ..utils.query_cache import QueryEmbeddingCache, DEFAULT_CACHE_TTL_SECONDS
+    from ..utils.embedding_store import EmbeddingStore, DEFAULT_STORE_MAX_MB
+    from ..utils.token_windows import TokenCounter, mean_pool
+except ImportError:
+    # Exécuté comme script: ajouter src/python au path
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from utils.query_cache import QueryEmbeddingCache, DEFAULT_CACHE_TTL_SECONDS
+    from utils.embedding_store import EmbeddingStore, DEFAULT_STORE_MAX_MB
+    from utils.token_windows import TokenCounter, mean_pool
+
+
+# Nombre maximum de textes par requête /api/embed
+DEFAULT_MAX_BATCH_SIZE = 64
+
+# Connexions HTTP gardées ouvertes vers Ollama
+DEFAULT_POOL_SIZE = 10
+
+# Requêtes d'embedding en vol (1 = séquentiel) ; cf. OLLAMA_NUM_PARALLEL côté serveur
+DEFAULT_CONCURRENCY = 1
+
+# Réessais d'un lot quand Ollama est saturé (503/429), délai doublé à chaque fois
+DEFAULT_BUSY_RETRIES = 5
+BUSY_BACKOFF_SECONDS = 0.25
+MAX_BACKOFF_SECONDS = 8.0
+
+# Réessais sur erreur transitoire (timeout, connexion, HTTP 5xx)
+DEFAULT_MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 0.5
+
+# Tokens partagés par deux fenêtres consécutives d'un texte trop long
+DEFAULT_WINDOW_OVERLAP = 32
+
+# Durée de validité des réponses de /api/tags et /api/show (health checks répétés)
+DEFAULT_PROBE_TTL_SECONDS = 10.0
+
+# Après un échec de connexion, les sondes échouent immédiatement pendant ce délai
+DEFAULT_UNREACHABLE_COOLDOWN_SECONDS = 5.0
+
+
+class OllamaTransientError(Exception):
+    """Erreur passagère (timeout, connexion, HTTP 5xx) : la requête peut être réessayée"""
+
+
+class OllamaBusyError(OllamaTransientError):
+    """Ollama saturé (HTTP 503/429) : la requête peut être réessayée plus tard"""
+
+
+class OllamaUnreachableError(OllamaTransientError):
+    """Serveur injoignable au dernier sondage ; retry_after = secondes avant de réessayer"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class OllamaModelNotFoundError(Exception):
+    """Modèle absent côté Ollama : inutile de réessayer"""
+
+
+class BatchEmbeddingResult:
+    """
+    Résultat d'un traitement par lots, même partiel
+
+    embeddings[i] vaut None pour les textes en échec ; failed associe leur
+    index au dernier message d'erreur. Pour les textes découpés en fenêtres
+    (max_tokens), embeddings[i] est la moyenne des fenêtres et windows[i] donne
+    chaque fenêtre (start, end, tokens, embedding).
+    """
+
+    def __init__(self, num_texts: int):
+        self.embeddings: List[Optional[List[float]]] = [None] * num_texts
+        self.failed: Dict[int, str] = {}
+        self.from_cache = 0
+        self.from_store = 0
+        self.from_checkpoint = 0
+        self.retries = 0
+        self.windows: Dict[int, List[Dict[str, Any]]] = {}
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    @property
+    def failed_indices(self) -> List[int]:
+        return sorted(self.failed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "success": self.ok,
+            "embeddings": self.embeddings,
+            "count": len(self.embeddings),
+            "completed": len(self.embeddings) - len(self.failed),
+            "failedIndices": self.failed_indices,
+            "errors": {str(i): error for i, error in sorted(self.failed.items())},
+            "fromCache": self.from_cache,
+            "fromStore": self.from_store,
+            "fromCheckpoint": self.from_checkpoint,
+            "retries": self.retries,
+            "windows": {str(i): windows for i, windows in sorted(self.windows.items())},
+        }
+
+
+class BatchEmbeddingError(Exception):
+    """Échec d'une partie du lot ; result garde les embeddings déjà calculés"""
+
+    def __init__(self, result: BatchEmbeddingResult):
+        first = result.failed_indices[0]
+        super().__init__(
+            f"{len(result.failed)}/{len(result.embeddings)} embeddings failed "
+            f"(first: text {first}: {result.failed[first]})"
+        )
+        self.result = result
+
+
+class BatchCheckpoint:
+    """
+    Fichier JSONL des embeddings déjà calculés d'un lot, pour reprendre après échec
+
+    Première ligne: modèle et nombre de textes ; ensuite une ligne par texte
+    terminé (index, hash du texte, embedding), ajoutée dès la fin de son lot. À
+    la reprise, une entrée n'est réutilisée que si le hash du texte correspond.
+    """
+
+    def __init__(self, path: str, model: str, texts: List[str]):
+        self.path = Path(path)
+        self.model = model
+        self.texts = texts
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+    def load(self) -> Dict[int, List[float]]:
+        """Embeddings réutilisables ; réinitialise le fichier s'il est d'un autre lot"""
+        done: Dict[int, List[float]] = {}
+        header = {"model": self.model, "count": len(self.texts)}
+
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                try:
+                    first = json.loads(f.readline() or "{}")
+                except ValueError:
+                    first = {}
+                if first.get("model") == self.model:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # Dernière ligne tronquée par une interruption
+                            continue
+                        i = entry.get("i")
+                        if isinstance(i, int) and 0 <= i < len(self.texts) \
+                                and entry.get("h") == self.text_hash(self.texts[i]):
+                            done[i] = entry["e"]
+                    return done
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+        return done
+
+    def append(self, items: List[tuple]):
+        """Enregistre des (index, embedding) terminés"""
+        lines = "".join(
+            json.dumps({"i": i, "h": self.text_hash(self.texts[i]), "e": embedding}) + "\n"
+            for i, embedding in items
+        )
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class AdaptiveConcurrency:
+    """
+    Limite de requêtes en vol vers Ollama, ajustée selon ses réponses (AIMD)
+
+    La limite est divisée par deux quand Ollama répond 503/429 ou quand le temps
+    par texte dépasse slow_factor fois la moyenne observée ; elle remonte d'une
+    unité après `limite` succès consécutifs, jusqu'à max_concurrency.
+    """
+
+    def __init__(self, max_concurrency: int, slow_factor: float = 2.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.slow_factor = slow_factor
+        self.in_flight = 0
+        self.decreases = 0
+        self.busy_responses = 0
+        self._baseline: Optional[float] = None
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, seconds: float, num_texts: int):
+        per_text = seconds / max(num_texts, 1)
+        with self._cond:
+            if self._baseline is not None and per_text > self._baseline * self.slow_factor:
+                self._decrease()
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+                    self._cond.notify_all()
+            # Moyenne glissante du temps par texte
+            self._baseline = per_text if self._baseline is None else 0.8 * self._baseline + 0.2 * per_text
+
+    def on_busy(self):
+        with self._cond:
+            self.busy_responses += 1
+            self._decrease()
+
+    def _decrease(self):
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+        self.decreases += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "maxConcurrency": self.max_concurrency,
+                "finalLimit": self.limit,
+                "decreases": self.decreases,
+                "busyResponses": self.busy_responses,
+            }
 
 
 class OllamaEmbedder:
@@ -26,6 +278,23 @@ class OllamaEmbedder:
         model: str = "nomic-embed-text",
         timeout: int = 30,
         verbose: bool = False,
+        cache_size: int = 256,
+        cache_ttl: float = DEFAULT_CACHE_TTL_SECONDS,
+        cache_path: Optional[str] = None,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        busy_retries: int = DEFAULT_BUSY_RETRIES,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        store_path: Optional[str] = None,
+        store_max_mb: float = DEFAULT_STORE_MAX_MB,
+        max_tokens: Optional[int] = None,
+        window_overlap: int = DEFAULT_WINDOW_OVERLAP,
+        tokenizer: Optional[str] = None,
+        dimensions: Optional[int] = None,
+        float16: bool = False,
+        probe_ttl: float = DEFAULT_PROBE_TTL_SECONDS,
+        unreachable_cooldown: float = DEFAULT_UNREACHABLE_COOLDOWN_SECONDS,
     ):
         """
         Args:
@@ -33,11 +302,85 @@ class OllamaEmbedder:
             model: Nom du modèle d'embedding
             timeout: Timeout en secondes
             verbose: Activer les logs détaillés
+            cache_size: Taille du cache LRU des embeddings (0 = désactivé)
+            cache_ttl: Durée de vie des entrées du cache en secondes
+            cache_path: Fichier de persistance du cache (None = mémoire uniquement)
+            max_batch_size: Nombre maximum de textes par requête /api/embed
+            pool_size: Nombre de connexions keep-alive gardées ouvertes vers Ollama
+            concurrency: Requêtes d'embedding en parallèle dans les traitements par lots
+            busy_retries: Réessais d'un lot quand Ollama répond 503/429
+            max_retries: Réessais sur erreur transitoire (timeout, connexion, 5xx),
+                pour le lot puis pour chacun de ses textes
+            store_path: Cache persistant SQLite indexé par contenu (None = désactivé)
+            store_max_mb: Taille maximale du cache persistant avant éviction
+            max_tokens: Tokens maximum par requête ; les textes plus longs sont
+                découpés en fenêtres (None = textes envoyés tels quels)
+            window_overlap: Tokens partagés par deux fenêtres consécutives
+            tokenizer: Tokenizer Hugging Face du modèle pour compter les tokens
+                (None = estimation rapide, voir utils/token_windows.py)
+            dimensions: Troncature Matryoshka des embeddings retournés, renormalisés
+                (ex: 256 ou 512 pour nomic-embed-text / mxbai-embed-large ; None = complets)
+            float16: Arrondir les valeurs retournées à la précision float16
+            probe_ttl: Secondes pendant lesquelles check_availability / get_model_info
+                réutilisent la dernière réponse (0 = pas de cache)
+            unreachable_cooldown: Secondes pendant lesquelles un serveur injoignable
+                fait échouer les sondes sans requête (0 = désactivé)
         """
         self.base_url = base_url.rstrip("/")
         self.model = model
         self.timeout = timeout
         self.verbose = verbose
+        self.max_batch_size = max(1, max_batch_size)
+        # None = pas encore testé ; False = serveur ancien sans /api/embed
+        self.batch_endpoint_available: Optional[bool] = None
+        self.batch_stats = {"batch_requests": 0, "legacy_requests": 0, "texts": 0}
+        self._stats_lock = threading.Lock()
+
+        # Réponses de /api/tags et /api/show: clé -> (instant, valeur)
+        self.probe_ttl = probe_ttl
+        self.unreachable_cooldown = unreachable_cooldown
+        self._probe_cache: Dict[str, Tuple[float, Any]] = {}
+        self._probe_lock = threading.Lock()
+        self._unreachable_until = 0.0
+        self._unreachable_error = ""
+        self.probe_stats = {"hits": 0, "misses": 0, "fast_fails": 0}
+
+        # Parallélisme des lots, ajusté à chaque traitement (AdaptiveConcurrency)
+        self.concurrency = max(1, concurrency)
+        self.busy_retries = busy_retries
+        self.max_retries = max_retries
+        self.last_concurrency: Optional[Dict[str, Any]] = None
+
+        # Session partagée: connexions TCP réutilisées (keep-alive) entre appels
+        self.pool_size = max(1, pool_size, self.concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.cache = None
+        if cache_size > 0:
+            self.cache = QueryEmbeddingCache(
+                max_entries=cache_size,
+                ttl_seconds=cache_ttl,
+                persist_path=cache_path,
+            )
+
+        # Cache persistant (sha256(texte), modèle, digest): survit aux ré-indexations
+        self.store = EmbeddingStore(store_path, store_max_mb) if store_path else None
+        self._model_digest: Optional[str] = None
+
+        if dimensions is not None and dimensions < 1:
+            raise ValueError(f"dimensions must be >= 1, got {dimensions}")
+
+        # Découpage des textes trop longs en fenêtres de max_tokens
+        self.max_tokens = max_tokens
+        self.window_overlap = max(0, min(window_overlap, (max_tokens or 1) - 1))
+        self.token_counter = TokenCounter(tokenizer) if max_tokens else None
+
+        # Réduction des embeddings retournés ; caches et checkpoint gardent les
+        # vecteurs complets (changer de dimensions ne les invalide pas)
+        self.dimensions = dimensions
+        self.float16 = float16
 
     def generate_embedding(self, text: str) -> List[float]:
         """
@@ -52,6 +395,48 @@ class OllamaEmbedder:
         Raises:
             Exception si erreur
         """
+        if self.token_counter is not None and self.token_counter.count(text) > self.max_tokens:
+            # Trop long: moyenne des embeddings de ses fenêtres
+            return self.generate_embeddings_batch([text])[0]
+
+        return self._output(self._embed_one(text))
+
+    def _embed_one(self, text: str) -> List[float]:
+        """
+        Embedding complet d'un texte (caches consultés puis alimentés)
+
+        Les caches gardent toujours le vecteur complet ; la réduction (dimensions,
+        float16) est appliquée par les appelants publics.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(text, self.model)
+            if cached is not None:
+                if self.verbose:
+                    print(f"[OllamaEmbedder] Cache hit ({len(cached)} dims)", file=sys.stderr)
+                return list(cached)
+
+        if self.store is not None:
+            stored = self.store.get_many([text], self.model, self.model_digest())[0]
+            if stored is not None:
+                if self.cache is not None:
+                    self.cache.put(text, self.model, stored)
+                return stored
+
+        embedding = self._embed_legacy(text)
+        if self.cache is not None:
+            self.cache.put(text, self.model, list(embedding))
+        if self.store is not None:
+            self.store.put_many([text], [embedding], self.model, self.model_digest())
+        return embedding
+
+    def _embed_legacy(self, text: str) -> List[float]:
+        """
+        Un texte via /api/embeddings, sans cache
+
+        /api/embeddings retourne des vecteurs bruts et /api/embed des vecteurs
+        normalisés (L2) : on normalise pour que les caches, partagés par les deux
+        chemins, gardent des vecteurs de même norme.
+        """
         try:
             url = f"{self.base_url}/api/embeddings"
 
@@ -63,7 +448,7 @@ class OllamaEmbedder:
             if self.verbose:
                 print(f"[OllamaEmbedder] Generating embedding for text ({len(text)} chars)...", file=sys.stderr)
 
-            response = requests.post(
+            response = self.session.post(
                 url,
                 json=payload,
                 timeout=self.timeout,
@@ -76,68 +461,522 @@ class OllamaEmbedder:
             if "embedding" not in data:
                 raise ValueError("No embedding in response")
 
-            embedding = data["embedding"]
+            embedding = l2_normalize(data["embedding"])
 
             if self.verbose:
                 print(f"[OllamaEmbedder] Generated embedding: {len(embedding)} dims", file=sys.stderr)
 
+            self._count("legacy_requests")
             return embedding
 
         except requests.exceptions.ConnectionError:
-            raise Exception(
+            self.invalidate_probes()
+            raise OllamaTransientError(
                 f"Cannot connect to Ollama at {self.base_url}. "
                 "Make sure Ollama is running."
             )
         except requests.exceptions.Timeout:
-            raise Exception(f"Ollama request timed out after {self.timeout}s")
+            raise OllamaTransientError(f"Ollama request timed out after {self.timeout}s")
         except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 404:
-                raise Exception(
-                    f"Model '{self.model}' not found. "
-                    f"Run: ollama pull {self.model}"
-                )
-            raise Exception(f"Ollama HTTP error: {e}")
+            raise self._http_error(e)
         except Exception as e:
             if self.verbose:
                 import traceback
                 traceback.print_exc(file=sys.stderr)
             raise
 
-    def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+    def generate_embeddings_batch(self, texts: List[str], checkpoint_path: Optional[str] = None) -> List[List[float]]:
+        """
+        Génère des embeddings pour plusieurs textes (voir embed_batch)
+
+        Args:
+            texts: Liste de textes
+            checkpoint_path: Fichier de reprise (voir embed_batch)
+
+        Returns:
+            Liste d'embeddings (dans l'ordre des textes)
+
+        Raises:
+            BatchEmbeddingError si des textes restent en échec (result garde
+            les embeddings calculés)
         """
-        Génère des embeddings pour plusieurs textes
+        result = self.embed_batch(texts, checkpoint_path)
+        if not result.ok:
+            raise BatchEmbeddingError(result)
+        return result.embeddings
+
+    def embed_batch(self, texts: List[str], checkpoint_path: Optional[str] = None) -> BatchEmbeddingResult:
+        """
+        Génère des embeddings pour plusieurs textes, sans tout perdre sur une erreur
+
+        Les textes absents du cache sont envoyés par lots de max_batch_size à
+        /api/embed (une requête HTTP par lot). Sur un serveur Ollama trop ancien
+        pour cet endpoint, on retombe sur /api/embeddings, un texte par requête.
+
+        Avec concurrency > 1, jusqu'à `concurrency` lots sont en vol en même
+        temps ; la limite baisse quand Ollama sature (503/429, réponses plus
+        lentes) et remonte ensuite. Les résultats restent dans l'ordre des textes.
+
+        Un lot en erreur transitoire est réessayé (backoff exponentiel avec
+        jitter) ; s'il échoue encore, chaque texte est réessayé seul, et ceux qui
+        échouent toujours sont signalés dans result.failed sans invalider le reste.
+
+        Avec checkpoint_path, chaque lot terminé est ajouté au fichier : relancé
+        avec le même fichier, le traitement ne recalcule que les textes manquants.
+
+        Avec le cache persistant (store_path), les textes restants y sont cherchés
+        en une passe avant tout appel réseau ; seuls les absents sont envoyés à
+        Ollama, puis enregistrés lot par lot.
+
+        Avec max_tokens, un texte plus long est découpé en fenêtres chevauchantes
+        embeddées comme des textes ordinaires ; son embedding est leur moyenne
+        pondérée par le nombre de tokens (normalisée), et result.windows[i]
+        garde chaque fenêtre avec sa position dans le texte.
+
+        Avec dimensions / float16, les embeddings retournés (fenêtres comprises)
+        sont tronqués et renormalisés, puis arrondis, après le calcul.
+
+        Les embeddings sont normalisés (L2), quel que soit l'endpoint utilisé.
 
         Args:
             texts: Liste de textes
+            checkpoint_path: Fichier JSONL de reprise (None = pas de reprise)
 
         Returns:
-            Liste d'embeddings
+            BatchEmbeddingResult (embeddings dans l'ordre des textes, index en échec)
         """
-        embeddings = []
+        result = self._embed_windowed(texts, checkpoint_path)
+        if self.dimensions or self.float16:
+            result.embeddings = [self._output(e) if e is not None else None for e in result.embeddings]
+            for windows in result.windows.values():
+                for window in windows:
+                    window["embedding"] = self._output(window["embedding"])
+        return result
+
+    def _embed_windowed(self, texts: List[str], checkpoint_path: Optional[str] = None) -> BatchEmbeddingResult:
+        """embed_batch avant réduction: textes trop longs découpés en fenêtres"""
+        if self.token_counter is None:
+            return self._embed_all(texts, checkpoint_path)
+
+        windows = [self.token_counter.windows(text, self.max_tokens, self.window_overlap) for text in texts]
+        if all(len(w) == 1 for w in windows):
+            return self._embed_all(texts, checkpoint_path)
+
+        # Une entrée par fenêtre, puis regroupement par texte d'origine
+        pieces = [text[start:end] for text, text_windows in zip(texts, windows) for (start, end), _ in text_windows]
+        inner = self._embed_all(pieces, checkpoint_path)
+
+        result = BatchEmbeddingResult(len(texts))
+        result.from_cache = inner.from_cache
+        result.from_store = inner.from_store
+        result.from_checkpoint = inner.from_checkpoint
+        result.retries = inner.retries
+
+        offset = 0
+        for i, text_windows in enumerate(windows):
+            positions = range(offset, offset + len(text_windows))
+            offset += len(text_windows)
 
+            errors = [inner.failed[p] for p in positions if p in inner.failed]
+            if errors:
+                result.failed[i] = errors[0]
+                continue
+
+            vectors = [inner.embeddings[p] for p in positions]
+            if len(text_windows) == 1:
+                result.embeddings[i] = vectors[0]
+                continue
+
+            result.embeddings[i] = mean_pool(vectors, [tokens for _, tokens in text_windows])
+            result.windows[i] = [
+                {"start": start, "end": end, "tokens": tokens, "embedding": vector}
+                for ((start, end), tokens), vector in zip(text_windows, vectors)
+            ]
+
+        if self.verbose:
+            print(f"[OllamaEmbedder] {len(result.windows)} long texts split into {len(pieces) - len(texts) + len(result.windows)} windows", file=sys.stderr)
+        return result
+
+    def _embed_all(self, texts: List[str], checkpoint_path: Optional[str] = None) -> BatchEmbeddingResult:
+        """embed_batch sans découpage en fenêtres (chaque texte envoyé tel quel)"""
+        result = BatchEmbeddingResult(len(texts))
+        embeddings = result.embeddings
+
+        checkpoint = None
+        if checkpoint_path:
+            checkpoint = BatchCheckpoint(checkpoint_path, self.model, texts)
+            for i, embedding in checkpoint.load().items():
+                embeddings[i] = embedding
+            result.from_checkpoint = sum(1 for e in embeddings if e is not None)
+            if self.verbose and result.from_checkpoint:
+                print(f"[OllamaEmbedder] Resuming: {result.from_checkpoint}/{len(texts)} from checkpoint", file=sys.stderr)
+
+        missing = []
         for i, text in enumerate(texts):
+            if embeddings[i] is not None:
+                continue
+            cached = self.cache.get(text, self.model) if self.cache is not None else None
+            if cached is not None:
+                embeddings[i] = list(cached)
+                result.from_cache += 1
+            else:
+                missing.append(i)
+
+        if self.verbose and result.from_cache:
+            print(f"[OllamaEmbedder] {result.from_cache}/{len(texts)} embeddings from cache", file=sys.stderr)
+
+        digest = ""
+        if self.store is not None and missing:
+            digest = self.model_digest()
+            stored = self.store.get_many([texts[i] for i in missing], self.model, digest)
+            still_missing = []
+            for i, embedding in zip(missing, stored):
+                if embedding is not None:
+                    embeddings[i] = embedding
+                    result.from_store += 1
+                else:
+                    still_missing.append(i)
+            missing = still_missing
+            if self.verbose and result.from_store:
+                print(f"[OllamaEmbedder] {result.from_store}/{len(texts)} embeddings from store", file=sys.stderr)
+
+        chunks = [missing[start:start + self.max_batch_size] for start in range(0, len(missing), self.max_batch_size)]
+        limiter = AdaptiveConcurrency(self.concurrency)
+
+        def store(indices: List[int], outcome: Dict[int, Any]):
+            done = []
+            for i in indices:
+                value = outcome[i]
+                if isinstance(value, Exception):
+                    result.failed[i] = str(value)
+                else:
+                    embeddings[i] = value
+                    done.append((i, value))
+            if checkpoint is not None and done:
+                checkpoint.append(done)
+            if self.store is not None and done:
+                self.store.put_many([texts[i] for i, _ in done], [e for _, e in done], self.model, digest)
+
+        if self.concurrency == 1 or len(chunks) <= 1:
+            for indices in chunks:
+                store(indices, self._embed_chunk_safe(indices, texts, limiter, result))
+        else:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = {
+                    pool.submit(self._embed_chunk_safe, indices, texts, limiter, result): indices
+                    for indices in chunks
+                }
+                for future in as_completed(futures):
+                    store(futures[future], future.result())
+
+        if self.verbose and result.failed:
+            print(f"[OllamaEmbedder] {len(result.failed)}/{len(texts)} embeddings failed", file=sys.stderr)
+
+        self.last_concurrency = limiter.stats()
+        self._count("texts", len(texts))
+        return result
+
+    def _embed_chunk_safe(
+        self,
+        indices: List[int],
+        texts: List[str],
+        limiter: AdaptiveConcurrency,
+        result: BatchEmbeddingResult,
+    ) -> Dict[int, Any]:
+        """
+        Embeddings d'un lot, texte par texte en dernier recours
+
+        Returns:
+            Dict index -> embedding, ou l'exception du texte en échec
+        """
+        chunk = [texts[i] for i in indices]
+        try:
+            return dict(zip(indices, self._embed_chunk(chunk, limiter, result)))
+        except OllamaModelNotFoundError as e:
+            return {i: e for i in indices}
+        except Exception as e:
+            if len(indices) == 1:
+                return {indices[0]: e}
+            if self.verbose:
+                print(f"[OllamaEmbedder] Batch of {len(indices)} failed ({e}), retrying texts one by one", file=sys.stderr)
+
+        # Isoler les textes fautifs sans perdre les autres
+        outcome: Dict[int, Any] = {}
+        for i in indices:
+            try:
+                outcome[i] = self._embed_chunk([texts[i]], limiter, result)[0]
+            except Exception as e:
+                outcome[i] = e
+        return outcome
+
+    def _embed_chunk(
+        self,
+        chunk: List[str],
+        limiter: AdaptiveConcurrency,
+        result: Optional[BatchEmbeddingResult] = None,
+    ) -> List[List[float]]:
+        """
+        Un lot de textes, réessayé avec backoff exponentiel et jitter: tant
+        qu'Ollama est saturé (busy_retries), ou sur erreur transitoire (max_retries)
+        """
+        busy_attempts = 0
+        error_attempts = 0
+
+        while True:
+            limiter.acquire()
+            start = time.perf_counter()
+            try:
+                batch = self._embed_texts(chunk)
+            except OllamaBusyError:
+                limiter.on_busy()
+                busy_attempts += 1
+                if busy_attempts > self.busy_retries:
+                    raise
+                delay = BUSY_BACKOFF_SECONDS * 2 ** (busy_attempts - 1)
+            except OllamaTransientError:
+                error_attempts += 1
+                if error_attempts > self.max_retries:
+                    raise
+                delay = RETRY_BACKOFF_SECONDS * 2 ** (error_attempts - 1)
+            else:
+                limiter.on_success(time.perf_counter() - start, len(chunk))
+                return batch
+            finally:
+                limiter.release()
+
+            # Jitter: évite que les lots en échec réessaient tous au même instant
+            delay = min(delay, MAX_BACKOFF_SECONDS) * random.uniform(0.5, 1.5)
+            if result is not None:
+                with self._stats_lock:
+                    result.retries += 1
+            if self.verbose:
+                print(f"[OllamaEmbedder] Retrying batch of {len(chunk)} in {delay:.2f}s (limit {limiter.limit})", file=sys.stderr)
+            time.sleep(delay)
+
+    def _embed_texts(self, chunk: List[str]) -> List[List[float]]:
+        """Embeddings d'un lot: /api/embed, ou un /api/embeddings par texte en repli"""
+        batch = None
+        if self.batch_endpoint_available is not False:
             if self.verbose:
-                print(f"[OllamaEmbedder] Processing {i + 1}/{len(texts)}...", file=sys.stderr)
+                print(f"[OllamaEmbedder] Embedding batch of {len(chunk)}...", file=sys.stderr)
+            batch = self._embed_batch(chunk)
+
+        if batch is None:
+            # Serveur sans /api/embed: un texte par requête
+            batch = [self._embed_legacy(text) for text in chunk]
 
-            embedding = self.generate_embedding(text)
-            embeddings.append(embedding)
+        # Le store est alimenté par _embed_all (avec le checkpoint)
+        if self.cache is not None:
+            for text, embedding in zip(chunk, batch):
+                self.cache.put(text, self.model, list(embedding))
+        return batch
 
-        return embeddings
+    def _output(self, embedding: List[float]) -> List[float]:
+        """Embedding tel que retourné: troncature Matryoshka puis float16 si demandés"""
+        if self.dimensions:
+            embedding = truncate_embedding(embedding, self.dimensions, uses_layer_norm(self.model))
+        if self.float16:
+            embedding = to_float16(embedding)
+        return embedding
 
-    def check_availability(self) -> Dict[str, Any]:
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.batch_stats[key] += amount
+
+    def _embed_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
         """
-        Vérifie si Ollama est disponible et liste les modèles
+        Embeddings d'un lot de textes en une requête /api/embed
 
         Returns:
-            Dict avec available (bool), models (list), error (str)
+            Liste d'embeddings, ou None si le serveur ne connaît pas /api/embed
+
+        Raises:
+            Exception si erreur
         """
         try:
-            url = f"{self.base_url}/api/tags"
+            url = f"{self.base_url}/api/embed"
+
+            payload = {
+                "model": self.model,
+                "input": texts,
+            }
+
+            response = self.session.post(
+                url,
+                json=payload,
+                timeout=self.timeout,
+            )
+
+            if response.status_code in (404, 405) and not self._is_model_error(response):
+                # Endpoint inconnu (Ollama < 0.3.4): mémoriser pour les lots suivants
+                if self.verbose:
+                    print("[OllamaEmbedder] /api/embed not available, using legacy /api/embeddings", file=sys.stderr)
+                self.batch_endpoint_available = False
+                return None
 
-            response = requests.get(url, timeout=5)
             response.raise_for_status()
 
             data = response.json()
+
+            embeddings = data.get("embeddings")
+            if not isinstance(embeddings, list) or len(embeddings) != len(texts):
+                raise ValueError(
+                    f"Expected {len(texts)} embeddings in response, got "
+                    f"{len(embeddings) if isinstance(embeddings, list) else 0}"
+                )
+
+            self.batch_endpoint_available = True
+            self._count("batch_requests")
+            return embeddings
+
+        except requests.exceptions.ConnectionError:
+            self.invalidate_probes()
+            raise OllamaTransientError(
+                f"Cannot connect to Ollama at {self.base_url}. "
+                "Make sure Ollama is running."
+            )
+        except requests.exceptions.Timeout:
+            raise OllamaTransientError(f"Ollama request timed out after {self.timeout}s")
+        except requests.exceptions.HTTPError as e:
+            raise self._http_error(e)
+
+    def _http_error(self, e: requests.exceptions.HTTPError) -> Exception:
+        """Exception typée pour une réponse HTTP en erreur d'Ollama"""
+        status = e.response.status_code
+        if status not in (429, 503):
+            # Modèle supprimé, serveur en erreur...: les sondes en cache ne sont plus fiables
+            self.invalidate_probes()
+        if status in (429, 503):
+            return OllamaBusyError(f"Ollama is busy (HTTP {status})")
+        if status == 404:
+            return OllamaModelNotFoundError(
+                f"Model '{self.model}' not found. "
+                f"Run: ollama pull {self.model}"
+            )
+        if status >= 500:
+            return OllamaTransientError(f"Ollama HTTP error: {e}")
+        return Exception(f"Ollama HTTP error: {e}")
+
+    @staticmethod
+    def _is_model_error(response) -> bool:
+        """Un 404 d'Ollama sur un modèle absent porte une erreur JSON (pas une route inconnue)"""
+        try:
+            error = response.json().get("error", "")
+        except ValueError:
+            return False
+        return "model" in str(error).lower()
+
+    def close(self):
+        """Ferme les connexions HTTP de la session (et le cache persistant)"""
+        self.session.close()
+        if self.store is not None:
+            self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def model_digest(self) -> str:
+        """
+        Digest du modèle courant selon /api/tags (mis en cache)
+
+        Sert de clé au cache persistant : un nouveau pull du même nom invalide
+        les embeddings stockés. Chaîne vide si Ollama ne le fournit pas.
+        """
+        if self._model_digest is not None:
+            return self._model_digest
+
+        try:
+            names = {self.model, f"{self.model}:latest"}
+            self._model_digest = next(
+                (m.get("digest", "") for m in self._probe("tags", self._fetch_tags).get("models", []) if m.get("name") in names),
+                "",
+            )
+        except Exception as e:
+            # Pas de mise en cache: on réessaiera au prochain appel
+            if self.verbose:
+                print(f"[OllamaEmbedder] Could not get model digest: {e}", file=sys.stderr)
+            return ""
+
+        return self._model_digest
+
+    def _probe(self, key: str, fetch, force: bool = False) -> Any:
+        """
+        Réponse d'une sonde (/api/tags, /api/show), gardée probe_ttl secondes
+
+        Une erreur retire l'entrée du cache ; un échec de connexion ou un
+        timeout marque le serveur injoignable pendant unreachable_cooldown
+        secondes, durant lesquelles les sondes échouent sans requête.
+
+        Raises:
+            OllamaUnreachableError pendant le cooldown, sinon l'erreur de fetch
+        """
+        now = time.monotonic()
+        with self._probe_lock:
+            cached = self._probe_cache.get(key)
+            if not force and cached is not None and now - cached[0] < self.probe_ttl:
+                self.probe_stats["hits"] += 1
+                return cached[1]
+            if not force and now < self._unreachable_until:
+                self.probe_stats["fast_fails"] += 1
+                retry_after = self._unreachable_until - now
+                raise OllamaUnreachableError(
+                    f"Ollama unreachable at {self.base_url} (retry in {retry_after:.1f}s): {self._unreachable_error}",
+                    retry_after,
+                )
+            self.probe_stats["misses"] += 1
+
+        try:
+            value = fetch()
+        except Exception as e:
+            with self._probe_lock:
+                self._probe_cache.pop(key, None)
+                if self.unreachable_cooldown > 0 and isinstance(
+                    e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+                ):
+                    self._unreachable_until = time.monotonic() + self.unreachable_cooldown
+                    self._unreachable_error = str(e)
+            raise
+
+        with self._probe_lock:
+            self._unreachable_until = 0.0
+            if self.probe_ttl > 0:
+                self._probe_cache[key] = (time.monotonic(), value)
+        return value
+
+    def invalidate_probes(self):
+        """Oublie les réponses de /api/tags et /api/show en cache"""
+        with self._probe_lock:
+            self._probe_cache.clear()
+
+    def _fetch_tags(self) -> Dict[str, Any]:
+        response = self.session.get(f"{self.base_url}/api/tags", timeout=5)
+        response.raise_for_status()
+        return response.json()
+
+    def _fetch_model_info(self) -> Dict[str, Any]:
+        response = self.session.post(f"{self.base_url}/api/show", json={"name": self.model}, timeout=5)
+        response.raise_for_status()
+        return response.json()
+
+    def check_availability(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Vérifie si Ollama est disponible et liste les modèles
+
+        La réponse est réutilisée pendant probe_ttl secondes ; après un échec de
+        connexion, les appels échouent immédiatement pendant unreachable_cooldown
+        secondes (retryAfter dans le résultat).
+
+        Args:
+            force: Interroger Ollama même si une réponse récente est en cache
+
+        Returns:
+            Dict avec available (bool), models (list), error (str)
+        """
+        try:
+            data = self._probe("tags", self._fetch_tags, force)
             models = [m["name"] for m in data.get("models", [])]
 
             if self.verbose:
@@ -150,6 +989,13 @@ class OllamaEmbedder:
                 "modelAvailable": self.model in models,
             }
 
+        except OllamaUnreachableError as e:
+            return {
+                "available": False,
+                "models": [],
+                "error": str(e),
+                "retryAfter": round(e.retry_after, 2),
+            }
         except Exception as e:
             return {
                 "available": False,
@@ -157,22 +1003,61 @@ class OllamaEmbedder:
                 "error": str(e),
             }
 
-    def get_model_info(self) -> Dict[str, Any]:
+    def get_status(self) -> Dict[str, Any]:
         """
-        Récupère des infos sur le modèle courant
+        Statut de l'embedder (modèle courant, statistiques du cache)
 
         Returns:
-            Dict avec infos du modèle
+            Dict avec model, baseUrl, cache et store (None si désactivés)
         """
-        try:
-            url = f"{self.base_url}/api/show"
+        return {
+            "success": True,
+            "model": self.model,
+            "baseUrl": self.base_url,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "store": self.store.stats() if self.store is not None else None,
+            "batching": {
+                "maxBatchSize": self.max_batch_size,
+                "batchEndpoint": self.batch_endpoint_available,
+                "batchRequests": self.batch_stats["batch_requests"],
+                "legacyRequests": self.batch_stats["legacy_requests"],
+                "texts": self.batch_stats["texts"],
+            },
+            "poolSize": self.pool_size,
+            "windowing": {
+                "maxTokens": self.max_tokens,
+                "overlap": self.window_overlap,
+                "tokenizer": self.token_counter.name if self.token_counter and self.token_counter.exact else "approximate",
+            } if self.token_counter is not None else None,
+            "output": {
+                "dimensions": self.dimensions,
+                "float16": self.float16,
+            },
+            "probes": {
+                "ttl": self.probe_ttl,
+                "hits": self.probe_stats["hits"],
+                "misses": self.probe_stats["misses"],
+                "fastFails": self.probe_stats["fast_fails"],
+                "unreachableFor": round(max(0.0, self._unreachable_until - time.monotonic()), 2),
+            },
+            "concurrency": {
+                "configured": self.concurrency,
+                "lastBatch": self.last_concurrency,
+            },
+        }
 
-            payload = {"name": self.model}
+    def get_model_info(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Récupère des infos sur le modèle courant (en cache comme check_availability)
 
-            response = requests.post(url, json=payload, timeout=5)
-            response.raise_for_status()
+        Args:
+            force: Interroger Ollama même si une réponse récente est en cache
 
-            return response.json()
+        Returns:
+            Dict avec infos du modèle ({} si indisponible)
+        """
+        try:
+            return dict(self._probe(f"show:{self.model}", self._fetch_model_info, force))
 
         except Exception as e:
             if self.verbose:
@@ -180,6 +1065,155 @@ class OllamaEmbedder:
             return {}
 
 
+def _read_jsonl(lines: Iterable[str]) -> Iterator[Tuple[Any, Optional[str], Optional[str]]]:
+    """
+    Textes d'un flux JSONL: une chaîne JSON ou un objet {"id": ..., "text": ...} par ligne
+
+    Yields:
+        (id, texte, erreur) ; id = numéro de ligne si absent
+    """
+    for line_number, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+
+        if isinstance(record, str):
+            yield line_number, record, None
+        elif isinstance(record, dict) and isinstance(record.get("text"), str):
+            yield record.get("id", line_number), record["text"], None
+        else:
+            yield line_number, None, "Expected a JSON string or an object with a 'text' field"
+
+
+def l2_normalize(embedding: List[float]) -> List[float]:
+    """Vecteur de norme 1 (comme ceux retournés par /api/embed)"""
+    norm = math.sqrt(sum(value * value for value in embedding))
+    return [value / norm for value in embedding] if norm else list(embedding)
+
+
+# Modèles dont la recette Matryoshka applique layer_norm au vecteur complet avant troncature
+_LAYER_NORM_MODELS = ("nomic-embed-text", "nomic-embed-text-v1.5")
+
+
+def uses_layer_norm(model: str) -> bool:
+    """nomic-embed-text v1.5 (nom Ollama ou Hugging Face, tag ignoré)"""
+    name = model.split(":", 1)[0].rsplit("/", 1)[-1].lower()
+    return name in _LAYER_NORM_MODELS
+
+
+def truncate_embedding(embedding: List[float], dimensions: int, layer_norm: bool = False) -> List[float]:
+    """
+    Troncature Matryoshka: premières composantes, renormalisées (L2)
+
+    Pour les modèles entraînés en Matryoshka (nomic-embed-text v1.5,
+    mxbai-embed-large), le préfixe garde l'essentiel de la qualité de recherche.
+    nomic-embed-text v1.5 applique layer_norm (sans affine) au vecteur complet
+    avant de tronquer (layer_norm=True) : à une échelle près, effacée par la
+    normalisation L2, cela revient à retrancher la moyenne des composantes.
+    """
+    if dimensions >= len(embedding):
+        return embedding
+    head = embedding[:dimensions]
+    if layer_norm:
+        mean = sum(embedding) / len(embedding)
+        head = [value - mean for value in head]
+    return l2_normalize(head)
+
+
+def to_float16(embedding: List[float]) -> List[float]:
+    """Valeurs arrondies à la précision float16 (5 chiffres significatifs suffisent à les relire)"""
+    fmt = f"<{len(embedding)}e"
+    return [float(f"{value:.5g}") for value in struct.unpack(fmt, struct.pack(fmt, *embedding))]
+
+
+def _write_binary_record(out: BinaryIO, index: int, embedding: Optional[List[float]], half: bool = False):
+    """Enregistrement binaire: index (uint32), dims (uint32, 0 = échec), dims x float32 (ou float16) little-endian"""
+    embedding = embedding or []
+    out.write(struct.pack("<II", index, len(embedding)))
+    if half:
+        out.write(struct.pack(f"<{len(embedding)}e", *embedding))
+        return
+    values = array("f", embedding)
+    if sys.byteorder != "little":
+        values.byteswap()
+    out.write(values.tobytes())
+
+
+def stream_embeddings(
+    embedder: "OllamaEmbedder",
+    lines: Iterable[str],
+    out: Union[TextIO, BinaryIO],
+    binary: bool = False,
+    window: Optional[int] = None,
+    half: bool = False,
+) -> Dict[str, Any]:
+    """
+    Embeddings d'un flux JSONL, écrits au fur et à mesure (mémoire constante)
+
+    Les textes sont lus par fenêtres de `window` (par défaut max_batch_size x
+    concurrency) ; chaque fenêtre est embeddée puis écrite avant de lire la
+    suivante. En texte, une ligne JSON compacte par texte ({"index", "id",
+    "embedding"} ou {"index", "id", "error"}) ; en binaire, des enregistrements
+    float32, ou float16 avec half (voir _write_binary_record), les erreurs
+    restant sur stderr.
+
+    Returns:
+        Dict avec count, failed, dims, elapsedSeconds
+    """
+    window = window or embedder.max_batch_size * embedder.concurrency
+    stats = {"count": 0, "failed": 0, "dims": 0}
+    start = time.perf_counter()
+    records = _read_jsonl(lines)
+
+    while True:
+        pending = list(islice(records, window))
+        if not pending:
+            break
+
+        texts = [text for _, text, error in pending if error is None]
+        result = embedder.embed_batch(texts) if texts else BatchEmbeddingResult(0)
+        positions = iter(range(len(texts)))
+
+        for record_id, text, error in pending:
+            index = stats["count"]
+            stats["count"] += 1
+
+            embedding = None
+            if error is None:
+                position = next(positions)
+                embedding = result.embeddings[position]
+                error = result.failed.get(position)
+
+            if error is not None:
+                stats["failed"] += 1
+                if binary:
+                    print(f"[OllamaEmbedder] Record {index} ({record_id}) failed: {error}", file=sys.stderr)
+            elif not stats["dims"]:
+                stats["dims"] = len(embedding)
+
+            if binary:
+                _write_binary_record(out, index, embedding, half)
+            elif error is not None:
+                out.write(json.dumps({"index": index, "id": record_id, "error": error}, separators=(",", ":")) + "\n")
+            else:
+                record = {"index": index, "id": record_id, "embedding": embedding}
+                if position in result.windows:
+                    record["spans"] = [[w["start"], w["end"]] for w in result.windows[position]]
+                out.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+        out.flush()
+        if embedder.verbose:
+            print(f"[OllamaEmbedder] Streamed {stats['count']} records", file=sys.stderr)
+
+    stats["elapsedSeconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+
 def main():
     """
     Point d'entrée CLI pour tester le module
@@ -193,18 +1227,100 @@ def main():
     parser.add_argument("--url", default="http://localhost:11434", help="Ollama base URL")
     parser.add_argument("--check", action="store_true", help="Check Ollama availability")
     parser.add_argument("--batch", nargs="+", help="Batch mode: embed multiple texts")
+    parser.add_argument("--jsonl", nargs="?", const="-", metavar="PATH",
+                        help="Streaming mode: read JSONL texts from PATH (or stdin) and write one record per line")
+    parser.add_argument("--format", choices=["json", "float32", "float16"], default="json",
+                        help="Streaming mode output: compact JSON lines or binary float32/float16 records")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
     parser.add_argument("--output", help="Output JSON file path")
+    parser.add_argument("--status", action="store_true", help="Show embedder status and cache stats")
+    parser.add_argument("--cache-path", help="Persist the embedding cache to this JSON file")
+    parser.add_argument("--cache-size", type=int, default=256, help="Embedding cache size (0 = disabled)")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL_SECONDS, help="Embedding cache TTL in seconds")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help="Maximum texts per /api/embed request")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                        help="Keep-alive HTTP connections kept open to Ollama")
+    parser.add_argument("--checkpoint", help="Batch mode: JSONL checkpoint file to resume an interrupted batch")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help="Retries on timeouts / connection errors / HTTP 5xx")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Embedding requests in flight in batch mode (see OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--store-path", help="Persistent content-hash embedding store (SQLite file)")
+    parser.add_argument("--store-max-mb", type=float, default=DEFAULT_STORE_MAX_MB,
+                        help="Size of the persistent store before least-recently-used eviction")
+    parser.add_argument("--store-stats", action="store_true", help="Show persistent store stats and exit")
+    parser.add_argument("--max-tokens", type=int,
+                        help="Split texts longer than this many tokens into pooled windows")
+    parser.add_argument("--window-overlap", type=int, default=DEFAULT_WINDOW_OVERLAP,
+                        help="Tokens shared by consecutive windows")
+    parser.add_argument("--tokenizer", help="Hugging Face tokenizer for exact token counts (default: approximate)")
+    parser.add_argument("--dimensions", type=int,
+                        help="Matryoshka truncation: keep this many dimensions, re-normalized (e.g. 256, 512)")
+    parser.add_argument("--float16", action="store_true", help="Round returned embeddings to float16 precision")
 
     args = parser.parse_args()
 
+    if args.dimensions is not None and args.dimensions < 1:
+        parser.error("--dimensions must be >= 1")
+
     # Créer l'embedder
     embedder = OllamaEmbedder(
         base_url=args.url,
         model=args.model,
         verbose=args.verbose,
+        cache_size=args.cache_size,
+        cache_ttl=args.cache_ttl,
+        cache_path=args.cache_path,
+        max_batch_size=args.max_batch_size,
+        pool_size=args.pool_size,
+        concurrency=args.concurrency,
+        max_retries=args.max_retries,
+        store_path=args.store_path,
+        store_max_mb=args.store_max_mb,
+        max_tokens=args.max_tokens,
+        window_overlap=args.window_overlap,
+        tokenizer=args.tokenizer,
+        dimensions=args.dimensions,
+        float16=args.float16 or args.format == "float16",
     )
 
+    # Mode store stats
+    if args.store_stats:
+        if embedder.store is None:
+            result = {"success": False, "error": "--store-stats requires --store-path"}
+        else:
+            result = {"success": True, **embedder.store.stats()}
+        print(json.dumps(result, indent=2))
+        sys.exit(0 if result["success"] else 1)
+
+    # Mode streaming JSONL
+    if args.jsonl:
+        source = sys.stdin if args.jsonl == "-" else open(args.jsonl, "r", encoding="utf-8")
+        binary = args.format in ("float32", "float16")
+        if args.output:
+            out = open(args.output, "wb") if binary else open(args.output, "w", encoding="utf-8")
+        else:
+            out = sys.stdout.buffer if binary else sys.stdout
+
+        try:
+            stats = stream_embeddings(embedder, source, out, binary=binary, half=args.format == "float16")
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if args.output:
+                out.close()
+            if embedder.cache is not None:
+                embedder.cache.flush()
+
+        print(json.dumps({"success": stats["failed"] == 0, **stats}), file=sys.stderr)
+        sys.exit(0 if stats["failed"] == 0 else 1)
+
+    # Mode status
+    if args.status:
+        print(json.dumps(embedder.get_status(), indent=2))
+        sys.exit(0)
+
     # Mode check
     if args.check:
         result = embedder.check_availability()
@@ -214,12 +1330,12 @@ def main():
     # Mode batch
     if args.batch:
         try:
-            embeddings = embedder.generate_embeddings_batch(args.batch)
+            # Résultat partiel: les index en échec sont listés, les autres gardés
+            batch_result = embedder.embed_batch(args.batch, args.checkpoint)
+            done = next((e for e in batch_result.embeddings if e is not None), None)
             result = {
-                "success": True,
-                "embeddings": embeddings,
-                "count": len(embeddings),
-                "dims": len(embeddings[0]) if embeddings else 0,
+                **batch_result.to_dict(),
+                "dims": len(done) if done else 0,
             }
         except Exception as e:
             result = {
@@ -255,6 +1371,10 @@ def main():
             "error": str(e),
         }
 
+    # Persister les compteurs du cache (hits compris)
+    if embedder.cache is not None:
+        embedder.cache.flush()
+
     # Sortir le résultat en JSON
     output = json.dumps(result, indent=2)
 
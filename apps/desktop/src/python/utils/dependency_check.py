@@ -0,0 +1,23 @@
+"""
+Dependency Check
+Vérifie la disponibilité des dépendances Python sans les importer
+
+Utilisé par les modes --check des embedders : un health check ne doit pas
+payer le coût d'import de torch / transformers / mlx_vlm.
+"""
+
+import importlib.util
+from typing import Dict, Iterable
+
+
+def module_available(name: str) -> bool:
+    """Indique si un module top-level est installé (sans l'importer)"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def check_modules(names: Iterable[str]) -> Dict[str, bool]:
+    """Disponibilité de chaque module, indexée par nom"""
+    return {name: module_available(name) for name in names}
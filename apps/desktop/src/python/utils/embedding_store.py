@@ -0,0 +1,246 @@
+"""
+Embedding Store
+Cache persistant des embeddings de textes (SQLite), indexé par contenu
+
+Ré-indexer une bibliothèque ré-embedde surtout des chunks identiques : on garde
+chaque vecteur sous la clé (sha256(texte), modèle, digest du modèle). Le digest
+invalide les entrées quand le modèle change sous le même nom (nouveau pull).
+
+- lectures et écritures par lots (une requête SQL pour N textes), à faire
+  avant les appels réseau / modèle pour ne calculer que les absents
+- vecteurs stockés en float32 (BLOB)
+- éviction des entrées les moins récemment utilisées au-delà de max_size_mb
+- fichier partageable entre processus (mode WAL)
+
+Utilisé par OllamaEmbedder (text_rag) et MLXEmbeddingServer (copié à côté de
+mlx_embeddings.py au build).
+"""
+
+import sys
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+
+DEFAULT_STORE_PATH = Path.home() / ".blackia" / "embedding_store.sqlite"
+DEFAULT_STORE_MAX_MB = 1024
+
+# Limite de paramètres par requête SQLite (SQLITE_MAX_VARIABLE_NUMBER)
+_SQL_CHUNK = 500
+
+# Après éviction, descendre sous cette fraction du budget
+_EVICT_TARGET = 0.9
+
+
+def text_hash(text: str) -> str:
+    """Clé de contenu d'un texte (sha256)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _to_blob(vector: Sequence[float]) -> bytes:
+    values = array("f", vector)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_blob(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tolist()
+
+
+class EmbeddingStore:
+    """Cache SQLite (texte, modèle, digest) -> embedding, avec éviction LRU par taille"""
+
+    def __init__(self, path: Optional[str] = None, max_size_mb: float = DEFAULT_STORE_MAX_MB):
+        """
+        Args:
+            path: Fichier SQLite (défaut: ~/.blackia/embedding_store.sqlite)
+            max_size_mb: Taille maximale des vecteurs stockés avant éviction
+        """
+        self.path = Path(path).expanduser() if path else DEFAULT_STORE_PATH
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                text_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                model_digest TEXT NOT NULL,
+                dims INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (text_hash, model, model_digest)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+        # Total des tailles tenu à jour à chaque écriture : pas de SUM(size) par put_many
+        self._total_bytes = self._sum_sizes()
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def get_many(self, texts: Sequence[str], model: str, model_digest: str = "") -> List[Optional[List[float]]]:
+        """
+        Embeddings connus pour une liste de textes (None pour les absents)
+
+        Une requête SQL par tranche de 500 textes ; les hits sont marqués comme
+        récemment utilisés.
+        """
+        hashes = [text_hash(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique), _SQL_CHUNK):
+                chunk = unique[start:start + _SQL_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND model_digest = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, model_digest, *chunk],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = _from_blob(blob)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE text_hash = ? AND model = ? AND model_digest = ?",
+                    [(now, key, model, model_digest) for key in found],
+                )
+                self._conn.commit()
+
+            results = [found.get(key) for key in hashes]
+            hits = sum(1 for r in results if r is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+
+        return results
+
+    def put_many(
+        self,
+        texts: Sequence[str],
+        embeddings: Sequence[Optional[Sequence[float]]],
+        model: str,
+        model_digest: str = "",
+    ):
+        """Enregistre des embeddings (None ignorés), puis évince si le budget est dépassé"""
+        now = time.time()
+        rows: Dict[str, tuple] = {}
+        for text, embedding in zip(texts, embeddings):
+            if embedding is None:
+                continue
+            blob = _to_blob(embedding)
+            key = text_hash(text)
+            rows[key] = (key, model, model_digest, len(embedding), blob, len(blob), now, now)
+
+        if not rows:
+            return
+
+        with self._lock:
+            # Tailles des entrées remplacées, pour ajuster le total sans le recalculer
+            keys = list(rows)
+            replaced = 0
+            for start in range(0, len(keys), _SQL_CHUNK):
+                chunk = keys[start:start + _SQL_CHUNK]
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings "
+                    f"WHERE model = ? AND model_digest = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, model_digest, *chunk],
+                ).fetchone()[0]
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(text_hash, model, model_digest, dims, vector, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                list(rows.values()),
+            )
+            self._total_bytes += sum(row[5] for row in rows.values()) - replaced
+            self.writes += len(rows)
+            self._evict_if_needed()
+            self._conn.commit()
+
+    def _sum_sizes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def _evict_if_needed(self):
+        """Supprime les entrées les moins récemment utilisées au-delà du budget (verrou tenu)"""
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        # Le fichier est partagé entre processus : on resynchronise le total avant d'évincer
+        self._total_bytes = self._sum_sizes()
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * _EVICT_TARGET)
+        cursor = self._conn.execute("SELECT rowid, size FROM embeddings ORDER BY last_used ASC")
+        doomed = []
+        for rowid, size in cursor:
+            if self._total_bytes <= target:
+                break
+            doomed.append((rowid,))
+            self._total_bytes -= size
+
+        self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", doomed)
+        self.evictions += len(doomed)
+
+    def clear(self, model: Optional[str] = None):
+        """Vide le cache (ou les entrées d'un modèle)"""
+        with self._lock:
+            if model is None:
+                self._conn.execute("DELETE FROM embeddings")
+            else:
+                self._conn.execute("DELETE FROM embeddings WHERE model = ?", (model,))
+            self._conn.commit()
+            self._total_bytes = self._sum_sizes()
+
+    def stats(self) -> Dict[str, Any]:
+        """Entrées, taille, hits/misses et répartition par modèle"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()
+            models = [
+                {"model": model, "digest": digest, "entries": count, "sizeMb": round(total / 1024 / 1024, 2)}
+                for model, digest, count, total in self._conn.execute(
+                    "SELECT model, model_digest, COUNT(*), SUM(size) FROM embeddings "
+                    "GROUP BY model, model_digest ORDER BY COUNT(*) DESC"
+                )
+            ]
+            lookups = self.hits + self.misses
+            return {
+                "path": str(self.path),
+                "entries": entries,
+                "sizeMb": round(size / 1024 / 1024, 2),
+                "maxSizeMb": round(self.max_bytes / 1024 / 1024, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "models": models,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
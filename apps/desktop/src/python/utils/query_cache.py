@@ -0,0 +1,218 @@
+"""
+Query Embedding Cache
+Cache LRU des embeddings de requêtes, avec TTL et persistance disque optionnelle
+
+Les utilisateurs répètent et affinent souvent les mêmes requêtes : plutôt que de
+ré-encoder à chaque fois, on garde les embeddings indexés par (modèle, texte normalisé).
+Les valeurs stockées doivent être sérialisables en JSON (listes de floats).
+"""
+
+import sys
+import json
+import atexit
+import os
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+DEFAULT_CACHE_DIR = Path.home() / ".blackia" / "query_cache"
+
+# Durée de vie par défaut d'une entrée (secondes), commune à tous les embedders
+DEFAULT_CACHE_TTL_SECONDS = 86400
+
+# Délai minimal entre deux réécritures du fichier déclenchées par put (secondes)
+DEFAULT_SAVE_INTERVAL_SECONDS = 5.0
+
+
+def normalize_query(text: str) -> str:
+    """Normalise une requête (unicode NFKC, espaces compactés)"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class QueryEmbeddingCache:
+    """
+    Cache LRU en mémoire avec éviction par taille et par TTL
+
+    Si persist_path est fourni, le cache est chargé au démarrage et réécrit
+    (de manière atomique) par flush(), à la sortie du processus, ou au plus une
+    fois par save_interval lors des insertions : un lot de requêtes ne réécrit
+    pas tout le fichier à chaque put. Les CLIs one-shot (colette_embedder,
+    mlx_vision_embedder) profitent ainsi des hits d'un appel à l'autre.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = DEFAULT_CACHE_TTL_SECONDS,
+        persist_path: Optional[str] = None,
+        save_interval: float = DEFAULT_SAVE_INTERVAL_SECONDS,
+    ):
+        """
+        Args:
+            max_entries: Nombre maximum d'entrées avant éviction LRU
+            ttl_seconds: Durée de vie d'une entrée (0 = pas d'expiration)
+            persist_path: Fichier JSON de persistance (None = mémoire uniquement)
+            save_interval: Délai minimal entre deux écritures déclenchées par put
+                (0 = écrire à chaque insertion)
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.save_interval = save_interval
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if self.persist_path:
+            self._load()
+            atexit.register(self._flush_if_dirty)
+
+    @staticmethod
+    def make_key(query: str, model: str) -> str:
+        """Clé de cache: sha256(modèle + requête normalisée)"""
+        raw = f"{model}\x00{normalize_query(query)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _is_expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return bool(self.ttl_seconds) and now - entry["created_at"] > self.ttl_seconds
+
+    def get(self, query: str, model: str) -> Optional[Any]:
+        """Retourne l'embedding en cache ou None"""
+        key = self.make_key(query, model)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and self._is_expired(entry, now):
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["value"]
+
+    def put(self, query: str, model: str, value: Any):
+        """Ajoute (ou rafraîchit) un embedding dans le cache"""
+        key = self.make_key(query, model)
+
+        with self._lock:
+            self._entries[key] = {"value": value, "created_at": time.time()}
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._dirty = True
+
+        if self.persist_path and time.monotonic() - self._last_save >= self.save_interval:
+            self._save()
+
+    def clear(self):
+        """Vide le cache (et le fichier de persistance)"""
+        with self._lock:
+            self._entries.clear()
+
+        if self.persist_path:
+            self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs hits/misses et taille du cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "persist_path": str(self.persist_path) if self.persist_path else None,
+            }
+
+    def _load(self):
+        """Charge le cache depuis le disque (entrées expirées ignorées)"""
+        try:
+            if not self.persist_path.exists():
+                return
+
+            with open(self.persist_path, "r") as f:
+                data = json.load(f)
+
+            now = time.time()
+            for key, entry in data.get("entries", []):
+                if not self._is_expired(entry, now):
+                    self._entries[key] = entry
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+            # Les compteurs sont cumulés entre les processus (utile pour les CLIs one-shot)
+            counters = data.get("stats", {})
+            self.hits = counters.get("hits", 0)
+            self.misses = counters.get("misses", 0)
+            self.evictions = counters.get("evictions", 0)
+            self.expirations = counters.get("expirations", 0)
+
+        except Exception as e:
+            print(f"[QueryCache] Could not load {self.persist_path}: {e}", file=sys.stderr)
+            self._entries.clear()
+
+    def _save(self):
+        """Écrit le cache sur disque (écriture atomique)"""
+        try:
+            with self._lock:
+                self._dirty = False
+                self._last_save = time.monotonic()
+                data = {
+                    "entries": list(self._entries.items()),
+                    "stats": {
+                        "hits": self.hits,
+                        "misses": self.misses,
+                        "evictions": self.evictions,
+                        "expirations": self.expirations,
+                    },
+                }
+
+            self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.persist_path.with_suffix(self.persist_path.suffix + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.persist_path)
+
+        except Exception as e:
+            print(f"[QueryCache] Could not save {self.persist_path}: {e}", file=sys.stderr)
+
+    @property
+    def dirty(self) -> bool:
+        """Des insertions n'ont pas encore été écrites sur disque"""
+        return self._dirty
+
+    def _flush_if_dirty(self):
+        """À la sortie du processus : n'écrit que s'il reste des insertions en attente"""
+        if self._dirty:
+            self.flush()
+
+    def flush(self):
+        """Écrit les insertions en attente et les compteurs (même sans insertion, ex: après un hit)"""
+        if self.persist_path:
+            self._save()
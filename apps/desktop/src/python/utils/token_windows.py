@@ -0,0 +1,110 @@
+"""
+Token Windows
+Comptage de tokens et découpage des textes trop longs avant embedding
+
+Un chunk plus long que le contexte du modèle est tronqué par le serveur (la fin
+du texte n'est pas représentée) ou ralentit tout le lot. On le découpe en
+fenêtres d'au plus max_tokens tokens, avec recouvrement, repérées par leur
+position (en caractères) dans le texte d'origine.
+
+Le comptage utilise le tokenizer du modèle (package `tokenizers`, optionnel) ou
+une estimation rapide qui surestime légèrement, ce qui garde les fenêtres sous
+la limite.
+"""
+
+import re
+import math
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    from tokenizers import Tokenizer
+    TOKENIZERS_AVAILABLE = True
+except ImportError:
+    TOKENIZERS_AVAILABLE = False
+
+
+# Mots / nombres, ou ponctuation isolée
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+# Estimation: un token pour 4 caractères d'un mot (WordPiece/BPE découpent les mots longs)
+APPROX_CHARS_PER_TOKEN = 4
+
+# (début, fin) en caractères dans le texte d'origine
+Span = Tuple[int, int]
+
+
+class TokenCounter:
+    """Positions des tokens d'un texte, via le tokenizer du modèle ou une estimation"""
+
+    def __init__(self, tokenizer: Optional[str] = None):
+        """
+        Args:
+            tokenizer: Nom Hugging Face (ex: nomic-ai/nomic-embed-text-v1.5) ou
+                chemin d'un tokenizer.json ; None = estimation rapide
+        """
+        self.tokenizer = None
+        self.name = tokenizer
+        if tokenizer:
+            if not TOKENIZERS_AVAILABLE:
+                raise ImportError("Exact token counts require tokenizers: pip install tokenizers")
+            if tokenizer.endswith(".json"):
+                self.tokenizer = Tokenizer.from_file(tokenizer)
+            else:
+                self.tokenizer = Tokenizer.from_pretrained(tokenizer)
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+
+    def token_spans(self, text: str) -> List[Span]:
+        """Position de chaque token (sans tokens spéciaux)"""
+        if self.tokenizer is not None:
+            encoding = self.tokenizer.encode(text, add_special_tokens=False)
+            return [(start, end) for start, end in encoding.offsets if end > start]
+
+        spans = []
+        for match in _PIECE_RE.finditer(text):
+            start, end = match.span()
+            for offset in range(start, end, APPROX_CHARS_PER_TOKEN):
+                spans.append((offset, min(offset + APPROX_CHARS_PER_TOKEN, end)))
+        return spans
+
+    def count(self, text: str) -> int:
+        """Nombre de tokens du texte"""
+        if self.tokenizer is not None:
+            return len(self.token_spans(text))
+        return sum(math.ceil(len(match.group()) / APPROX_CHARS_PER_TOKEN) for match in _PIECE_RE.finditer(text))
+
+    def windows(self, text: str, max_tokens: int, overlap: int = 0) -> List[Tuple[Span, int]]:
+        """
+        Fenêtres d'au plus max_tokens tokens, chevauchées de overlap tokens
+
+        Returns:
+            Liste de (span, nombre de tokens) ; une seule fenêtre couvrant tout
+            le texte s'il tient dans la limite
+        """
+        spans = self.token_spans(text)
+        if len(spans) <= max_tokens:
+            return [((0, len(text)), len(spans))]
+
+        step = max(1, max_tokens - overlap)
+        windows = []
+        for first in range(0, len(spans), step):
+            last = min(first + max_tokens, len(spans))
+            windows.append(((spans[first][0], spans[last - 1][1]), last - first))
+            if last == len(spans):
+                break
+        return windows
+
+
+def mean_pool(vectors: Sequence[Sequence[float]], weights: Sequence[float]) -> List[float]:
+    """Moyenne pondérée (par nombre de tokens) des embeddings de fenêtres, normalisée L2"""
+    total = sum(weights) or 1.0
+    pooled = [0.0] * len(vectors[0])
+    for vector, weight in zip(vectors, weights):
+        scale = weight / total
+        for d, value in enumerate(vector):
+            pooled[d] += value * scale
+
+    norm = math.sqrt(sum(value * value for value in pooled))
+    return [value / norm for value in pooled] if norm else pooled
@@ -12,9 +12,12 @@ Installation:
 Référence: https://github.com/jolibrain/colette
 """
 
+from __future__ import annotations
+
 import sys
 import json
 import io
+import time
 
 # BUILD VERSION IDENTIFIER - This will appear in logs even if imports fail
 print("[COLETTE_EMBEDDER_BUILD_2025-01-19-v3]", file=sys.stderr, flush=True)
@@ -26,34 +29,121 @@ sys.stdout = io.StringIO()
 
 import argparse
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Callable, Optional, Tuple
 import warnings
 
 warnings.filterwarnings('ignore')
 
+# Lightweight imports only: the model stack is loaded on first use
+# Import poppler_utils - gérer import relatif et absolu
+try:
+    from .poppler_utils import check_poppler_installed, get_installation_instructions
+except ImportError:
+    from poppler_utils import check_poppler_installed, get_installation_instructions
 try:
-    from PIL import Image
-    import torch
-    import transformers
-    from colpali_engine.models import ColPali, ColPaliProcessor
-    from pdf2image import convert_from_path
-    import numpy as np
-    # Import poppler_utils - gérer import relatif et absolu
+    from ..utils.query_cache import QueryEmbeddingCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_TTL_SECONDS
+    from ..utils.dependency_check import check_modules
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from utils.query_cache import QueryEmbeddingCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_TTL_SECONDS
+    from utils.dependency_check import check_modules
+
+INSTALL_HINT = "Install with: pip install colpali-engine torch torchvision pdf2image pillow"
+
+# Modules required to embed (checked without importing by --check)
+REQUIRED_MODULES = ["torch", "transformers", "colpali_engine", "pdf2image", "PIL", "numpy"]
+
+# Heavy dependencies, bound by _import_model_stack() / _import_image_stack()
+torch = None
+ColPali = None
+ColPaliProcessor = None
+Image = None
+np = None
+convert_from_path = None
+
+
+def _import_image_stack():
+    """Import PIL, numpy and pdf2image on first use"""
+    global Image, np, convert_from_path
+
+    if Image is not None:
+        return
+
+    try:
+        from PIL import Image as _Image
+        import numpy as _np
+        from pdf2image import convert_from_path as _convert_from_path
+    except ImportError as e:
+        raise ImportError(f"Missing dependencies: {str(e)}. {INSTALL_HINT}")
+
+    Image, np, convert_from_path = _Image, _np, _convert_from_path
+
+
+def _import_model_stack():
+    """Import torch, transformers and colpali_engine on first use"""
+    global torch, ColPali, ColPaliProcessor
+
+    if torch is not None:
+        return
+
+    _import_image_stack()
+
     try:
-        from .poppler_utils import check_poppler_installed, get_installation_instructions
-    except ImportError:
-        from poppler_utils import check_poppler_installed, get_installation_instructions
+        import torch as _torch
+        import transformers
+        from colpali_engine.models import ColPali as _ColPali, ColPaliProcessor as _ColPaliProcessor
+    except ImportError as e:
+        raise ImportError(f"Missing dependencies: {str(e)}. {INSTALL_HINT}")
+
+    torch, ColPali, ColPaliProcessor = _torch, _ColPali, _ColPaliProcessor
 
     # Log version info to stderr for debugging (won't pollute JSON stdout)
     print(f"[Colette] ✓ Dependencies loaded - transformers v{transformers.__version__}, torch v{torch.__version__}", file=sys.stderr)
-except ImportError as e:
-    # Restore stdout for error output
-    sys.stdout = _ORIGINAL_STDOUT
-    print(json.dumps({
-        "success": False,
-        "error": f"Missing dependencies: {str(e)}. Install with: pip install colpali-engine torch torchvision pdf2image pillow"
-    }), file=sys.stderr)
-    sys.exit(1)
+
+
+def check_dependencies() -> Dict[str, Any]:
+    """Report dependency availability without importing the model stack"""
+    modules = check_modules(REQUIRED_MODULES)
+    poppler_installed, poppler_path = check_poppler_installed()
+
+    missing = [name for name, ok in modules.items() if not ok]
+
+    return {
+        "success": True,
+        "available": not missing and poppler_installed,
+        "modules": modules,
+        "missing": missing,
+        "poppler": {"installed": poppler_installed, "path": poppler_path},
+        "install_hint": INSTALL_HINT if missing else None,
+    }
+
+
+def encode_query_cached(
+    query_cache: Optional[QueryEmbeddingCache],
+    model_name: str,
+    query: str,
+    encode: Callable[[str], List[Any]],
+) -> Tuple[List[Any], bool]:
+    """
+    Query embedding through the query cache
+
+    encode(query) only runs on a miss, so callers can defer model loading to it.
+
+    Returns:
+        (embedding as nested lists, True if served from the cache)
+    """
+    if query_cache is not None:
+        cached = query_cache.get(query, model_name)
+        if cached is not None:
+            print("[Colette] Query cache hit", file=sys.stderr)
+            return cached, True
+
+    embedding = encode(query)
+
+    if query_cache is not None:
+        query_cache.put(query, model_name, embedding)
+
+    return embedding, False
 
 
 class ColetteEmbedder:
@@ -62,15 +152,24 @@ class ColetteEmbedder:
     Utilise ColPali pour générer des embeddings multi-vecteurs (late interaction)
     """
 
-    def __init__(self, model_name: str = "vidore/colpali", device: str = "auto"):
+    def __init__(
+        self,
+        model_name: str = "vidore/colpali",
+        device: str = "auto",
+        query_cache: Optional[QueryEmbeddingCache] = None,
+    ):
         """
         Initialize Colette embedder
 
         Args:
             model_name: Model name (colpali or qwen2-vl)
             device: Device to use (cuda, mps, cpu, or auto)
+            query_cache: Optional LRU cache for query embeddings
         """
+        _import_model_stack()
+
         self.model_name = model_name
+        self.query_cache = query_cache
 
         # Auto-detect device
         if device == "auto":
@@ -86,7 +185,12 @@ class ColetteEmbedder:
         print(f"[Colette] Using device: {self.device}", file=sys.stderr)
         print(f"[Colette] Loading model: {model_name}", file=sys.stderr)
 
+        self.load_time_ms = 0.0
+        self.warmup_time_ms = None
+
         try:
+            load_start = time.perf_counter()
+
             # Load ColPali model and processor
             # stdout is already redirected, so any output from transformers goes nowhere
             self.model = ColPali.from_pretrained(
@@ -98,12 +202,61 @@ class ColetteEmbedder:
 
             self.model.eval()
 
-            print(f"[Colette] Model loaded successfully", file=sys.stderr)
+            self.load_time_ms = (time.perf_counter() - load_start) * 1000
+
+            print(f"[Colette] Model loaded successfully ({self.load_time_ms:.0f} ms)", file=sys.stderr)
 
         except Exception as e:
             print(f"[Colette] Error loading model: {str(e)}", file=sys.stderr)
             raise
 
+    def warmup(self, image_size: int = 448) -> Dict[str, Any]:
+        """
+        Run dummy inputs of representative shapes through the model
+
+        The first real request otherwise pays for lazy kernel compilation,
+        allocator growth and page faults on the weights.
+
+        Args:
+            image_size: Side of the blank warmup page (pixels)
+
+        Returns:
+            Dict with load and warmup timings (ms)
+        """
+        print("[Colette] Warming up model", file=sys.stderr)
+        warmup_start = time.perf_counter()
+
+        with torch.no_grad():
+            # Touch every weight so they are resident before the first request
+            for param in self.model.parameters():
+                param.sum().item()
+
+            # One page and one query: the two shapes used by embed_images / encode_query
+            page = Image.new("RGB", (image_size, image_size), color="white")
+            batch_images = self.processor.process_images([page]).to(self.device)
+            self.model(**batch_images)
+
+            batch_queries = self.processor.process_queries(["warmup query"]).to(self.device)
+            self.model(**batch_queries)
+
+        if self.device == "cuda":
+            torch.cuda.synchronize()
+        elif self.device == "mps":
+            torch.mps.synchronize()
+
+        self.warmup_time_ms = (time.perf_counter() - warmup_start) * 1000
+
+        print(f"[Colette] Warmup done ({self.warmup_time_ms:.0f} ms)", file=sys.stderr)
+
+        return self.get_timings()
+
+    def get_timings(self) -> Dict[str, Any]:
+        """Load vs warmup timings (ms)"""
+        return {
+            "load_time_ms": round(self.load_time_ms, 2),
+            "warmup_time_ms": round(self.warmup_time_ms, 2) if self.warmup_time_ms is not None else None,
+        }
+
     def load_images_from_paths(self, image_paths: List[str], save_cache: bool = False) -> Tuple[List[Image.Image], List[str]]:
         """
         Load images from file paths
@@ -254,6 +407,13 @@ class ColetteEmbedder:
         Returns:
             Query embedding
         """
+        embedding, _ = encode_query_cached(
+            self.query_cache, self.model_name, query, lambda text: self._encode_query(text).tolist()
+        )
+        return np.array(embedding, dtype=np.float32)
+
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Encode a query with the model (no cache)"""
         try:
             batch_queries = self.processor.process_queries([query]).to(self.device)
 
@@ -261,9 +421,7 @@ class ColetteEmbedder:
                 query_embeddings = self.model(**batch_queries)
 
             # Take first query
-            query_emb = query_embeddings[0].cpu().float().numpy()
-
-            return query_emb
+            return query_embeddings[0].cpu().float().numpy()
 
         except Exception as e:
             print(f"[Colette] Error encoding query: {str(e)}", file=sys.stderr)
@@ -275,17 +433,33 @@ def main():
     try:
         # stdout is already redirected at module level
         parser = argparse.ArgumentParser(description="Colette Vision RAG Embedder")
-        parser.add_argument("--input", type=str, required=True, help="JSON input file or string")
+        parser.add_argument("--input", type=str, default="{}", help="JSON input file or string")
+        parser.add_argument("--check", action="store_true",
+                           help="Report dependency availability without loading the model stack")
         parser.add_argument("--mode", type=str, default="embed_images",
-                           choices=["embed_images", "encode_query"],
+                           choices=["embed_images", "encode_query", "status", "warmup"],
                            help="Operation mode")
+        parser.add_argument("--warmup", action="store_true",
+                           help="Warm up the model before processing the request")
         parser.add_argument("--model", type=str, default="vidore/colpali",
                            help="Model name (vidore/colpali or vidore/colqwen2)")
         parser.add_argument("--device", type=str, default="auto",
                            help="Device (cuda, mps, cpu, auto)")
+        parser.add_argument("--no-query-cache", action="store_true",
+                           help="Disable the persistent query embedding cache")
+        parser.add_argument("--query-cache-size", type=int, default=256,
+                           help="Max cached query embeddings")
+        parser.add_argument("--query-cache-ttl", type=float, default=DEFAULT_CACHE_TTL_SECONDS,
+                           help="Query cache TTL in seconds")
 
         args = parser.parse_args()
 
+        if args.check:
+            result = check_dependencies()
+            sys.stdout = _ORIGINAL_STDOUT
+            print(json.dumps(result))
+            sys.exit(0 if result["available"] else 1)
+
         # Parse input
         try:
             input_data = json.loads(args.input)
@@ -294,51 +468,92 @@ def main():
             with open(args.input, 'r') as f:
                 input_data = json.load(f)
 
-        # Initialize embedder
-        embedder = ColetteEmbedder(model_name=args.model, device=args.device)
-
-        if args.mode == "embed_images":
-            # Get image paths
-            image_paths = input_data.get("image_paths", [])
-            if not image_paths:
-                raise ValueError("No image_paths provided in input")
-
-            # Load images with cache enabled
-            images, cached_paths = embedder.load_images_from_paths(image_paths, save_cache=True)
+        # Query cache persisted on disk: each CLI call is a new process
+        query_cache = None
+        if not args.no_query_cache:
+            query_cache = QueryEmbeddingCache(
+                max_entries=args.query_cache_size,
+                ttl_seconds=args.query_cache_ttl,
+                persist_path=str(DEFAULT_CACHE_DIR / "colette.json"),
+            )
 
-            if not images:
-                raise ValueError("No images could be loaded")
-
-            # Generate embeddings
-            embeddings, metadata = embedder.generate_embeddings(images)
-
-            # Convert embeddings to list for JSON serialization
-            embeddings_list = [emb.tolist() for emb in embeddings]
-
-            # Output result
+        if args.mode == "status":
             result = {
                 "success": True,
-                "embeddings": embeddings_list,
-                "metadata": metadata,
-                "cached_image_paths": cached_paths,  # Return paths to cached images
+                "model": args.model,
+                "query_cache": query_cache.stats() if query_cache is not None else None,
             }
+            sys.stdout = _ORIGINAL_STDOUT
+            print(json.dumps(result))
+            return
 
-        elif args.mode == "encode_query":
+        if args.mode == "encode_query":
             # Get query
             query = input_data.get("query", "")
             if not query:
                 raise ValueError("No query provided in input")
 
-            # Encode query
-            query_emb = embedder.encode_query(query)
+            def encode(text: str) -> List[Any]:
+                # Only reached on a cache miss: hits never load the model
+                embedder = ColetteEmbedder(model_name=args.model, device=args.device)
+                if args.warmup:
+                    embedder.warmup()
+                return embedder._encode_query(text).tolist()
+
+            query_embedding, cached = encode_query_cached(query_cache, args.model, query, encode)
+            if query_cache is not None:
+                query_cache.flush()
 
             # Output result
             result = {
                 "success": True,
-                "query_embedding": query_emb.tolist(),
-                "embedding_dim": query_emb.shape[-1],
+                "query_embedding": query_embedding,
+                "embedding_dim": len(query_embedding[0]) if query_embedding else 0,
+                "cached": cached,
             }
 
+        else:
+            # Initialize embedder
+            embedder = ColetteEmbedder(model_name=args.model, device=args.device)
+
+            if args.warmup or args.mode == "warmup":
+                embedder.warmup()
+
+            if args.mode == "warmup":
+                result = {
+                    "success": True,
+                    "model": args.model,
+                    "device": embedder.device,
+                    **embedder.get_timings(),
+                }
+
+            elif args.mode == "embed_images":
+                # Get image paths
+                image_paths = input_data.get("image_paths", [])
+                if not image_paths:
+                    raise ValueError("No image_paths provided in input")
+
+                # Load images with cache enabled
+                images, cached_paths = embedder.load_images_from_paths(image_paths, save_cache=True)
+
+                if not images:
+                    raise ValueError("No images could be loaded")
+
+                # Generate embeddings
+                embeddings, metadata = embedder.generate_embeddings(images)
+                metadata.update(embedder.get_timings())
+
+                # Convert embeddings to list for JSON serialization
+                embeddings_list = [emb.tolist() for emb in embeddings]
+
+                # Output result
+                result = {
+                    "success": True,
+                    "embeddings": embeddings_list,
+                    "metadata": metadata,
+                    "cached_image_paths": cached_paths,  # Return paths to cached images
+                }
+
         # Restore stdout for JSON output ONLY
         sys.stdout = _ORIGINAL_STDOUT
 
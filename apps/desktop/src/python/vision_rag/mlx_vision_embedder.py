@@ -17,6 +17,8 @@ Architecture:
 - Cache d'images pour visualisation
 """
 
+from __future__ import annotations
+
 import sys
 import json
 import io
@@ -33,17 +35,74 @@ print("[MLX_VISION_EMBEDDER_BUILD_2025-01-21-v6-POPPLER-FIX]", file=sys.stderr,
 _ORIGINAL_STDOUT = sys.stdout
 sys.stdout = io.StringIO()
 
-import numpy as np
+# Import poppler_utils for finding poppler path
+try:
+    from poppler_utils import check_poppler_installed, get_installation_instructions
+    HAS_POPPLER_UTILS = True
+except ImportError:
+    try:
+        from .poppler_utils import check_poppler_installed, get_installation_instructions
+        HAS_POPPLER_UTILS = True
+    except ImportError:
+        HAS_POPPLER_UTILS = False
+        print("[MLX] poppler_utils not available", file=sys.stderr)
 
+# Shared helpers (src/python/utils)
 try:
-    import mlx.core as mx
-    import mlx.nn as nn
-    from PIL import Image
+    from utils.query_cache import QueryEmbeddingCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_TTL_SECONDS
+    from utils.dependency_check import check_modules
+except ImportError:
+    try:
+        from ..utils.query_cache import QueryEmbeddingCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_TTL_SECONDS
+        from ..utils.dependency_check import check_modules
+    except ImportError:
+        sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+        from utils.query_cache import QueryEmbeddingCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_TTL_SECONDS
+        from utils.dependency_check import check_modules
+
+# Heavy dependencies (mlx, mlx_vlm, mlx_clip, pdf2image) are deferred to
+# _load_dependencies(): a query cache hit or a --check never pays for them
+np = None
+mx = None
+nn = None
+Image = None
+load = None
+generate = None
+load_image = None
+load_clip = None
+convert_from_path = None
+HAS_MLX_VLM = False
+HAS_MLX_CLIP = False
+HAS_PDF2IMAGE = False
+_DEPENDENCIES_LOADED = False
+
+REQUIRED_MODULES = ["mlx", "numpy", "PIL"]
+OPTIONAL_MODULES = ["mlx_vlm", "mlx_clip", "pdf2image"]
+
+
+def _load_dependencies():
+    """Import MLX and the vision stack on first use"""
+    global np, mx, nn, Image, load, generate, load_image, load_clip, convert_from_path
+    global HAS_MLX_VLM, HAS_MLX_CLIP, HAS_PDF2IMAGE, _DEPENDENCIES_LOADED
+
+    if _DEPENDENCIES_LOADED:
+        return
+
+    try:
+        import numpy as _np
+        import mlx.core as _mx
+        import mlx.nn as _nn
+        from PIL import Image as _Image
+    except ImportError as e:
+        raise ImportError(f"MLX dependencies not installed: {e}. Run: pip install mlx mlx-vlm pillow pdf2image")
+
+    np, mx, nn, Image = _np, _mx, _nn, _Image
 
     # Try to import mlx_vlm
     try:
-        from mlx_vlm import load, generate
-        from mlx_vlm.utils import load_image
+        from mlx_vlm import load as _load, generate as _generate
+        from mlx_vlm.utils import load_image as _load_image
+        load, generate, load_image = _load, _generate, _load_image
         HAS_MLX_VLM = True
     except ImportError:
         HAS_MLX_VLM = False
@@ -51,41 +110,47 @@ try:
 
     # Try to import mlx-clip for embedding extraction
     try:
-        from mlx_clip import load as load_clip
+        from mlx_clip import load as _load_clip
+        load_clip = _load_clip
         HAS_MLX_CLIP = True
     except ImportError:
         HAS_MLX_CLIP = False
 
     # Try pdf2image for PDF conversion
     try:
-        from pdf2image import convert_from_path
+        from pdf2image import convert_from_path as _convert_from_path
+        convert_from_path = _convert_from_path
         HAS_PDF2IMAGE = True
     except ImportError:
         HAS_PDF2IMAGE = False
         print("[MLX] pdf2image not available", file=sys.stderr)
 
-    # Import poppler_utils for finding poppler path
-    try:
-        from poppler_utils import check_poppler_installed, get_installation_instructions
-        HAS_POPPLER_UTILS = True
-    except ImportError:
-        try:
-            from .poppler_utils import check_poppler_installed, get_installation_instructions
-            HAS_POPPLER_UTILS = True
-        except ImportError:
-            HAS_POPPLER_UTILS = False
-            print("[MLX] poppler_utils not available", file=sys.stderr)
+    _DEPENDENCIES_LOADED = True
 
     print(f"[MLX] Dependencies: mlx_vlm={HAS_MLX_VLM}, mlx_clip={HAS_MLX_CLIP}, pdf2image={HAS_PDF2IMAGE}, poppler_utils={HAS_POPPLER_UTILS}", file=sys.stderr)
     print(f"[MLX] MLX version: {mx.__version__}", file=sys.stderr)
 
-except ImportError as e:
-    sys.stdout = _ORIGINAL_STDOUT
-    print(json.dumps({
-        "success": False,
-        "error": f"MLX dependencies not installed: {e}. Run: pip install mlx mlx-vlm pillow pdf2image",
-    }))
-    sys.exit(1)
+
+def check_dependencies() -> Dict[str, Any]:
+    """Report dependency availability without importing MLX or the model stack"""
+    required = check_modules(REQUIRED_MODULES)
+    optional = check_modules(OPTIONAL_MODULES)
+
+    poppler_installed, poppler_path = (False, None)
+    if HAS_POPPLER_UTILS:
+        poppler_installed, poppler_path = check_poppler_installed()
+
+    missing = [name for name, ok in required.items() if not ok]
+    if not optional["mlx_vlm"]:
+        missing.append("mlx_vlm")
+
+    return {
+        "success": True,
+        "available": not missing,
+        "modules": {**required, **optional},
+        "missing": missing,
+        "poppler": {"installed": poppler_installed, "path": poppler_path},
+    }
 
 
 # Supported models with their configurations
@@ -151,12 +216,14 @@ class MLXVisionEmbedder:
         model_name: str = "mlx-community/Qwen2-VL-2B-Instruct-4bit",
         embed_dim: int = 128,
         verbose: bool = False,
-        save_cache: bool = True
+        save_cache: bool = True,
+        query_cache: Optional[QueryEmbeddingCache] = None
     ):
         self.model_name = model_name
         self.embed_dim = embed_dim
         self.verbose = verbose
         self.save_cache = save_cache
+        self.query_cache = query_cache
         self.model = None
         self.processor = None
         self.projection = None
@@ -176,6 +243,8 @@ class MLXVisionEmbedder:
     def initialize(self) -> Dict[str, Any]:
         """Initialize the model"""
         try:
+            _load_dependencies()
+
             self._log(f"Loading model: {self.model_name}")
 
             if not HAS_MLX_VLM:
@@ -560,6 +629,20 @@ class MLXVisionEmbedder:
 
         Returns query embeddings compatible with MaxSim matching
         """
+        # Cache key includes embed_dim: the projection output size changes the vectors
+        cache_model = f"{self.model_name}@{self.embed_dim}"
+        if self.query_cache is not None:
+            cached = self.query_cache.get(query, cache_model)
+            if cached is not None:
+                self._log("Query cache hit")
+                return {
+                    "success": True,
+                    "query_embedding": cached,
+                    "embedding_dim": self.embed_dim,
+                    "num_tokens": len(cached),
+                    "cached": True
+                }
+
         try:
             if not self.model:
                 init_result = self.initialize()
@@ -594,6 +677,9 @@ class MLXVisionEmbedder:
                 indices = np.linspace(0, len(query_embeddings)-1, max_query_tokens, dtype=int)
                 query_embeddings = [query_embeddings[i] for i in indices]
 
+            if self.query_cache is not None:
+                self.query_cache.put(query, cache_model, query_embeddings)
+
             return {
                 "success": True,
                 "query_embedding": query_embeddings,
@@ -613,32 +699,60 @@ def main():
 
     try:
         parser = argparse.ArgumentParser(description="MLX Vision Embedder")
-        parser.add_argument("--input", required=True, help="JSON input with image_paths or query")
-        parser.add_argument("--mode", choices=["embed_images", "encode_query"], default="embed_images")
+        parser.add_argument("--input", default="{}", help="JSON input with image_paths or query")
+        parser.add_argument("--check", action="store_true", help="Report dependency availability without loading MLX")
+        parser.add_argument("--mode", choices=["embed_images", "encode_query", "status"], default="embed_images")
         parser.add_argument("--model", default="mlx-community/Qwen2-VL-2B-Instruct-4bit")
         parser.add_argument("--embed-dim", type=int, default=128)
         parser.add_argument("--verbose", action="store_true")
         parser.add_argument("--device", default="auto", help="Device (ignored, always uses MLX)")
+        parser.add_argument("--no-query-cache", action="store_true", help="Disable the persistent query cache")
+        parser.add_argument("--query-cache-size", type=int, default=256)
+        parser.add_argument("--query-cache-ttl", type=float, default=DEFAULT_CACHE_TTL_SECONDS)
 
         args = parser.parse_args()
 
+        if args.check:
+            result = check_dependencies()
+            sys.stdout = _ORIGINAL_STDOUT
+            print(json.dumps(result))
+            sys.exit(0 if result["available"] else 1)
+
         # Parse input JSON
         input_data = json.loads(args.input)
 
+        # Persistent query cache (each CLI call runs in a fresh process)
+        query_cache = None
+        if not args.no_query_cache:
+            query_cache = QueryEmbeddingCache(
+                max_entries=args.query_cache_size,
+                ttl_seconds=args.query_cache_ttl,
+                persist_path=str(DEFAULT_CACHE_DIR / "mlx_vision.json")
+            )
+
         # Create embedder
         embedder = MLXVisionEmbedder(
             model_name=args.model,
             embed_dim=args.embed_dim,
             verbose=args.verbose,
-            save_cache=True
+            save_cache=True,
+            query_cache=query_cache
         )
 
         if args.mode == "embed_images":
             image_paths = input_data.get("image_paths", [])
             result = embedder.process_images(image_paths)
+        elif args.mode == "status":
+            result = {
+                "success": True,
+                "model": args.model,
+                "query_cache": query_cache.stats() if query_cache is not None else None
+            }
         else:
             query = input_data.get("query", "")
             result = embedder.encode_query(query)
+            if query_cache is not None:
+                query_cache.flush()
 
         # Restore stdout for JSON output
         sys.stdout = _ORIGINAL_STDOUT
@@ -0,0 +1,221 @@
+"""
+Tests de async_ollama_embeddings (client HTTP/1.1 asyncio, AsyncOllamaEmbedder)
+
+Contre StandInOllama (scripts/benchmarks/ollama_embed_benchmark.py) pour les
+échanges normaux, et contre un serveur asyncio brut pour les cas limites du
+protocole (connexion fermée, Connection: close, réponse tronquée, serveur muet).
+
+    python -m unittest discover -s tests/python
+"""
+
+import sys
+import json
+import asyncio
+import unittest
+from pathlib import Path
+
+DESKTOP_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(DESKTOP_DIR / "scripts" / "benchmarks"))
+
+from ollama_embed_benchmark import StandInOllama, fake_embedding  # noqa: E402  (ajoute src/python au path)
+from text_rag.async_ollama_embeddings import AsyncOllamaEmbedder  # noqa: E402
+from text_rag.ollama_embeddings import OllamaTransientError  # noqa: E402
+
+
+def _json_response(body, headers=()):
+    data = json.dumps(body).encode("utf-8")
+    head = ["HTTP/1.1 200 OK", "Content-Type: application/json", f"Content-Length: {len(data)}", *headers]
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data
+
+
+class RawServer:
+    """
+    Serveur asyncio minimal : respond(index) donne les octets à renvoyer pour la
+    index-ième requête reçue (None = ne jamais répondre) ; la connexion est
+    fermée après la réponse si close_after(index) est vrai
+    """
+
+    def __init__(self, respond, close_after=lambda index: False):
+        self.respond = respond
+        self.close_after = close_after
+        self.requests = 0
+        self.connections = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        return
+                    if line in (b"\r\n", b"\n"):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+
+                index = self.requests
+                self.requests += 1
+                response = self.respond(index)
+                if response is None:
+                    await asyncio.sleep(3600)
+                writer.write(response)
+                await writer.drain()
+                if self.close_after(index):
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+class TestAgainstStandIn(unittest.IsolatedAsyncioTestCase):
+
+    async def test_chunked_batch(self):
+        # Réponse de plusieurs chunks de 4 Ko, connexion réutilisée entre les lots
+        stand_in = StandInOllama(latency_ms=0, per_text_ms=0, legacy_only=False, chunked=True)
+        try:
+            texts = [f"chunk {i}" for i in range(12)]
+            async with AsyncOllamaEmbedder(base_url=stand_in.url, max_batch_size=4, concurrency=1, cache_size=0) as embedder:
+                embeddings = await embedder.generate_embeddings_batch(texts)
+                self.assertEqual(embeddings, [fake_embedding(t, normalized=True) for t in texts])
+                self.assertEqual(embedder.batch_stats["batch_requests"], 3)
+                self.assertEqual(embedder.pool.connections_opened, 1)
+        finally:
+            await asyncio.to_thread(stand_in.close)
+
+    async def test_legacy_fallback(self):
+        stand_in = StandInOllama(latency_ms=0, per_text_ms=0, legacy_only=True)
+        try:
+            texts = ["a", "b", "c"]
+            async with AsyncOllamaEmbedder(base_url=stand_in.url, cache_size=0) as embedder:
+                embeddings = await embedder.generate_embeddings_batch(texts)
+                # /api/embeddings retourne des vecteurs bruts : normalisés comme ceux de /api/embed
+                for embedding, text in zip(embeddings, texts):
+                    for value, expected in zip(embedding, fake_embedding(text, normalized=True)):
+                        self.assertAlmostEqual(value, expected)
+                self.assertIs(embedder.batch_endpoint_available, False)
+                self.assertEqual(embedder.batch_stats["legacy_requests"], 3)
+        finally:
+            await asyncio.to_thread(stand_in.close)
+
+
+class TestConnectionHandling(unittest.IsolatedAsyncioTestCase):
+
+    def _embed(self, server, **kwargs):
+        kwargs = {"cache_size": 0, "max_retries": 0, "timeout": 2, **kwargs}
+        return AsyncOllamaEmbedder(base_url=server.url, **kwargs)
+
+    async def test_reuse_after_server_closed_connection(self):
+        # Le serveur ferme la connexion keep-alive sans prévenir : renvoi sur une connexion neuve
+        server = await RawServer(
+            lambda index: _json_response({"embedding": [float(index)]}),
+            close_after=lambda index: True
+        ).start()
+        try:
+            embedder = self._embed(server)
+            self.assertEqual(await embedder.generate_embedding("a"), [0.0])
+            await asyncio.sleep(0.05)
+            self.assertEqual(await embedder.generate_embedding("b"), [1.0])
+            self.assertEqual(embedder.pool.connections_opened, 2)
+            self.assertEqual(server.requests, 2)
+            await embedder.close()
+        finally:
+            await server.close()
+
+    async def test_connection_close_header(self):
+        server = await RawServer(
+            lambda index: _json_response({"embedding": [float(index)]}, ["Connection: close"])
+        ).start()
+        try:
+            embedder = self._embed(server)
+            await embedder.generate_embedding("a")
+            self.assertEqual(embedder.pool._idle, [])
+            await embedder.generate_embedding("b")
+            self.assertEqual(embedder.pool.connections_opened, 2)
+            await embedder.close()
+        finally:
+            await server.close()
+
+    async def test_keep_alive(self):
+        server = await RawServer(lambda index: _json_response({"embedding": [float(index)]})).start()
+        try:
+            embedder = self._embed(server)
+            for text in ("a", "b", "c"):
+                await embedder.generate_embedding(text)
+            self.assertEqual(embedder.pool.connections_opened, 1)
+            self.assertEqual(server.connections, 1)
+            await embedder.close()
+        finally:
+            await server.close()
+
+    async def test_timeout(self):
+        server = await RawServer(lambda index: None).start()
+        try:
+            embedder = self._embed(server, timeout=0.2)
+            with self.assertRaises(OllamaTransientError):
+                await embedder.generate_embedding("a")
+            # Réponse jamais lue : la connexion n'est pas rendue au pool
+            self.assertEqual(embedder.pool._idle, [])
+            await embedder.close()
+        finally:
+            await server.close()
+
+    async def test_cancellation(self):
+        server = await RawServer(
+            lambda index: None if index == 0 else _json_response({"embedding": [float(index)]})
+        ).start()
+        try:
+            embedder = self._embed(server)
+            task = asyncio.create_task(embedder.generate_embedding("a"))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(embedder.pool._idle, [])
+            # Le sémaphore a été rendu : la requête suivante passe sur une connexion neuve
+            self.assertEqual(await embedder.generate_embedding("b"), [1.0])
+            self.assertEqual(embedder.pool.connections_opened, 2)
+            await embedder.close()
+        finally:
+            await server.close()
+
+    async def test_truncated_chunk_size_line(self):
+        head = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\n\r\n"
+        for tail in (b"", b"zz\r\n", b"1"):
+            with self.subTest(tail=tail):
+                server = await RawServer(lambda index: head + tail, close_after=lambda index: True).start()
+                try:
+                    embedder = self._embed(server)
+                    with self.assertRaises(OllamaTransientError):
+                        await embedder.generate_embedding("a")
+                    self.assertEqual(embedder.pool._idle, [])
+                    await embedder.close()
+                finally:
+                    await server.close()
+
+    async def test_malformed_status_line(self):
+        server = await RawServer(lambda index: b"garbage\r\n\r\n", close_after=lambda index: True).start()
+        try:
+            embedder = self._embed(server)
+            with self.assertRaises(OllamaTransientError):
+                await embedder.generate_embedding("a")
+            await embedder.close()
+        finally:
+            await server.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Tests de embedding_store (cache SQLite des embeddings, éviction LRU par taille)
+
+    python -m unittest discover -s tests/python
+"""
+
+import sys
+import time
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src" / "python"))
+
+from utils.embedding_store import EmbeddingStore  # noqa: E402
+
+# 256 floats32 = 1 Ko par entrée
+_DIMS = 256
+
+
+def _vector(seed):
+    return [float(seed)] * _DIMS
+
+
+class EmbeddingStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        self.tmp.cleanup()
+
+    def store(self, max_size_mb=1):
+        store = EmbeddingStore(str(Path(self.tmp.name) / "store.sqlite"), max_size_mb=max_size_mb)
+        self.stores.append(store)
+        return store
+
+    def test_round_trip(self):
+        store = self.store()
+        store.put_many(["a", "b", "skipped"], [[0.5, -1.25], [2.0, 3.0], None], "nomic")
+
+        self.assertEqual(store.get_many(["b", "missing", "a", "skipped"], "nomic"),
+                         [[2.0, 3.0], None, [0.5, -1.25], None])
+        self.assertEqual(store.get_many(["a"], "other-model"), [None])
+        self.assertEqual((store.hits, store.misses, store.writes), (2, 3, 2))
+
+        # Relu après réouverture du fichier
+        store.close()
+        self.stores.remove(store)
+        self.assertEqual(self.store().get_many(["a"], "nomic"), [[0.5, -1.25]])
+
+    def test_digest_invalidates_entries(self):
+        store = self.store()
+        store.put_many(["a"], [[1.0]], "nomic", "sha-old")
+
+        self.assertEqual(store.get_many(["a"], "nomic", "sha-new"), [None])
+        store.put_many(["a"], [[2.0]], "nomic", "sha-new")
+        self.assertEqual(store.get_many(["a"], "nomic", "sha-new"), [[2.0]])
+        self.assertEqual(store.get_many(["a"], "nomic", "sha-old"), [[1.0]])
+
+    def test_running_total_tracks_replacements(self):
+        store = self.store()
+        store.put_many(["a", "b"], [_vector(1), _vector(2)], "nomic")
+        store.put_many(["a", "a", "c"], [[1.0], [2.0], _vector(3)], "nomic")
+
+        self.assertEqual(store._total_bytes, store._sum_sizes())
+        self.assertEqual(store._total_bytes, 4 + 2 * _DIMS * 4)
+        self.assertEqual(store.get_many(["a"], "nomic"), [[2.0]])
+
+        store.clear("nomic")
+        self.assertEqual(store._total_bytes, 0)
+
+    def test_evicts_least_recently_used_under_budget(self):
+        # Budget de 10 Ko : 10 entrées tiennent, la 11e déclenche l'éviction jusqu'à 9 Ko
+        store = self.store(max_size_mb=10 / 1024)
+        for i in range(10):
+            store.put_many([f"t{i}"], [_vector(i)], "nomic")
+            time.sleep(0.002)
+        self.assertEqual(store.evictions, 0)
+
+        store.get_many(["t0"], "nomic")
+        time.sleep(0.002)
+        store.put_many(["t10"], [_vector(10)], "nomic")
+
+        self.assertEqual(store.evictions, 2)
+        self.assertLessEqual(store._total_bytes, store.max_bytes * 0.9)
+        self.assertEqual(store._total_bytes, store._sum_sizes())
+        present = [i for i, hit in enumerate(store.get_many([f"t{i}" for i in range(11)], "nomic")) if hit]
+        self.assertEqual(present, [0, 3, 4, 5, 6, 7, 8, 9, 10])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+"""
+Tests de mlx_prompt_cache (caches KV par conversation et préfixes partagés)
+
+Sans MLX : les fonctions de mlx_lm.models.cache sont remplacées par des caches
+factices (offset, nbytes, trim).
+
+    python -m unittest discover -s tests/python
+"""
+
+import io
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+MLX_DIR = Path(__file__).resolve().parents[2] / "src" / "main" / "services" / "backends" / "mlx"
+sys.path.insert(0, str(MLX_DIR))
+
+import mlx_prompt_cache  # noqa: E402
+from mlx_prompt_cache import ConversationCacheStore, PrefixCacheStore, common_prefix_length  # noqa: E402
+
+_MB = 1024 * 1024
+
+
+class _Layer:
+    """Couche de cache KV factice : offset tokens, 1 Mo par token"""
+
+    def __init__(self, offset=0, trimmable=True):
+        self.offset = offset
+        self.trimmable = trimmable
+
+    @property
+    def nbytes(self):
+        return self.offset * _MB
+
+
+def _cache(tokens, trimmable=True):
+    return [_Layer(len(tokens), trimmable)]
+
+
+def _trim(cache, n):
+    for layer in cache:
+        layer.offset -= n
+    return n
+
+
+class _FakeCacheTest(unittest.TestCase):
+    def setUp(self):
+        # Logs d'éviction / de précalcul sur stderr
+        patcher = mock.patch.object(sys, "stderr", io.StringIO())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patches = {
+            "make_prompt_cache": lambda model, max_kv_size=None: [_Layer()],
+            "can_trim_prompt_cache": lambda cache: all(layer.trimmable for layer in cache),
+            "trim_prompt_cache": _trim,
+        }
+        for name, fake in patches.items():
+            patcher = mock.patch.object(mlx_prompt_cache, name, fake, create=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class ConversationCacheTest(_FakeCacheTest):
+    def test_common_prefix_hit_trims_extra_tokens(self):
+        store = ConversationCacheStore(budget_mb=100)
+        cached = _cache([1, 2, 3, 4, 5])
+        store.release("conv", cached, [1, 2, 3, 4, 5])
+
+        # Le tour suivant diverge après 3 tokens : les 2 derniers sont retirés du cache
+        cache, reused = store.acquire("conv", None, [1, 2, 3, 7, 8, 9])
+
+        self.assertIs(cache, cached)
+        self.assertEqual(reused, 3)
+        self.assertEqual(cache[0].offset, 3)
+        stats = store.stats()
+        self.assertEqual((stats["hits"], stats["reused_tokens"], stats["prefill_tokens"]), (1, 3, 3))
+
+    def test_untrimmable_cache_with_extra_tokens_is_a_miss(self):
+        store = ConversationCacheStore(budget_mb=100)
+        cached = _cache([1, 2, 3, 4], trimmable=False)
+        store.release("conv", cached, [1, 2, 3, 4])
+
+        cache, reused = store.acquire("conv", None, [1, 2, 9])
+
+        self.assertIsNot(cache, cached)
+        self.assertEqual((reused, cache[0].offset), (0, 0))
+        self.assertEqual(store.stats()["misses"], 1)
+
+    def test_identical_prompt_keeps_one_token_to_compute(self):
+        store = ConversationCacheStore(budget_mb=100)
+        store.release("conv", _cache([1, 2, 3]), [1, 2, 3])
+
+        cache, reused = store.acquire("conv", None, [1, 2, 3])
+
+        self.assertEqual(reused, 2)
+        self.assertEqual(cache[0].offset, 2)
+
+    def test_release_trims_token_decoded_past_the_response(self):
+        store = ConversationCacheStore(budget_mb=100)
+        cache = _cache([1, 2, 3, 4])
+        store.release("conv", cache, [1, 2, 3])
+
+        self.assertEqual(cache[0].offset, 3)
+        self.assertEqual(store.stats()["conversations"][0]["tokens"], 3)
+
+    def test_evicts_least_recently_used_over_budget(self):
+        # 4 Mo par conversation, budget de 10 Mo : deux conversations tiennent
+        store = ConversationCacheStore(budget_mb=10)
+        for name in ("a", "b"):
+            store.release(name, _cache([1, 2, 3, 4]), [1, 2, 3, 4])
+
+        # a est réutilisée, b devient la moins récente et sera évincée
+        cache, _ = store.acquire("a", None, [1, 2, 3, 4, 5])
+        store.release("a", cache, [1, 2, 3, 4])
+        store.release("c", _cache([1, 2, 3, 4]), [1, 2, 3, 4])
+
+        stats = store.stats()
+        self.assertEqual([entry["id"] for entry in stats["conversations"]], ["a", "c"])
+        self.assertEqual(stats["evictions"], 1)
+        self.assertLessEqual(stats["memory_used_mb"], 10)
+
+        # Un cache plus gros que le budget n'est pas conservé
+        store.release("huge", _cache(list(range(11))), list(range(11)))
+        self.assertNotIn("huge", [entry["id"] for entry in store.stats()["conversations"]])
+
+    def test_fallback_counts_prefix_reuse(self):
+        store = ConversationCacheStore(budget_mb=100)
+        prefix_cache = _cache([1, 2, 3])
+        prompt = [1, 2, 3, 4, 5]
+
+        cache, reused = store.acquire("conv", None, prompt, fallback=lambda: (prefix_cache, 3))
+
+        self.assertIs(cache, prefix_cache)
+        self.assertEqual(reused, 3)
+        stats = store.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 1))
+        self.assertEqual((stats["reused_tokens"], stats["prefill_tokens"]), (3, 2))
+
+    def test_fallback_is_skipped_on_conversation_hit(self):
+        store = ConversationCacheStore(budget_mb=100)
+        store.release("conv", _cache([1, 2, 3]), [1, 2, 3])
+        fallback = mock.Mock(return_value=None)
+
+        _, reused = store.acquire("conv", None, [1, 2, 3, 4], fallback=fallback)
+
+        self.assertEqual(reused, 3)
+        fallback.assert_not_called()
+        self.assertEqual(store.stats()["hits"], 1)
+
+
+class PrefixCacheTest(_FakeCacheTest):
+    def test_built_after_min_uses_then_copied(self):
+        store = PrefixCacheStore(budget_mb=100, min_tokens=2, min_uses=2)
+        tokens = [1, 2, 3]
+        builds = []
+
+        def build():
+            builds.append(1)
+            return _cache(tokens)
+
+        self.assertIsNone(store.lookup("model", tokens, build))
+        first = store.lookup("model", tokens, build)
+        second = store.lookup("model", tokens, build)
+
+        self.assertEqual(len(builds), 1)
+        self.assertIsNot(first[0], second[0])
+        # La génération étend sa copie sans toucher au cache partagé
+        second[0].offset += 10
+        self.assertEqual(store.lookup("model", tokens, build)[0].offset, 3)
+        self.assertEqual(store.stats()["prefill_tokens_saved"], 6)
+
+    def test_short_prefix_is_ignored(self):
+        store = PrefixCacheStore(min_tokens=4, min_uses=1)
+        self.assertIsNone(store.lookup("model", [1, 2, 3], lambda: self.fail("built")))
+
+    def test_evicts_oldest_prefix(self):
+        store = PrefixCacheStore(budget_mb=100, max_entries=2, min_tokens=1, min_uses=1)
+        for prefix in ([1], [2], [3]):
+            store.lookup("model", prefix, lambda prefix=prefix: _cache(prefix))
+
+        self.assertEqual(store.stats()["evictions"], 1)
+        self.assertEqual([entry["tokens"] for entry in store.stats()["prefixes"]], [1, 1])
+        self.assertIsNone(store._entries.get(PrefixCacheStore.make_key("model", [1])))
+
+
+class CommonPrefixTest(unittest.TestCase):
+    def test_common_prefix_length(self):
+        self.assertEqual(common_prefix_length([1, 2, 3], [1, 2, 4]), 2)
+        self.assertEqual(common_prefix_length([1, 2], [1, 2, 3]), 2)
+        self.assertEqual(common_prefix_length([], [1]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+"""
+Tests de mlx_request_dispatcher (ids, barrières exclusives, annulation, échéances)
+
+Le dispatcher tourne dans un thread sur un pipe (stdin) avec un handler factice ;
+les réponses émises sur stdout sont collectées par id.
+
+    python -m unittest discover -s tests/python
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import threading
+import unittest
+from pathlib import Path
+
+MLX_DIR = Path(__file__).resolve().parents[2] / "src" / "main" / "services" / "backends" / "mlx"
+sys.path.insert(0, str(MLX_DIR))
+
+from mlx_request_dispatcher import RequestDispatcher  # noqa: E402
+
+_TIMEOUT = 5.0
+
+
+class _Output:
+    """Remplace stdout : une ligne JSON par appel à write"""
+
+    def __init__(self):
+        self.messages = []
+        self.changed = threading.Condition()
+
+    def write(self, text):
+        with self.changed:
+            for line in text.splitlines():
+                if line.strip():
+                    self.messages.append(json.loads(line))
+            self.changed.notify_all()
+
+    def flush(self):
+        pass
+
+
+class DispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.events_lock = threading.Lock()
+        self.releases = {}
+        self.output = _Output()
+        self._streams = (sys.stdin, sys.stdout, sys.stderr)
+        self.thread = None
+
+    def tearDown(self):
+        for release in self.releases.values():
+            release.set()
+        if self.thread is not None:
+            self.writer.close()
+            self.thread.join(_TIMEOUT)
+        sys.stdin, sys.stdout, sys.stderr = self._streams
+
+    def handler(self, request):
+        """sleep: dort ms ; block: attend sa libération en surveillant check_stop"""
+        name = request["id"]
+        self.record("start", name)
+        try:
+            if request["command"] == "block":
+                release = self.releases.setdefault(name, threading.Event())
+                while not release.wait(0.01):
+                    reason = self.dispatcher.check_stop()
+                    if reason:
+                        return {"success": False, "stopped": reason}
+            else:
+                time.sleep(request.get("ms", 0) / 1000)
+            return {"success": True}
+        finally:
+            self.record("end", name)
+
+    def release(self, name):
+        self.releases.setdefault(name, threading.Event()).set()
+
+    def record(self, event, name):
+        with self.events_lock:
+            self.events.append((event, name))
+
+    def start(self, **kwargs):
+        self.dispatcher = RequestDispatcher("[Test]", self.handler, **kwargs)
+        read_fd, write_fd = os.pipe()
+        sys.stdin = os.fdopen(read_fd, "r")
+        sys.stdout = self.output
+        sys.stderr = io.StringIO()
+        self.writer = os.fdopen(write_fd, "w")
+        self.thread = threading.Thread(target=self.dispatcher.run, daemon=True)
+        self.thread.start()
+
+    def send(self, **request):
+        self.writer.write(json.dumps(request) + "\n")
+        self.writer.flush()
+
+    def response(self, request_id):
+        """Attend la (première) réponse portant cet id"""
+        deadline = time.monotonic() + _TIMEOUT
+        with self.output.changed:
+            while True:
+                for message in self.output.messages:
+                    if message.get("id") == request_id:
+                        return message
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.fail(f"No response for {request_id}")
+                self.output.changed.wait(remaining)
+
+    def wait_started(self, name):
+        deadline = time.monotonic() + _TIMEOUT
+        while ("start", name) not in self.events:
+            if time.monotonic() > deadline:
+                self.fail(f"{name} never started")
+            time.sleep(0.005)
+
+    def test_responses_are_tagged_with_their_id(self):
+        self.start(max_workers=2)
+        self.send(id="slow", command="sleep", ms=150)
+        self.send(id="fast", command="sleep", ms=0)
+
+        self.assertEqual(self.response("fast"), {"success": True, "id": "fast"})
+        self.assertEqual(self.response("slow"), {"success": True, "id": "slow"})
+        # Avec deux workers, la réponse rapide sort avant la lente
+        order = [message["id"] for message in self.output.messages]
+        self.assertEqual(order, ["fast", "slow"])
+
+    def test_exclusive_command_is_a_barrier(self):
+        self.start(max_workers=3, exclusive_commands=("load",))
+        self.send(id="a", command="sleep", ms=100)
+        self.send(id="b", command="sleep", ms=50)
+        self.send(id="load", command="load", ms=50)
+        self.send(id="c", command="sleep", ms=0)
+        self.response("c")
+
+        position = {event: i for i, event in enumerate(self.events)}
+        self.assertGreater(position[("start", "load")], position[("end", "a")])
+        self.assertGreater(position[("start", "load")], position[("end", "b")])
+        self.assertGreater(position[("start", "c")], position[("end", "load")])
+
+    def test_cancel_queued_request(self):
+        self.start(max_workers=1)
+        self.send(id="first", command="block")
+        self.wait_started("first")
+        self.send(id="second", command="sleep")
+        self.send(id="c1", command="cancel", request_id="second")
+
+        self.assertEqual(self.response("c1"), {"success": True, "request_id": "second", "state": "queued", "id": "c1"})
+        self.release("first")
+        self.assertEqual(self.response("second")["stopped"], "cancelled")
+        self.assertNotIn(("start", "second"), self.events)
+
+    def test_cancel_running_request(self):
+        self.start(max_workers=1)
+        self.send(id="job", command="block")
+        self.wait_started("job")
+        self.send(id="c1", command="cancel", request_id="job")
+
+        self.assertEqual(self.response("c1")["state"], "running")
+        self.assertEqual(self.response("job"), {"success": False, "stopped": "cancelled", "id": "job"})
+
+        self.send(id="c2", command="cancel", request_id="job")
+        self.assertFalse(self.response("c2")["success"])
+
+    def test_deadline(self):
+        self.start(max_workers=1)
+        # En cours : le handler voit l'échéance à sa prochaine frontière
+        self.send(id="running", command="block", deadline_ms=50)
+        self.assertEqual(self.response("running")["stopped"], "deadline")
+
+        # En file derrière une requête plus longue que l'échéance : jamais démarrée
+        self.send(id="blocker", command="block")
+        self.wait_started("blocker")
+        self.send(id="queued", command="sleep", deadline_ms=20)
+        time.sleep(0.05)
+        self.release("blocker")
+        self.assertEqual(self.response("queued"), {
+            "success": False, "stopped": "deadline", "error": "Request deadline before it started", "id": "queued"
+        })
+        self.assertNotIn(("start", "queued"), self.events)
+
+    def test_exclusive_batched_command_is_rejected(self):
+        with self.assertRaises(ValueError):
+            RequestDispatcher("[Test]", self.handler, batch_handlers={"load": lambda requests: []},
+                              exclusive_commands=("load",))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Tests de mlx_structured_output (schéma -> regex, automate, tokens autorisés)
+
+Sans MLX : seule la construction des masques additifs (mx) n'est pas couverte.
+
+    python -m unittest discover -s tests/python
+"""
+
+import sys
+import json
+import itertools
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+MLX_DIR = Path(__file__).resolve().parents[2] / "src" / "main" / "services" / "backends" / "mlx"
+sys.path.insert(0, str(MLX_DIR))
+
+from mlx_structured_output import (  # noqa: E402
+    CompiledConstraint,
+    MaskCache,
+    RegexAutomaton,
+    TokenIndex,
+    schema_to_regex,
+)
+
+
+class _Vocab:
+    """Tokenizer minimal (get_vocab, tokens spéciaux, EOS)"""
+
+    def __init__(self, tokens):
+        self.vocab = {token: i for i, token in enumerate(tokens)}
+        self.vocab["</s>"] = len(self.vocab)
+        self.all_special_ids = [self.vocab["</s>"]]
+        self.eos_token_id = self.vocab["</s>"]
+
+    def get_vocab(self):
+        return self.vocab
+
+
+class ObjectRegexTest(unittest.TestCase):
+    def test_many_optional_properties_compile_fast(self):
+        schema = {"type": "object", "properties": {f"field_{i}": {"type": "string"} for i in range(24)}}
+
+        start = time.perf_counter()
+        automaton = RegexAutomaton(schema_to_regex(schema))
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+        self.assertTrue(automaton.fullmatch("{}"))
+        self.assertTrue(automaton.fullmatch('{"field_3":"a", "field_20":"b"}'))
+        self.assertFalse(automaton.fullmatch('{"field_20":"b","field_3":"a"}'))
+        self.assertFalse(automaton.fullmatch('{"field_3":"a",}'))
+
+    def test_required_and_optional_subsets(self):
+        names = ["a", "b", "c", "d"]
+        for required in ([], ["a"], ["c"], ["b", "d"], names):
+            automaton = RegexAutomaton(schema_to_regex({
+                "type": "object",
+                "properties": {name: {"type": "integer"} for name in names},
+                "required": required,
+            }))
+            for bits in range(1 << len(names)):
+                present = [name for i, name in enumerate(names) if bits >> i & 1]
+                text = "{" + ",".join(f'"{name}":1' for name in present) + "}"
+                self.assertEqual(
+                    automaton.fullmatch(text), all(name in present for name in required), (required, text)
+                )
+
+
+class StringPatternTest(unittest.TestCase):
+    def automaton(self, pattern):
+        return RegexAutomaton(schema_to_regex({"type": "string", "pattern": pattern}))
+
+    def test_alternation_anchors_each_branch(self):
+        automaton = self.automaton("^a|b$")
+        for text, expected in [('"a"', True), ('"b"', True), ('"ax"', True), ('"xb"', True),
+                               ('"xa"', False), ('"bx"', False), ('""', False)]:
+            self.assertEqual(automaton.fullmatch(text), expected, text)
+
+        automaton = self.automaton("^(a|b)$")
+        self.assertTrue(automaton.fullmatch('"a"'))
+        self.assertFalse(automaton.fullmatch('"ab"'))
+
+    def test_unanchored_pattern_is_a_search(self):
+        automaton = self.automaton("abc")
+        self.assertTrue(automaton.fullmatch('"abc"'))
+        self.assertTrue(automaton.fullmatch('"x\\"abc\\n"'))
+        self.assertFalse(automaton.fullmatch('"ab"'))
+
+    def test_dot_and_negated_class_stay_valid_json(self):
+        for pattern in ("^.+$", "^[^x]*$", "^[\\x00-\\x7f]{1,3}$"):
+            automaton = self.automaton(pattern)
+            self.assertTrue(automaton.fullmatch('"ab"'), pattern)
+            for text in ('"""', '"\\"', '"\x01"', '"\n"'):
+                self.assertFalse(automaton.fullmatch(text), (pattern, text))
+
+        # Tout ce que l'automate accepte se relit en JSON
+        automaton = self.automaton("^.{0,2}$")
+        for chars in itertools.product(['a', '"', '\\', '\x1f', 'é', '/'], repeat=2):
+            text = '"' + "".join(chars) + '"'
+            if automaton.fullmatch(text):
+                json.loads(text)
+
+    def test_unsatisfiable_pattern_is_rejected(self):
+        for pattern in ('^"$', '^\\\\+$', "a^b"):
+            with self.assertRaises(ValueError, msg=pattern):
+                self.automaton(pattern)
+
+
+class AllowedTokensTest(unittest.TestCase):
+    def setUp(self):
+        tokens = ['{', '}', '"', ':', ',', ' ', '{"', '":', '",', '"}', 'name', 'age', 'na', 'me"', '1', '12',
+                  'a', 'ab', 'x y', '\\', '\\n', 'é', '中文', '"name', 'true', 'null']
+        self.index = TokenIndex(_Vocab(tokens))
+        schema = {"type": "object", "properties": {"name": {"type": "string"}, "age": {"type": "integer"}},
+                  "required": ["name"]}
+        self.constraint = CompiledConstraint("json_schema", schema_to_regex(schema), self.index, MaskCache())
+
+    def allowed(self, prefix):
+        automaton = self.constraint.automaton
+        state = automaton.walk(automaton.start, prefix)
+        bits = np.unpackbits(self.constraint.allowed_bits(state), count=self.index.size)
+        return state, set(np.flatnonzero(bits).tolist())
+
+    def test_matches_token_by_token_walk(self):
+        automaton = self.constraint.automaton
+        for prefix in ["", "{", '{"', '{"name":"a', '{"name":"a\\', '{"name":"x","age":1', '{"name":"x"}', "zz"]:
+            state, allowed = self.allowed(prefix)
+            expected = {
+                token_id for token_id, text in enumerate(self.index.strings)
+                if text is not None and state != RegexAutomaton.DEAD
+                and automaton.walk(state, text) != RegexAutomaton.DEAD
+            }
+            if automaton.is_accepting(state) or not expected:
+                expected |= set(self.index.eos_token_ids)
+            self.assertEqual(allowed, expected, prefix)
+
+    def test_mask_cache_is_bounded(self):
+        masks = MaskCache(max_mb=0)
+        constraint = CompiledConstraint("regex", "[a-z]{0,6}", self.index, masks)
+        state = constraint.automaton.start
+        for ch in "abcdef":
+            constraint.allowed_bits(state)
+            state = constraint.automaton.step(state, ch)
+        self.assertEqual(len(masks), 1)
+        self.assertGreater(masks.evictions, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
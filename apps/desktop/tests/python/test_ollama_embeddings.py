@@ -0,0 +1,118 @@
+"""
+Tests de ollama_embeddings (OllamaEmbedder contre StandInOllama, réduction des embeddings)
+
+    python -m unittest discover -s tests/python
+"""
+
+import sys
+import math
+import tempfile
+import unittest
+from pathlib import Path
+
+DESKTOP_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(DESKTOP_DIR / "scripts" / "benchmarks"))
+
+from ollama_embed_benchmark import StandInOllama, fake_embedding  # noqa: E402  (ajoute src/python au path)
+from text_rag.ollama_embeddings import (  # noqa: E402
+    OllamaEmbedder,
+    to_float16,
+    truncate_embedding,
+    uses_layer_norm,
+)
+
+
+def _norm(vector):
+    return math.sqrt(sum(value * value for value in vector))
+
+
+class LegacyNormalizationTest(unittest.TestCase):
+    def setUp(self):
+        self.stand_ins = []
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        for stand_in in self.stand_ins:
+            stand_in.close()
+        self.tmp.cleanup()
+
+    def embedder(self, legacy_only, **kwargs):
+        stand_in = StandInOllama(latency_ms=0, per_text_ms=0, legacy_only=legacy_only)
+        self.stand_ins.append(stand_in)
+        return OllamaEmbedder(base_url=stand_in.url, probe_ttl=0, **kwargs)
+
+    def test_single_and_batch_share_one_magnitude(self):
+        # generate_embedding passe par /api/embeddings (vecteurs bruts), les lots par /api/embed
+        embedder = self.embedder(legacy_only=False)
+        single = embedder.generate_embedding("a")
+        batch = embedder.generate_embeddings_batch(["a", "b"])
+
+        self.assertAlmostEqual(_norm(single), 1.0)
+        for value, expected in zip(single, batch[0]):
+            self.assertAlmostEqual(value, expected)
+        self.assertEqual(embedder.batch_stats["legacy_requests"], 1)
+
+    def test_legacy_fallback_normalizes_and_stores_once(self):
+        embedder = self.embedder(legacy_only=True, store_path=str(Path(self.tmp.name) / "store.sqlite"))
+        writes = []
+        put_many = embedder.store.put_many
+        embedder.store.put_many = lambda texts, *args: writes.extend(texts) or put_many(texts, *args)
+
+        texts = ["a", "b", "c"]
+        embeddings = embedder.generate_embeddings_batch(texts)
+
+        self.assertIs(embedder.batch_endpoint_available, False)
+        self.assertEqual(sorted(writes), texts)
+        for embedding, text in zip(embeddings, texts):
+            for value, expected in zip(embedding, fake_embedding(text, normalized=True)):
+                self.assertAlmostEqual(value, expected)
+
+        # Relu depuis le cache mémoire puis le store (float32) : mêmes vecteurs normalisés
+        self.assertEqual(embedder.generate_embedding("a"), embeddings[0])
+        embedder.cache.clear()
+        for value, expected in zip(embedder.generate_embedding("a"), embeddings[0]):
+            self.assertAlmostEqual(value, expected, places=6)
+        self.assertEqual(embedder.batch_stats["legacy_requests"], 3)
+
+
+class ReductionTest(unittest.TestCase):
+    def setUp(self):
+        self.embedding = [math.sin(i * 0.37) + 0.2 for i in range(768)]
+
+    def test_truncation_keeps_a_unit_prefix(self):
+        truncated = truncate_embedding(self.embedding, 256)
+        self.assertEqual(len(truncated), 256)
+        self.assertAlmostEqual(_norm(truncated), 1.0)
+        # Même direction que le préfixe brut
+        scale = truncated[0] / self.embedding[0]
+        for value, raw in zip(truncated, self.embedding):
+            self.assertAlmostEqual(value, raw * scale)
+        self.assertIs(truncate_embedding(self.embedding, 768), self.embedding)
+
+    def test_layer_norm_matches_nomic_recipe(self):
+        # F.layer_norm(x, (768,)) puis troncature puis F.normalize
+        mean = sum(self.embedding) / len(self.embedding)
+        std = math.sqrt(sum((value - mean) ** 2 for value in self.embedding) / len(self.embedding) + 1e-5)
+        head = [(value - mean) / std for value in self.embedding[:256]]
+        expected = [value / _norm(head) for value in head]
+
+        truncated = truncate_embedding(self.embedding, 256, layer_norm=True)
+        self.assertAlmostEqual(_norm(truncated), 1.0)
+        for value, reference in zip(truncated, expected):
+            self.assertAlmostEqual(value, reference)
+
+    def test_layer_norm_models(self):
+        for model in ("nomic-embed-text", "nomic-embed-text:latest", "nomic-ai/nomic-embed-text-v1.5"):
+            self.assertTrue(uses_layer_norm(model), model)
+        for model in ("mxbai-embed-large", "nomic-embed-text-v2-moe", "all-minilm:l6-v2"):
+            self.assertFalse(uses_layer_norm(model), model)
+
+    def test_float16_rounding(self):
+        self.assertEqual(to_float16([0.0, 1.0, -2.5, 65504.0]), [0.0, 1.0, -2.5, 65504.0])
+        # 11 bits de mantisse : 1 + 2^-11 retombe sur 1, 1 + 2^-10 est représentable
+        self.assertEqual(to_float16([1 + 2 ** -11, 1 + 2 ** -10]), [1.0, 1.001])
+        self.assertEqual(to_float16([0.1]), [0.099976])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+Tests de query_cache (LRU en mémoire, persistance JSON différée)
+
+    python -m unittest discover -s tests/python
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src" / "python"))
+
+from utils.query_cache import QueryEmbeddingCache  # noqa: E402
+
+
+class PersistenceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "cache.json"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_defers_writes_until_flush(self):
+        cache = QueryEmbeddingCache(persist_path=str(self.path), save_interval=3600)
+        saves = []
+        save = cache._save
+        cache._save = lambda: saves.append(1) or save()
+
+        for i in range(50):
+            cache.put(f"query {i}", "model", [float(i)])
+        self.assertEqual(saves, [])
+        self.assertTrue(cache.dirty)
+        self.assertFalse(self.path.exists())
+
+        cache.flush()
+        self.assertEqual(len(saves), 1)
+        self.assertFalse(cache.dirty)
+
+        reloaded = QueryEmbeddingCache(persist_path=str(self.path))
+        self.assertEqual(reloaded.get("query  7", "model"), [7.0])
+        self.assertEqual(len(reloaded._entries), 50)
+
+    def test_zero_interval_saves_on_every_put(self):
+        cache = QueryEmbeddingCache(persist_path=str(self.path), save_interval=0)
+        cache.put("a", "model", [1.0])
+        self.assertTrue(self.path.exists())
+        self.assertFalse(cache.dirty)
+
+
+if __name__ == "__main__":
+    unittest.main()